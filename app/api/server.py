@@ -1,18 +1,41 @@
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from process.backtest.store import GRANULARITY_SECONDS, CandleStore, is_partition_name, to_epoch
+from process.comparative.downsample import METHODS, MIN_POINTS, downsample, minmax_candles
 from process.comparative.process_stocks import ProcessStock
-from process.portfolio.portfolio import get_portfolio
+from process.portfolio.portfolio import get_portfolio_async
+from process.market.hub import MarketHub
+from common.exchange.async_exchange import AsyncExchange
+from common.metrics import CONTENT_TYPE_LATEST, MetricsMiddleware, register_cache, render
 
-from fastapi import FastAPI
+import numpy as np
+import orjson
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from settings import API_HOST, API_PORT, EXCHANGES
+from fastapi.responses import Response
+from settings import get_settings
+
+_hub = None
 
-app = FastAPI()
+def market_hub() -> MarketHub:
+    # Created and started by the first WebSocket client
+    global _hub
+    if _hub is None:
+        settings = get_settings()
+        _hub = MarketHub(settings["EXCHANGES"], fps=settings["WS_FPS"], local=settings["MARKET_FEED"] == "local")
+    return _hub
 
-origins = [
-    "http://localhost",
-    f"http://{API_HOST}:{API_PORT}",
-]
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Shutdown: stop the market stream and close the exchange HTTP pools
+    if _hub is not None:
+        await _hub.stop()
+    await AsyncExchange.close_clients()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,17 +46,175 @@ app.add_middleware(
     expose_headers=["Content-Disposition"]
 )
 
+def metrics_middleware(app):
+    # Built with the first request, importing the server doesn't read the settings
+    settings = get_settings()
+    return MetricsMiddleware(app, profile_threshold=settings["PROFILE_THRESHOLD"],
+                             profile_rate=settings["PROFILE_RATE"], profile_dir=settings["PROFILE_DIR"])
+
+app.add_middleware(metrics_middleware)
+
+@app.get("/metrics")
+def get_metrics():
+    return Response(render(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/get_portfolio_data")
-def get_portfolio_data():
-    portfolio = get_portfolio(EXCHANGES)
+async def get_portfolio_data():
+    portfolio = await get_portfolio_async(get_settings()["EXCHANGES"])
     return {
         "portfolio": portfolio,
         "status": 200
     }
 
+_analytics = None
+
+def portfolio_analytics():
+    # Connects to the database on the first history request only
+    global _analytics
+    if _analytics is None:
+        from process.portfolio.analytics import PortfolioAnalytics
+        _analytics = PortfolioAnalytics()
+    return _analytics
+
+@app.get("/portfolio/history")
+def get_portfolio_history(exchange: str = "all", period: str = "hour", start: int = None, end: int = None):
+    """Hourly or daily NAV, PnL, weights and drawdown rollups (``start``/``end`` in epoch seconds)."""
+    try:
+        history = portfolio_analytics().history(exchange, period, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "history": history,
+        "status": 200
+    }
+
+@app.get("/portfolio/analytics")
+def get_portfolio_analytics(exchange: str = "all"):
+    state = portfolio_analytics().state(exchange)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"No analytics for {exchange} yet")
+    return {
+        "analytics": state,
+        "status": 200
+    }
+
+@app.websocket("/ws")
+async def market_stream(websocket: WebSocket):
+    await websocket.accept()
+    hub = market_hub()
+    await hub.start()
+    try:
+        async for frame in hub.frames():
+            await websocket.send_text(frame)
+    except WebSocketDisconnect:
+        pass
+
+SERIES_MEDIA_TYPES = {"json": "application/json", "arrow": "application/vnd.apache.arrow.stream"}
+
+def encode_series(series, fmt: str) -> bytes:
+    if fmt == "arrow":
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise HTTPException(status_code=406, detail="Arrow payloads need pyarrow installed")
+        # One long table, the rows of a symbol are contiguous
+        table = pa.table({
+            "symbol": np.repeat(list(series), [len(s["timestamp"]) for s in series.values()]),
+            "timestamp": np.concatenate([s["timestamp"] for s in series.values()]),
+            "value": np.concatenate([s["value"] for s in series.values()]),
+        })
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    # orjson writes the NumPy columns directly
+    return orjson.dumps({"data": series, "status": 200}, option=orjson.OPT_SERIALIZE_NUMPY)
+
+def downsample_series(series, points: int, method: str):
+    if not points:
+        return series
+    result = {}
+    for symbol, s in series.items():
+        timestamps, values = downsample(s["timestamp"], s["value"], points, method)
+        result[symbol] = {"timestamp": timestamps, "value": values}
+    return result
+
+def check_date(name: str, value, parse):
+    """``parse(value)``, a 400 naming the parameter when it is not a date."""
+    try:
+        return parse(value)
+    except (ValueError, TypeError, OverflowError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} {value!r}: {e}")
+
+@app.get("/comparative")
+def get_comparative_series(symbols: str = "AAPL,TSLA", start: str = None, end: str = None, format: str = "json",
+                           points: int = None, method: str = "lttb"):
+    """Columnar series ``{symbol: {"timestamp": [epoch ms], "value": [...]}}`` of ``start <= date <= end``.
+
+    ``points`` (usually the chart width in pixels) downsamples each series with ``method``.
+    """
+    names = [s for s in symbols.split(",") if s]
+    unknown = set(names) - set(ProcessStock.symbols())
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown symbols: {sorted(unknown)}")
+    if format not in SERIES_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(SERIES_MEDIA_TYPES)}")
+    if method not in METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of {list(METHODS)}")
+    if points is not None and points < MIN_POINTS[method]:
+        raise HTTPException(status_code=400, detail=f"points must be at least {MIN_POINTS[method]} for {method}")
+    check_date("start", start, ProcessStock.to_ms)
+    check_date("end", end, ProcessStock.to_ms)
+    payload = ProcessStock.cached_response(
+        ("comparative", tuple(names), start, end, format, points, method), names,
+        lambda: encode_series(downsample_series(ProcessStock.series(names, start, end), points, method), format))
+    return Response(payload, media_type=SERIES_MEDIA_TYPES[format])
+
+candle_store = CandleStore()
+
+@lru_cache(maxsize=64)
+def encode_candles(exchange: str, ticker: str, granularity: str, start, end, points: int, version: tuple) -> bytes:
+    # ``version`` (row count, write counter) only makes new or refreshed data miss the cache
+    candles = candle_store.read(exchange, ticker, granularity, start=start, end=end)
+    if points:
+        candles = minmax_candles(candles, points)
+    return orjson.dumps({"data": candles, "granularity": granularity, "status": 200},
+                        option=orjson.OPT_SERIALIZE_NUMPY)
+
+register_cache("candles", encode_candles)
+
+@app.get("/candles")
+def get_candles(exchange: str, ticker: str, granularity: str = None, start: str = None, end: str = None,
+                points: int = None):
+    """Columnar candles of the candle store, merged into ``points`` candles when given.
+
+    Without ``granularity`` the range is read from the stored level that fits ``points`` (2000 by default).
+    ``start``/``end`` are MM-DD-YYYY dates.
+    """
+    # They name folders of the store
+    for name, value in (("exchange", exchange), ("ticker", ticker)):
+        if not is_partition_name(value):
+            raise HTTPException(status_code=400, detail=f"Invalid {name} {value!r}")
+    if granularity is not None and granularity not in GRANULARITY_SECONDS:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {list(GRANULARITY_SECONDS)}")
+    if points is not None and points < 1:
+        raise HTTPException(status_code=400, detail="points must be at least 1")
+    start, end = check_date("start", start, to_epoch), check_date("end", end, to_epoch)
+    if granularity is None:
+        granularity = candle_store.best_granularity(exchange, ticker, start, end, points or 2000)
+        if granularity is None:
+            raise HTTPException(status_code=404, detail=f"No candles stored for {exchange} {ticker}")
+    version = (candle_store.count(exchange, ticker, granularity),
+               candle_store.version(exchange, ticker, granularity))
+    if not version[0]:
+        raise HTTPException(status_code=404, detail=f"No candles stored for {exchange} {ticker} {granularity}")
+    return Response(encode_candles(exchange, ticker, granularity, start, end, points, version),
+                    media_type="application/json")
+
 @app.get("/test_comparative")
-def get_portfolio_data():
-    data = ProcessStock.run()
+async def get_comparative_data():
+    # CSV processing is blocking, it stays off the event loop
+    data = await run_in_threadpool(ProcessStock.run)
     return {
         "data": data,
         "status": 200
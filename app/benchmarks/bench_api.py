@@ -0,0 +1,43 @@
+"""
+API endpoints under concurrent load.
+
+Every round sends ``CONCURRENCY`` requests at once through the ASGI app (no
+network), the round time is the throughput measured: ``extra_info`` reports
+it as requests per second.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+CONCURRENCY = 200
+
+
+@pytest.fixture(scope="module")
+def app(candle_store):
+    from api import server
+    server.candle_store = candle_store
+    return server.app
+
+
+def load(app, path: str) -> int:
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+            responses = await asyncio.gather(*(client.get(path) for _ in range(CONCURRENCY)))
+        return sum(response.status_code == 200 for response in responses)
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("path", [
+    "/get_portfolio_data",
+    "/comparative?symbols=AAPL,TSLA&points=1000",
+    "/candles?exchange=fixture&ticker=BTC-USD&points=2000",
+    "/metrics",
+])
+def test_endpoint_load(benchmark, app, path):
+    ok = benchmark.pedantic(load, args=(app, path), rounds=10, warmup_rounds=1)
+    assert ok == CONCURRENCY
+    # No timings under --benchmark-disable
+    if benchmark.stats:
+        benchmark.extra_info["requests_per_second"] = CONCURRENCY / benchmark.stats.stats.mean
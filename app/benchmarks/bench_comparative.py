@@ -0,0 +1,29 @@
+"""Comparative stock series: CSV parsing, the cached payload and downsampling."""
+import numpy as np
+import pytest
+
+from process.comparative.downsample import downsample
+from process.comparative.process_stocks import ProcessStock
+
+
+def clear_caches():
+    ProcessStock._series.clear()
+    ProcessStock._responses.clear()
+
+
+def test_process_stock_run_cold(benchmark):
+    data = benchmark.pedantic(ProcessStock.run, setup=clear_caches, rounds=20)
+    assert data
+
+
+def test_process_stock_run_cached(benchmark):
+    assert benchmark(ProcessStock.run)
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_downsample(benchmark, method):
+    rng = np.random.default_rng(0)
+    timestamps = np.arange(1_000_000, dtype=np.int64) * 60_000
+    values = np.cumsum(rng.normal(size=len(timestamps)))
+    sampled, _ = benchmark(downsample, timestamps, values, 2000, method)
+    assert len(sampled) <= 2000
@@ -0,0 +1,43 @@
+"""Decoding raw exchange candles: the dict formatters of the adapters and the array path."""
+import pytest
+
+from common.exchange.utils.candles import candles_from_rows
+from fixtures import binance_klines, coinbase_candles, kraken_ohlc
+
+
+@pytest.fixture(scope="module")
+def raw(candles):
+    rows = candles[:1000]
+    return {"binance": binance_klines(rows), "kraken": kraken_ohlc(rows), "coinbase": coinbase_candles(rows)}
+
+
+def adapter(module: str, class_name: str, sdk: str):
+    # The adapters import their SDK, their benchmarks are skipped where it is not installed
+    pytest.importorskip(sdk)
+    return getattr(pytest.importorskip(module), class_name)(class_name.lower())
+
+
+ADAPTERS = [
+    ("binance", "common.exchange.binance.binance", "Binance", "binance"),
+    ("kraken", "common.exchange.kraken.kraken", "Kraken", "krakenex"),
+    ("coinbase", "common.exchange.coinbase.coinbase", "Coinbase", "coinbase.rest"),
+]
+
+
+@pytest.mark.parametrize("name,module,class_name,sdk", ADAPTERS, ids=[a[0] for a in ADAPTERS])
+def test_format_ticker_data(benchmark, raw, name, module, class_name, sdk):
+    exchange = adapter(module, class_name, sdk)
+    formatted = benchmark(exchange._format_ticker_data, raw[name])
+    assert len(formatted) == 1000
+
+
+@pytest.mark.parametrize("name,module,class_name,sdk", ADAPTERS, ids=[a[0] for a in ADAPTERS])
+def test_format_ticker_array(benchmark, raw, name, module, class_name, sdk):
+    exchange = adapter(module, class_name, sdk)
+    formatted = benchmark(exchange._format_ticker_array, raw[name])
+    assert len(formatted) == 1000
+
+
+def test_candles_from_rows(benchmark, raw):
+    candles = benchmark(candles_from_rows, raw["binance"], columns=(0, 1, 2, 3, 4, 5), timestamp_divisor=1000)
+    assert len(candles) == 1000
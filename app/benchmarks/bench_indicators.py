@@ -0,0 +1,31 @@
+"""Technical indicators (batch, stored features and streaming) and backtests on synthetic candles."""
+import pandas as pd
+
+from process.backtest.backtest_factory import backtest_factory
+from process.backtest.indicators import IndicatorEngine
+from process.backtest.store import CandleStore
+from process.backtest.utils import add_technical_indicators, calculate_technical_indicators
+
+
+def test_add_technical_indicators(benchmark, candles):
+    df = pd.DataFrame(candles).set_index("timestamp")
+    result = benchmark(add_technical_indicators, df)
+    assert "OBV" in result
+
+
+def test_calculate_technical_indicators(benchmark, candle_store, tmp_path):
+    # Read from the candle store, compute and write the feature partition
+    feature_store = CandleStore(str(tmp_path))
+    result = benchmark(calculate_technical_indicators, "BTC-USD", source="fixture", granularity="one_minute",
+                       store=candle_store, feature_store=feature_store)
+    assert len(result) == candle_store.count("fixture", "BTC-USD", "one_minute")
+
+
+def test_indicator_engine_warm_up(benchmark, candles):
+    last = benchmark(lambda: IndicatorEngine().warm_up(candles))
+    assert last["SMA_20"] > 0
+
+
+def test_momentum_backtest(benchmark, long_candles):
+    result = benchmark(lambda: backtest_factory("momentum", long_candles, lookback=60, allow_short=True).run())
+    assert result["trades"] > 0
@@ -0,0 +1,22 @@
+"""Portfolio aggregation over the fixture exchanges (exchange answers cached, as in production)."""
+import asyncio
+
+from conftest import FIXTURE_EXCHANGES
+from fixtures import balances, prices
+from process.portfolio.portfolio import _value_portfolio, get_portfolio, get_portfolio_async
+
+
+def test_value_portfolio(benchmark):
+    account = {"portfolio": [{"asset": k, k: v} for k, v in balances().items()], "assets": list(balances())}
+    lines = benchmark(_value_portfolio, "fixture", account, prices())
+    assert len(lines) == len(account["assets"])
+
+
+def test_get_portfolio(benchmark):
+    portfolio = benchmark(get_portfolio, FIXTURE_EXCHANGES)
+    assert {line["exchange"] for line in portfolio} == set(FIXTURE_EXCHANGES)
+
+
+def test_get_portfolio_async(benchmark):
+    portfolio = benchmark(lambda: asyncio.run(get_portfolio_async(FIXTURE_EXCHANGES)))
+    assert {line["exchange"] for line in portfolio} == set(FIXTURE_EXCHANGES)
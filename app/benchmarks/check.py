@@ -0,0 +1,43 @@
+"""
+Benchmark regression gate: fails when a benchmark's mean is more than 15% slower than the baseline
+committed in benchmarks/.history for this machine.
+
+    python benchmarks/check.py            # compare with the baseline (records one when there is none)
+    python benchmarks/check.py --save     # record a new baseline after an intended change
+
+Results are only comparable on the same machine (``Linux-CPython-3.11-64bit``...), each one keeps its own
+baseline. Extra arguments are passed on to pytest.
+"""
+import glob
+import os
+import sys
+
+import pytest
+from pytest_benchmark.utils import get_machine_id
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY = os.path.join(APP_DIR, "benchmarks", ".history")
+THRESHOLD = "mean:15%"
+
+
+def baseline() -> str:
+    """Run id of the newest baseline of this machine, None when there is none."""
+    runs = sorted(glob.glob(os.path.join(HISTORY, get_machine_id(), "*_baseline.json")))
+    return os.path.basename(runs[-1]).split("_", 1)[0] if runs else None
+
+
+def main(args) -> int:
+    # The storage in benchmarks/pytest.ini is relative to app/
+    os.chdir(APP_DIR)
+    save = "--save" in args
+    args = [arg for arg in args if arg != "--save"]
+    run = None if save else baseline()
+    if run is None:
+        print(f"Recording the {get_machine_id()} baseline in {HISTORY}")
+        return pytest.main(["benchmarks", "--benchmark-save=baseline", *args])
+    print(f"Comparing with the {get_machine_id()} baseline {run}, failing on a {THRESHOLD} slowdown")
+    return pytest.main(["benchmarks", f"--benchmark-compare={run}", f"--benchmark-compare-fail={THRESHOLD}", *args])
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The application imports are relative to app/, and the settings come from the offline benchmark config
+sys.path.insert(0, APP_DIR)
+os.environ.setdefault("BOT_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yaml"))
+
+from common.exchange.async_exchange_factory import ASYNC_EXCHANGE_REGISTRY  # noqa: E402
+from common.exchange.exchange_factory import register_exchange  # noqa: E402
+from process.backtest.store import CandleStore  # noqa: E402
+
+from fixtures import random_walk_candles  # noqa: E402
+
+FIXTURE_EXCHANGES = ["fixture_a", "fixture_b"]
+
+for name in FIXTURE_EXCHANGES:
+    register_exchange(name, "fixtures", "FixtureExchange")
+    ASYNC_EXCHANGE_REGISTRY[name] = ("fixtures", "AsyncFixtureExchange")
+
+
+@pytest.fixture(scope="session")
+def candles():
+    """10k one minute candles."""
+    return random_walk_candles(10_000)
+
+
+@pytest.fixture(scope="session")
+def long_candles():
+    """500k one minute candles (about a year)."""
+    return random_walk_candles(500_000, seed=1)
+
+
+@pytest.fixture(scope="session")
+def candle_store(tmp_path_factory, long_candles):
+    """Candle store holding ``long_candles`` as fixture/BTC-USD one_minute."""
+    store = CandleStore(str(tmp_path_factory.mktemp("candles")))
+    store.append("fixture", "BTC-USD", "one_minute", long_candles)
+    return store
@@ -0,0 +1,103 @@
+"""
+Synthetic market data for the benchmarks, generated from fixed seeds.
+
+Candles are a geometric random walk, served in the raw formats of the three
+exchange APIs. ``FixtureExchange``/``AsyncFixtureExchange`` answer balances
+and prices from memory so the portfolio and API benchmarks never leave the
+process.
+"""
+from typing import Dict, List
+
+import numpy as np
+
+from common.exchange.async_exchange import AsyncExchange
+from common.exchange.exchange import Exchange
+from common.exchange.utils.candles import CANDLE_DTYPE
+
+START = 1_700_000_000
+ASSETS = ["BTC", "ETH", "SOL", "ADA", "XRP", "DOT", "DOGE", "AVAX", "LINK", "MATIC", "ATOM", "LTC", "UNI", "XLM",
+          "ALGO", "NEAR", "FIL", "AAVE", "EOS", "XTZ", "USD"]
+
+
+def random_walk_candles(n: int, granularity: int = 60, start: int = START, price: float = 30_000.0,
+                        seed: int = 0) -> np.ndarray:
+    """``n`` consecutive ``CANDLE_DTYPE`` candles."""
+    rng = np.random.default_rng(seed)
+    close = price * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    open_price = np.concatenate([[price], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.001, n)) * close
+    candles = np.empty(n, dtype=CANDLE_DTYPE)
+    candles["timestamp"] = start + granularity * np.arange(n)
+    candles["open_price"] = open_price
+    candles["high_price"] = np.maximum(open_price, close) + spread
+    candles["low_price"] = np.minimum(open_price, close) - spread
+    candles["close_price"] = close
+    candles["volume"] = rng.lognormal(2, 1, n)
+    return candles
+
+
+def binance_klines(candles: np.ndarray) -> List[list]:
+    # [open time ms, open, high, low, close, volume, close time ms, quote volume, trades, ...], prices as strings
+    return [[t * 1000, f"{o:.2f}", f"{h:.2f}", f"{l:.2f}", f"{c:.2f}", f"{v:.4f}", t * 1000 + 59_999,
+             f"{v * c:.2f}", 100, "0", "0", "0"] for t, o, h, l, c, v in candles.tolist()]
+
+
+def kraken_ohlc(candles: np.ndarray) -> List[list]:
+    # [time, open, high, low, close, vwap, volume, count]
+    return [[t, f"{o:.1f}", f"{h:.1f}", f"{l:.1f}", f"{c:.1f}", f"{(h + l) / 2:.1f}", f"{v:.8f}", 100]
+            for t, o, h, l, c, v in candles.tolist()]
+
+
+def coinbase_candles(candles: np.ndarray) -> List[Dict[str, str]]:
+    # Newest first, every field a string
+    return [{"start": str(t), "low": f"{l:.2f}", "high": f"{h:.2f}", "open": f"{o:.2f}", "close": f"{c:.2f}",
+             "volume": f"{v:.8f}"} for t, o, h, l, c, v in candles[::-1].tolist()]
+
+
+def balances(seed: int = 0) -> Dict[str, float]:
+    rng = np.random.default_rng(seed)
+    return {asset: float(rng.uniform(0.2, 100)) for asset in ASSETS}
+
+
+def prices(seed: int = 0) -> Dict[str, float]:
+    rng = np.random.default_rng(seed + 1)
+    return {asset: 1.0 if asset == "USD" else float(rng.uniform(0.1, 50_000)) for asset in ASSETS}
+
+
+class FixtureExchange(Exchange):
+    """Exchange answering from the fixture balances and prices."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        seed = sum(map(ord, name))
+        self.balances = balances(seed)
+        self.prices = prices(seed)
+
+    def get_account_details(self, all_details: bool = False, flag_portfolio: bool = False) -> Dict[str, any]:
+        if all_details:
+            return {"all": dict(self.balances)}
+        portfolio = [{"asset": k, k: v} for k, v in self.balances.items()]
+        return {"portfolio": portfolio, "assets": list(self.balances)}
+
+    def get_spot_pair(self, first_pair: str = "BTC", second_pair: str = "USD", interval: str = None):
+        return self.prices.get(first_pair)
+
+    def get_spot_pairs(self, first_pairs: List[str], second_pair: str = "USD") -> Dict[str, float]:
+        return {asset: self.prices[asset] for asset in first_pairs if asset in self.prices}
+
+
+class AsyncFixtureExchange(AsyncExchange):
+    """``FixtureExchange`` for the async API path."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.exchange = FixtureExchange(name)
+
+    async def get_account_details(self, all_details: bool = False, flag_portfolio: bool = False) -> Dict[str, any]:
+        return self.exchange.get_account_details(all_details=all_details, flag_portfolio=flag_portfolio)
+
+    async def get_spot_pair(self, first_pair: str = "BTC", second_pair: str = "USD"):
+        return self.exchange.get_spot_pair(first_pair, second_pair)
+
+    async def get_spot_pairs(self, first_pairs: List[str], second_pair: str = "USD") -> Dict[str, float]:
+        return self.exchange.get_spot_pairs(first_pairs, second_pair)
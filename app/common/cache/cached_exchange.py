@@ -0,0 +1,94 @@
+from typing import Dict, List
+
+from common.cache.ttl_cache import TTLCache
+from common.exchange.exchange import Exchange
+from common.metrics import register_cache
+from settings import get_settings
+
+_cache: TTLCache = None
+_exchanges: Dict[str, "CachedExchange"] = {}
+_async_exchanges: Dict[str, "AsyncCachedExchange"] = {}
+
+
+def get_cache() -> TTLCache:
+    global _cache
+    if _cache is None:
+        _cache = TTLCache(maxsize=get_settings()["CACHE_MAXSIZE"])
+        register_cache("exchange", _cache)
+    return _cache
+
+
+class CachedExchange:
+    """
+    Exchange wrapper serving account details and spot prices from the shared cache.
+
+    Every other attribute is the wrapped exchange's. The cache is shared by
+    every wrapper so all the API clients polling the same data share the
+    same exchange calls.
+    """
+
+    def __init__(self, exchange: Exchange, cache: TTLCache = None):
+        self.exchange = exchange
+        self.cache = cache or get_cache()
+        self.ttl = get_settings()["CACHE_TTL"]
+        self.stale_ttl = get_settings()["CACHE_STALE_TTL"]
+
+    def __getattr__(self, name):
+        return getattr(self.exchange, name)
+
+    def _get(self, kind: str, key: tuple, loader):
+        return self.cache.get((kind, self.exchange.name) + key, loader, self.ttl[kind], self.stale_ttl[kind])
+
+    def get_account_details(self, all_details: bool = False, flag_portfolio: bool = False):
+        return self._get("account", (all_details, flag_portfolio),
+                         lambda: self.exchange.get_account_details(all_details=all_details,
+                                                                   flag_portfolio=flag_portfolio))
+
+    def get_spot_pair(self, first_pair: str, second_pair: str = None):
+        kwargs = {"first_pair": first_pair} if second_pair is None else {"first_pair": first_pair,
+                                                                         "second_pair": second_pair}
+        return self._get("spot", (first_pair, second_pair), lambda: self.exchange.get_spot_pair(**kwargs))
+
+    def get_spot_pairs(self, first_pairs: List[str], second_pair: str = None) -> Dict[str, float]:
+        args = (list(first_pairs),) if second_pair is None else (list(first_pairs), second_pair)
+        return self._get("spot", (tuple(sorted(first_pairs)), second_pair),
+                         lambda: self.exchange.get_spot_pairs(*args))
+
+
+def cached_exchange(exchange_used: str) -> CachedExchange:
+    """Cached counterpart of ``exchange_factory``, one client per exchange."""
+    if exchange_used not in _exchanges:
+        from common.exchange.exchange_factory import exchange_factory
+        _exchanges[exchange_used] = CachedExchange(exchange_factory(exchange_used))
+    return _exchanges[exchange_used]
+
+
+class AsyncCachedExchange(CachedExchange):
+    """``CachedExchange`` for ``AsyncExchange`` adapters, the methods are coroutines."""
+
+    async def _get(self, kind: str, key: tuple, loader):
+        return await self.cache.aget((kind, self.exchange.name) + key, loader, self.ttl[kind],
+                                     self.stale_ttl[kind])
+
+    async def get_account_details(self, all_details: bool = False, flag_portfolio: bool = False):
+        return await self._get("account", (all_details, flag_portfolio),
+                               lambda: self.exchange.get_account_details(all_details=all_details,
+                                                                         flag_portfolio=flag_portfolio))
+
+    async def get_spot_pair(self, first_pair: str, second_pair: str = None):
+        kwargs = {"first_pair": first_pair} if second_pair is None else {"first_pair": first_pair,
+                                                                         "second_pair": second_pair}
+        return await self._get("spot", (first_pair, second_pair), lambda: self.exchange.get_spot_pair(**kwargs))
+
+    async def get_spot_pairs(self, first_pairs: List[str], second_pair: str = None) -> Dict[str, float]:
+        args = (list(first_pairs),) if second_pair is None else (list(first_pairs), second_pair)
+        return await self._get("spot", (tuple(sorted(first_pairs)), second_pair),
+                               lambda: self.exchange.get_spot_pairs(*args))
+
+
+def async_cached_exchange(exchange_used: str) -> AsyncCachedExchange:
+    """Cached counterpart of ``async_exchange_factory``."""
+    if exchange_used not in _async_exchanges:
+        from common.exchange.async_exchange_factory import async_exchange_factory
+        _async_exchanges[exchange_used] = AsyncCachedExchange(async_exchange_factory(exchange_used))
+    return _async_exchanges[exchange_used]
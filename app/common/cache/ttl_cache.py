@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "stale_until")
+
+    def __init__(self, value: Any, expires_at: float, stale_until: float):
+        self.value = value
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a time to live per entry.
+
+    * fresh entries are returned directly,
+    * expired entries still inside their stale window are returned as is while a
+      single background refresh reloads them,
+    * misses (or entries past the stale window) are loaded once: concurrent
+      callers asking for the same key wait for the same load instead of
+      hitting the exchange each.
+
+    Empty answers (an empty account, no prices) are kept too, but at most
+    ``empty_ttl`` seconds and without a stale window: the adapters also answer
+    empty when they swallow an error. Only failed loads (exceptions) are not
+    cached.
+
+    The least recently used entries are evicted beyond ``maxsize``.
+    """
+
+    def __init__(self, maxsize: int = 1024, refresh_workers: int = 4, empty_ttl: float = 5.0):
+        self.maxsize = maxsize
+        self.empty_ttl = empty_ttl
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._loading: Dict[Hashable, Future] = {}
+        self._async_loading: Dict[Hashable, "asyncio.Task"] = {}
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="cache-refresh")
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, loader: Callable[[], Any], ttl: float, stale_ttl: float = 0.0) -> Any:
+        """Value of ``key``, calling ``loader`` when it is missing or too old."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now < entry.stale_until:
+                self._entries.move_to_end(key)
+                if now < entry.expires_at:
+                    self.hits += 1
+                else:
+                    self.stale_hits += 1
+                    if key not in self._loading:
+                        self._loading[key] = Future()
+                        self._refresher.submit(self._load, key, loader, ttl, stale_ttl)
+                return entry.value
+            self.misses += 1
+            future = self._loading.get(key)
+            owner = future is None
+            if owner:
+                future = self._loading[key] = Future()
+        if owner:
+            self._load(key, loader, ttl, stale_ttl)
+        return future.result()
+
+    def _load(self, key: Hashable, loader: Callable[[], Any], ttl: float, stale_ttl: float) -> None:
+        with self._lock:
+            future = self._loading[key]
+        try:
+            value = loader()
+        except Exception as e:
+            logger.error(f"Error loading {key}: {e}")
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._store(key, value, ttl, stale_ttl)
+            del self._loading[key]
+        future.set_result(value)
+
+    async def aget(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: float,
+                   stale_ttl: float = 0.0) -> Any:
+        """``get`` for coroutine loaders, to be awaited from the event loop."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now < entry.stale_until:
+                self._entries.move_to_end(key)
+                if now < entry.expires_at:
+                    self.hits += 1
+                else:
+                    self.stale_hits += 1
+                    if key not in self._async_loading:
+                        task = self._async_loading[key] = asyncio.ensure_future(
+                            self._aload(key, loader, ttl, stale_ttl))
+                        # The error is logged by _aload, nobody awaits a background refresh
+                        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                return entry.value
+            self.misses += 1
+            task = self._async_loading.get(key)
+            if task is None:
+                task = self._async_loading[key] = asyncio.ensure_future(self._aload(key, loader, ttl, stale_ttl))
+        # A caller giving up (client disconnected) does not cancel the load the others wait for
+        return await asyncio.shield(task)
+
+    async def _aload(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: float, stale_ttl: float) -> Any:
+        try:
+            value = await loader()
+        except Exception as e:
+            logger.error(f"Error loading {key}: {e}")
+            raise
+        else:
+            with self._lock:
+                self._store(key, value, ttl, stale_ttl)
+            return value
+        finally:
+            with self._lock:
+                self._async_loading.pop(key, None)
+
+    def _store(self, key: Hashable, value: Any, ttl: float, stale_ttl: float) -> None:
+        # Called with the lock held
+        if not value:
+            ttl, stale_ttl = min(ttl, self.empty_ttl), 0.0
+        now = time.monotonic()
+        self._entries[key] = _Entry(value, now + ttl, now + ttl + stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop ``key``, or every entry when no key is given."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
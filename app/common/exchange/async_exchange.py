@@ -0,0 +1,69 @@
+import asyncio
+from typing import Dict, List, Optional
+
+import httpx
+
+from common.exchange.utils.rate_limiter import RateLimiter, get_limiter
+from common.metrics import httpx_bytes_hook, instrument_class
+from settings import get_settings
+
+
+class AsyncExchange:
+    """
+    Non-blocking counterpart of ``Exchange`` for the API layer.
+
+    Adapters talk to the exchange REST API directly through one
+    ``httpx.AsyncClient`` per exchange class: connections are kept alive and
+    pooled across requests, and every call is bounded by the configured
+    timeouts. Calls go through the same limiter as the sync adapter of the
+    exchange (``limiter().acall``).
+    """
+    BASE_URL = ""
+    # Key of the exchange in rate_limiter.EXCHANGE_LIMITS
+    LIMITER = "default"
+    # Methods whose latency and errors are recorded in common.metrics
+    INSTRUMENTED = ("get_account_details", "get_spot_pair", "get_spot_pairs", "get_ticker_data", "execute_order")
+    _http_clients: Dict[str, httpx.AsyncClient] = {}
+
+    def __init__(self, name) -> None:
+        self.name = name
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        instrument_class(cls, cls.INSTRUMENTED)
+
+    @classmethod
+    def limiter(cls) -> RateLimiter:
+        return get_limiter(cls.LIMITER)
+
+    @classmethod
+    def http(cls) -> httpx.AsyncClient:
+        # One pool per exchange class, shared by every instance and request
+        if cls.__name__ not in AsyncExchange._http_clients:
+            settings = get_settings()
+            AsyncExchange._http_clients[cls.__name__] = httpx.AsyncClient(
+                base_url=cls.BASE_URL,
+                timeout=httpx.Timeout(settings["HTTP_TIMEOUT"], connect=settings["HTTP_CONNECT_TIMEOUT"]),
+                limits=httpx.Limits(max_connections=settings["HTTP_MAX_CONNECTIONS"],
+                                    max_keepalive_connections=settings["HTTP_MAX_KEEPALIVE"]),
+                event_hooks={"response": [httpx_bytes_hook(cls.LIMITER)]},
+            )
+        return AsyncExchange._http_clients[cls.__name__]
+
+    @staticmethod
+    async def close_clients() -> None:
+        clients = list(AsyncExchange._http_clients.values())
+        AsyncExchange._http_clients.clear()
+        await asyncio.gather(*(client.aclose() for client in clients))
+
+    async def get_account_details(self, all_details: bool = False, flag_portfolio: bool = False):
+        raise NotImplementedError("Not implemented here")
+
+    async def get_spot_pair(self, first_pair: str = "BTC", second_pair: str = "USD") -> Optional[float]:
+        raise NotImplementedError("Not implemented here")
+
+    async def get_spot_pairs(self, first_pairs: List[str], second_pair: str = "USD") -> Dict[str, float]:
+        """Latest price of each asset of ``first_pairs`` in ``second_pair``, keyed by asset."""
+        spots = await asyncio.gather(*(self.get_spot_pair(first_pair=asset, second_pair=second_pair)
+                                       for asset in first_pairs))
+        return {asset: float(spot) for asset, spot in zip(first_pairs, spots) if spot}
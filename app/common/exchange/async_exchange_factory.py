@@ -0,0 +1,19 @@
+import importlib
+from typing import Dict, Tuple
+
+from common.exchange.async_exchange import AsyncExchange
+
+# Same lazy registry as exchange_factory, for the async adapters
+ASYNC_EXCHANGE_REGISTRY: Dict[str, Tuple[str, str]] = {
+    "binance": ("common.exchange.binance.async_binance", "AsyncBinance"),
+    "kraken": ("common.exchange.kraken.async_kraken", "AsyncKraken"),
+    "coinbase": ("common.exchange.coinbase.async_coinbase", "AsyncCoinbase"),
+    "replay": ("common.exchange.replay.async_replay", "AsyncReplay"),
+}
+
+
+def async_exchange_factory(exchange_used: str) -> AsyncExchange:
+    if exchange_used not in ASYNC_EXCHANGE_REGISTRY:
+        raise Exception("Exchange Unknown")
+    module, class_name = ASYNC_EXCHANGE_REGISTRY[exchange_used]
+    return getattr(importlib.import_module(module), class_name)(exchange_used)
@@ -0,0 +1,78 @@
+import hashlib
+import hmac
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlencode
+
+from common.exchange.async_exchange import AsyncExchange
+from settings import get_settings
+
+
+class AsyncBinance(AsyncExchange):
+    BASE_URL = "https://api.binance.com"
+    RECV_WINDOW = 5000
+    LIMITER = "binance"
+    # Paths grouped by the endpoint weights of rate_limiter.EXCHANGE_LIMITS
+    ENDPOINTS = {"/api/v3/account": "account", "/api/v3/ticker/price": "ticker", "/api/v3/klines": "klines",
+                 "/api/v3/order": "order"}
+
+    async def _signed_get(self, path: str, params: Dict[str, any] = None) -> any:
+        async def request():
+            # Signed per attempt: a retry gets a fresh timestamp within the receive window
+            query = urlencode({**(params or {}), "timestamp": int(time.time() * 1000),
+                               "recvWindow": self.RECV_WINDOW})
+            settings = get_settings()
+            signature = hmac.new(settings["API_SECRET_KEY_BINANCE"].encode(), query.encode(),
+                                 hashlib.sha256).hexdigest()
+            response = await self.http().get(f"{path}?{query}&signature={signature}",
+                                             headers={"X-MBX-APIKEY": settings["API_KEY_BINANCE"]})
+            response.raise_for_status()
+            return response.json()
+
+        return await self.limiter().acall(request, endpoint=self.ENDPOINTS.get(path, path))
+
+    async def _public_get(self, path: str, params: Dict[str, any] = None) -> any:
+        async def request():
+            response = await self.http().get(path, params=params)
+            response.raise_for_status()
+            return response.json()
+
+        return await self.limiter().acall(request, endpoint=self.ENDPOINTS.get(path, path))
+
+    async def get_account_details(self, all_details: bool = False, flag_portfolio: bool = False) -> Dict[str, any]:
+        account_details = await self._signed_get("/api/v3/account")
+        if all_details:
+            return {
+                "all": account_details
+            }
+        if flag_portfolio:
+            portfolio = [b for b in account_details["balances"] if float(b["free"]) > 0.1]
+            for p in portfolio:
+                p[p["asset"]] = p.pop("free")
+            return {
+                "portfolio": portfolio,
+                "assets": [p["asset"] for p in portfolio]
+            }
+        raise Exception("please select an option (eg: all_details or flag_portfolio)")
+
+    async def get_spot_pair(self, first_pair: str = "BTC", second_pair: str = "USDT") -> Optional[float]:
+        if first_pair == second_pair:
+            return 1.0
+        symbol = f'{first_pair}{second_pair}'
+        try:
+            ticker = await self._public_get("/api/v3/ticker/price", {"symbol": symbol})
+            return float(ticker["price"])
+        except Exception as e:
+            print(f"Cannot get this symbol {symbol}: {e}")
+            return 0
+
+    async def get_spot_pairs(self, first_pairs: List[str], second_pair: str = "USDT") -> Dict[str, float]:
+        # One call returns the last price of every symbol
+        prices = {t["symbol"]: float(t["price"]) for t in await self._public_get("/api/v3/ticker/price")}
+        spots = {}
+        for asset in first_pairs:
+            if asset == second_pair:
+                spots[asset] = 1.0
+            elif f"{asset}{second_pair}" in prices:
+                spots[asset] = prices[f"{asset}{second_pair}"]
+        return spots
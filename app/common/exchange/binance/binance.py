@@ -1,22 +1,53 @@
-from typing import Dict
+from typing import Dict, List
 from binance import Client #hint
 from datetime import datetime 
-from common.exchange.exchange import Exchange
-from settings import API_KEY_BINANCE, API_SECRET_KEY_BINANCE
+from common.exchange.exchange import Exchange, new_client_order_id
+from common.exchange.utils.candles import candles_from_rows
+from common.exchange.utils.products import Product, format_decimal
+from common.exchange.utils.rate_limiter import LimitedClient, classify
+from settings import get_settings
+
+# Client methods grouped by the endpoint weights of rate_limiter.EXCHANGE_LIMITS
+ENDPOINTS = {
+    "ping": "ping",
+    "get_klines": "klines",
+    "get_symbol_ticker": "ticker",
+    "get_account": "account",
+    "get_exchange_info": "exchange_info",
+    "get_order": "order_status",
+    "create_order": "order",
+    "order_market": "order",
+    "order_limit": "order",
+}
+# Binance answers -2010 "Duplicate order sent." to a client order id still open
+DUPLICATE_ORDER = "Duplicate order"
+
 
 class Binance(Exchange):
-    client: Client = None
+    _client: Client = None
+    # Kline intervals keyed by candle size in seconds
+    INTERVALS = {60: "1m", 300: "5m", 900: "15m", 3600: "1h", 21600: "6h", 86400: "1d"}
+    MAX_CANDLES = 1000
+    LIMITER = "binance"
 
     def __init__(self, name):
         super().__init__(name)
-        if self.client is None:
-            self.create_client_binance()
+
+    @property
+    def client(self) -> Client:
+        # Client() pings the API, it is only built for the first call that needs it
+        return self.create_client_binance()
 
     @classmethod
     def create_client_binance(cls):
-        if cls.client is None:
-            cls.client = Client(api_key=API_KEY_BINANCE, api_secret=API_SECRET_KEY_BINANCE)
-        return cls.client
+        if cls._client is None:
+            limiter = cls.limiter()
+            settings = get_settings()
+            client = limiter.call(Client, api_key=settings["API_KEY_BINANCE"],
+                                  api_secret=settings["API_SECRET_KEY_BINANCE"], endpoint="ping")
+            cls._client = LimitedClient(client, limiter, endpoint=lambda name, args: ENDPOINTS.get(name, name),
+                                        unsafe={"order"})
+        return cls._client
     
     def get_account_details(self, all_details: bool = False, flag_portfolio: bool = False) -> Dict[str, any]:
         account_details = self.client.get_account()
@@ -46,15 +77,36 @@ class Binance(Exchange):
             print(f"Cannot get this symbol {symbol}")
             return 0
         
-    def get_ticker_data(self, symbol, time_basis='1m', limit=5):
+    def get_spot_pairs(self, first_pairs: List[str], second_pair: str = "USDT") -> Dict[str, float]:
+        # One call returns the last price of every symbol
+        prices = {t["symbol"]: float(t["price"]) for t in self.client.get_symbol_ticker()}
+        spots = {}
+        for asset in first_pairs:
+            if asset == second_pair:
+                spots[asset] = 1.0
+            elif f"{asset}{second_pair}" in prices:
+                spots[asset] = prices[f"{asset}{second_pair}"]
+        return spots
+
+    def get_ticker_data(self, symbol, time_basis='1m', limit=5, as_array: bool = False):
         try:
             ticker_data = self.client.get_klines(symbol=symbol, interval=time_basis, limit=limit)
+            if as_array:
+                return self._format_ticker_array(ticker_data)
             formatted_data = self._format_ticker_data(ticker_data)
             return formatted_data
         except Exception as e:
             print(f"Error retrieving ticker data: {e}")
             return None
 
+    def _get_ticker_chunk(self, symbol: str, granularity: int, start: int, end: int, as_array: bool = False):
+        klines = self.client.get_klines(symbol=symbol, interval=self.INTERVALS[granularity],
+                                        startTime=start * 1000, endTime=end * 1000 - 1,
+                                        limit=self.MAX_CANDLES)
+        if as_array:
+            return self._format_ticker_array(klines)
+        return self._format_ticker_data(klines)
+
     def _format_ticker_data(self, ticker_data):
         formatted_data = []
         for entry in ticker_data:
@@ -77,6 +129,60 @@ class Binance(Exchange):
             formatted_data.append(formatted_entry)
 
         return formatted_data
+
+    def _format_ticker_array(self, ticker_data):
+        # [open time (ms), open, high, low, close, volume, close time, ...]
+        return candles_from_rows(ticker_data, columns=(0, 1, 2, 3, 4, 5), timestamp_divisor=1000)
         
-    def execute_order(quantity: float, pair: str, buy: bool, order_type: str):
-        pass
\ No newline at end of file
+    def load_products(self) -> List[Product]:
+        products = []
+        for symbol in self.client.get_exchange_info()["symbols"]:
+            if symbol.get("status") != "TRADING":
+                continue
+            filters = {f["filterType"]: f for f in symbol["filters"]}
+            lot_size = filters.get("LOT_SIZE", {})
+            notional = filters.get("NOTIONAL") or filters.get("MIN_NOTIONAL") or {}
+            products.append(Product(symbol["symbol"], symbol["baseAsset"], symbol["quoteAsset"],
+                                    base_increment=lot_size.get("stepSize", 0),
+                                    quote_increment=filters.get("PRICE_FILTER", {}).get("tickSize", 0),
+                                    min_size=lot_size.get("minQty", 0), max_size=lot_size.get("maxQty"),
+                                    min_notional=notional.get("minNotional", 0)))
+        return products
+
+    def execute_order(self, quantity, pair: str, buy: bool, order_type: str = "market", price=None,
+                      client_order_id: str = None) -> Dict[str, any]:
+        client_order_id = client_order_id or new_client_order_id()
+        params = {"symbol": pair, "side": "BUY" if buy else "SELL", "type": order_type.upper(),
+                  "quantity": format_decimal(quantity), "newClientOrderId": client_order_id,
+                  # RESULT adds the status and the executed quantity, without the fills of FULL
+                  "newOrderRespType": "RESULT"}
+        if order_type == "limit":
+            if price is None:
+                return {"error": "Limit orders require a price", "client_order_id": client_order_id}
+            params.update(price=format_decimal(price), timeInForce="GTC")
+        elif order_type != "market":
+            return {"error": f"Unsupported order type: {order_type}", "client_order_id": client_order_id}
+        try:
+            order = self.client.create_order(**params)
+        except Exception as e:
+            # After a timeout, a 5xx or a duplicate the order may exist: it is looked up by its client id
+            order = None
+            if DUPLICATE_ORDER in str(e) or classify(e)[0] == "retry":
+                order = self._find_order(pair, client_order_id)
+            if order is None:
+                print(f"Error executing order for {pair}: {e}")
+                return {"error": str(e), "client_order_id": client_order_id}
+        status = "filled" if order.get("status") == "FILLED" else "open"
+        executed = float(order.get("executedQty") or 0)
+        if executed and order_type == "market":
+            # Market orders report what they got (less than asked when the book was thin) at its average price
+            quantity, price, status = executed, float(order["cummulativeQuoteQty"]) / executed, "filled"
+        return self._acknowledgement(order["orderId"], client_order_id, pair, buy, quantity, price, order_type,
+                                     status, order)
+
+    def _find_order(self, pair: str, client_order_id: str):
+        try:
+            return self.client.get_order(symbol=pair, origClientOrderId=client_order_id)
+        except Exception as e:
+            print(f"Order {client_order_id} not found on {pair}: {e}")
+            return None
@@ -0,0 +1,102 @@
+import logging
+from typing import Dict, List, Optional
+
+from coinbase import jwt_generator
+
+from common.exchange.async_exchange import AsyncExchange
+from settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCoinbase(AsyncExchange):
+    BASE_URL = "https://api.coinbase.com"
+    LIMITER = "coinbase"
+
+    async def _get(self, path: str, params: Dict[str, any] = None) -> Dict[str, any]:
+        """Authenticated GET on the Advanced Trade API.
+
+        Args:
+            path: Request path (e.g., '/api/v3/brokerage/accounts').
+            params: Query parameters, lists are sent as repeated keys.
+
+        Returns:
+            Decoded JSON response.
+        """
+        async def request():
+            # The JWT is bound to the method and path and only lives for two minutes, one is built per attempt
+            settings = get_settings()
+            token = jwt_generator.build_rest_jwt(jwt_generator.format_jwt_uri("GET", path),
+                                                 settings["API_KEY_COINBASE"], settings["API_SECRET_KEY_COINBASE"])
+            response = await self.http().get(path, params=params, headers={"Authorization": f"Bearer {token}"})
+            response.raise_for_status()
+            return response.json()
+
+        return await self.limiter().acall(request, endpoint="private")
+
+    async def get_account_details(self, all_details: bool = False, flag_portfolio: bool = False) -> Dict[str, any]:
+        """Retrieve account balance details.
+
+        Args:
+            all_details: If True, return all balance details.
+            flag_portfolio: If True, return portfolio with every asset.
+
+        Returns:
+            Dictionary containing account details or portfolio.
+        """
+        try:
+            accounts = await self._get("/api/v3/brokerage/accounts", {"limit": 250})
+            balances = {account['available_balance']['currency']: float(account['available_balance']['value'])
+                        for account in accounts['accounts']}
+            if all_details:
+                return {"all": balances}
+            if flag_portfolio:
+                portfolio = [{"asset": k, k: v} for k, v in balances.items()]
+                return {"portfolio": portfolio, "assets": list(balances)}
+            raise Exception("Please select an option (e.g., all_details or flag_portfolio)")
+        except Exception as e:
+            logger.error(f"Error retrieving account details: {e}")
+            raise
+
+    async def get_spot_pair(self, first_pair: str = "BTC", second_pair: str = "USD") -> Optional[float]:
+        """
+        Get the latest spot price for a trading pair.
+
+        Args:
+            first_pair: Base asset (e.g., 'BTC').
+            second_pair: Quote asset (e.g., 'USD').
+
+        Returns:
+            Latest spot price as a float, or None on error.
+        """
+        symbol = f"{first_pair}-{second_pair}"
+        try:
+            product = await self._get(f"/api/v3/brokerage/products/{symbol}")
+            return float(product['price'])
+        except Exception as e:
+            logger.error(f"Error getting spot price for {symbol}: {e}")
+            return None
+
+    async def get_spot_pairs(self, first_pairs: List[str], second_pair: str = "USD") -> Dict[str, float]:
+        """
+        Get the latest spot price of several assets with a single products call.
+
+        Args:
+            first_pairs: Base assets (e.g., ['BTC', 'ETH']).
+            second_pair: Quote asset (e.g., 'USD').
+
+        Returns:
+            Dictionary of asset -> latest price, assets without a product are left out.
+        """
+        spots = {asset: 1.0 for asset in first_pairs if asset == second_pair}
+        product_ids = [f"{asset}-{second_pair}" for asset in first_pairs if asset != second_pair]
+        if not product_ids:
+            return spots
+        try:
+            products = await self._get("/api/v3/brokerage/products", {"product_ids": product_ids})
+            for product in products['products']:
+                if product['price']:
+                    spots[product['product_id'].split('-')[0]] = float(product['price'])
+        except Exception as e:
+            logger.error(f"Error getting spot prices for {product_ids}: {e}")
+        return spots
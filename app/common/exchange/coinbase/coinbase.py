@@ -1,32 +1,56 @@
 from typing import Dict, List, Optional
 from coinbase.rest import RESTClient
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
 
-from app.settings import API_KEY_COINBASE, API_SECRET_KEY_COINBASE
+from common.exchange.exchange import Exchange, new_client_order_id
+from common.exchange.utils.candles import candles_from_rows
+from common.exchange.utils.products import Product, format_decimal
+from common.exchange.utils.rate_limiter import LimitedClient
+from settings import get_settings
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class Coinbase:
-    api: RESTClient = None
+class Coinbase(Exchange):
+    _api: RESTClient = None
     VALID_INTERVALS = [60, 300, 900, 3600, 21600, 86400]  # Coinbase candlestick intervals in seconds (1m, 5m, 15m, 1h, 6h, 1d)
+    INTERVALS = {
+        60: "ONE_MINUTE",
+        300: "FIVE_MINUTE",
+        900: "FIFTEEN_MINUTE",
+        3600: "ONE_HOUR",
+        21600: "SIX_HOUR",
+        86400: "ONE_DAY",
+    }
+    # Max candles per API call (API limit)
+    MAX_CANDLES = 350
+    HISTORY_WORKERS = 8
+    LIMITER = "coinbase"
 
     def __init__(self, name: str):
-        self.name = name
-        if self.api is None:
-            self.create_api_coinbase()
+        super().__init__(name)
+
+    @property
+    def api(self) -> RESTClient:
+        """Shared API client, built on first use."""
+        return self.create_api_coinbase()
 
     @classmethod
     def create_api_coinbase(cls) -> RESTClient:
-        """Initialize the Coinbase Advanced Trade API client."""
-        if cls.api is None:
-            cls.api = RESTClient(
-                api_key=API_KEY_COINBASE,
-                api_secret=API_SECRET_KEY_COINBASE
+        """Initialize the Coinbase Advanced Trade API client, its calls rate limited."""
+        if cls._api is None:
+            cls._api = LimitedClient(
+                RESTClient(
+                    api_key=get_settings()["API_KEY_COINBASE"],
+                    api_secret=get_settings()["API_SECRET_KEY_COINBASE"]
+                ),
+                cls.limiter(),
+                # get_public_* endpoints have their own limit, everything else is private
+                endpoint=lambda name, args: "public" if name.startswith("get_public_") else "private",
             )
-        return cls.api
+        return cls._api
 
     def get_account_details(self, all_details: bool = False, flag_portfolio: bool = False, min_balance: float = 0.1) -> Dict[str, any]:
         """Retrieve account balance details.
@@ -77,44 +101,106 @@ class Coinbase:
             logger.error(f"Error getting spot price for {symbol}: {e}")
             return None
 
-    def execute_order(self, quantity: float, pair: str, buy: bool, order_type: str = "market") -> Dict[str, any]:
-        """Execute a buy or sell order on Coinbase.
+    def get_spot_pairs(self, first_pairs: List[str], second_pair: str = "USD") -> Dict[str, float]:
+        """
+        Get the latest spot price of several assets with a single products call.
+
+        Args:
+            first_pairs: Base assets (e.g., ['BTC', 'ETH']).
+            second_pair: Quote asset (e.g., 'USD').
+
+        Returns:
+            Dictionary of asset -> latest price, assets without a product are left out.
+        """
+        spots = {asset: 1.0 for asset in first_pairs if asset == second_pair}
+        product_ids = [f"{asset}-{second_pair}" for asset in first_pairs if asset != second_pair]
+        if not product_ids:
+            return spots
+        try:
+            products = self.api.get_products(product_ids=product_ids)
+            for product in products['products']:
+                if product['price']:
+                    spots[product['product_id'].split('-')[0]] = float(product['price'])
+        except Exception as e:
+            logger.error(f"Error getting spot prices for {product_ids}: {e}")
+        return spots
+
+    def load_products(self) -> List[Product]:
+        """Retrieve the size and price rules of every tradable product in one call.
+
+        Returns:
+            List of products keyed by product id (e.g., BTC-USD).
+        """
+        products = []
+        for product in self.api.get_products()['products']:
+            product = product.to_dict() if hasattr(product, 'to_dict') else product
+            if product.get('trading_disabled') or product.get('is_disabled'):
+                continue
+            products.append(Product(
+                product['product_id'],
+                product['base_currency_id'],
+                product['quote_currency_id'],
+                base_increment=product['base_increment'],
+                quote_increment=product['quote_increment'],
+                min_size=product.get('base_min_size') or 0,
+                max_size=product.get('base_max_size'),
+                min_notional=product.get('quote_min_size') or 0,
+            ))
+        return products
+
+    def execute_order(self, quantity, pair: str, buy: bool, order_type: str = "market", price=None,
+                      client_order_id: str = None) -> Dict[str, any]:
+        """Place a buy or sell order on Coinbase.
+
+        Coinbase returns the existing order when a client order id is sent again,
+        so a retried call never places a second one.
 
         Args:
-            quantity: Order volume (in base asset).
+            quantity: Order volume (in base asset), on the product's base increment.
             pair: Trading pair (e.g., BTC-USD).
             buy: True for buy order, False for sell.
-            order_type: Order type (e.g., 'market', 'limit').
+            order_type: 'market' or 'limit' (good till cancelled).
+            price: Limit price, on the product's quote increment.
+            client_order_id: Idempotency key of the order, generated when missing.
 
         Returns:
-            Dictionary with order details or error.
-
-        Raises:
-            Exception: If API error occurs.
+            Order acknowledgement (see ``Exchange.execute_order``) or a dictionary with the error.
         """
+        client_order_id = client_order_id or new_client_order_id()
+        side = 'BUY' if buy else 'SELL'
         try:
             if order_type == "market":
                 order = self.api.market_order(
-                    client_order_id=f"{pair}_{'buy' if buy else 'sell'}_{datetime.now().timestamp()}",
+                    client_order_id=client_order_id,
                     product_id=pair,
-                    side='BUY' if buy else 'SELL',
-                    base_size=str(quantity)
+                    side=side,
+                    base_size=format_decimal(quantity)
                 )
             elif order_type == "limit":
-                raise NotImplementedError("Limit orders require a price parameter")
+                if price is None:
+                    raise ValueError("Limit orders require a price")
+                order = self.api.limit_order_gtc(
+                    client_order_id=client_order_id,
+                    product_id=pair,
+                    side=side,
+                    base_size=format_decimal(quantity),
+                    limit_price=format_decimal(price)
+                )
             else:
                 raise ValueError(f"Unsupported order type: {order_type}")
 
-            if 'error' in order:
-                raise Exception(f"Error executing order: {order.get('error')}")
-            logger.info(f"Order executed: {order}")
-            return order
+            order = order.to_dict() if hasattr(order, 'to_dict') else order
+            if not order.get('success'):
+                raise Exception(f"Error executing order: {order.get('error_response') or order.get('failure_reason')}")
+            logger.info(f"Order placed: {order}")
+            return self._acknowledgement(order['success_response']['order_id'], client_order_id, pair, buy, quantity,
+                                         price, order_type, "open", order)
         except Exception as e:
             logger.error(f"Error executing order for {pair}: {e}")
-            return {'error': str(e)}
+            return {'error': str(e), 'client_order_id': client_order_id}
 
-    def get_ticker_data(self, symbol: str, time_basis: str = '60', start: str = "", end: str = "") -> List[
-        Dict[str, any]]:
+    def get_ticker_data(self, symbol: str, time_basis: str = '60', start: str = "", end: str = "",
+                        as_array: bool = False) -> List[Dict[str, any]]:
         """Retrieve OHLC ticker data for a symbol.
 
         Args:
@@ -122,59 +208,53 @@ class Coinbase:
             time_basis: Candlestick interval in seconds (e.g., '60' for 1 minute).
             start: Start date in MM-DD-YYYY format.
             end: End date in MM-DD-YYYY format.
+            as_array: If True, return a CANDLE_DTYPE structured array instead of dicts.
 
         Returns:
-            List of formatted OHLC data or None on error.
+            List of formatted OHLC data (or array) or None on error.
         """
         if int(time_basis) not in self.VALID_INTERVALS:
             logger.error(f"Invalid time_basis {time_basis}. Valid intervals: {self.VALID_INTERVALS}")
             return None
 
-        # Max candles per API call (API limit)
-        _MAX_CANDLES = 350
-        # Calculate max seconds per call for the given time_basis
-        max_seconds_per_call = _MAX_CANDLES * int(time_basis)
-
-        data = []
-
         try:
             start_dt = datetime.strptime(start, '%m-%d-%Y')
             end_dt = datetime.strptime(end, '%m-%d-%Y')
-
-            # Convert time_basis to API granularity (e.g., 60 seconds = ONE_MINUTE)
-            granularity = "ONE_MINUTE" if time_basis == "60" else f"{int(time_basis)}_SECONDS"
-
-            # Current timestamp for iteration
-            current_start = start_dt
-
-            while current_start < end_dt:
-                # Calculate end time for this chunk (max 350 candles)
-                end_temp = min(current_start + timedelta(seconds=max_seconds_per_call), end_dt)
-
-                candles = self.api.get_candles(
-                    symbol,
-                    granularity=granularity,
-                    start=int(current_start.timestamp()),
-                    end=int(end_temp.timestamp())
-                )
-
-                if not candles['candles']:
-                    logger.warning(f"No candle data returned for {symbol} from {current_start} to {end_temp}")
-                else:
-                    formatted_data = self._format_ticker_data(candles['candles'])
-                    data.append(formatted_data)
-
-                # Move to the next chunk (add 1 second to avoid overlap)
-                current_start = end_temp + timedelta(seconds=1)
-
-            # Flatten the list of lists into a single list
-            result = [item for sublist in data for item in sublist]
-            return result
-
+            return self.get_ticker_history(symbol, int(time_basis), int(start_dt.timestamp()), int(end_dt.timestamp()),
+                                           as_array=as_array)
         except Exception as e:
             logger.error(f"Error retrieving ticker data for {symbol}: {e}")
             return None
 
+    def _get_ticker_chunk(self, symbol: str, granularity: int, start: int, end: int,
+                          as_array: bool = False) -> List[Dict[str, any]]:
+        """Retrieve one chunk of at most 350 OHLC candles with ``start <= open time < end``.
+
+        Args:
+            symbol: Trading pair (e.g., BTC-USD).
+            granularity: Candlestick interval in seconds.
+            start: Start as epoch seconds.
+            end: End as epoch seconds (exclusive).
+            as_array: If True, return a CANDLE_DTYPE structured array instead of dicts.
+
+        Returns:
+            List of formatted OHLC data (or array), oldest first.
+        """
+        # The API end bound is inclusive
+        candles = self.api.get_candles(
+            symbol,
+            granularity=self.INTERVALS[granularity],
+            start=start,
+            end=end - 1
+        )
+        if not candles['candles']:
+            logger.warning(f"No candle data returned for {symbol} from {start} to {end}")
+            return self._format_ticker_array([]) if as_array else []
+        # Candles come back newest first
+        if as_array:
+            return self._format_ticker_array(candles['candles'])[::-1]
+        return self._format_ticker_data(candles['candles'])[::-1]
+
     def _format_ticker_data(self, ticker_data: List[Dict]) -> List[Dict[str, any]]:
         """Format raw OHLC data into a structured format.
 
@@ -198,6 +278,18 @@ class Coinbase:
             formatted_data.append(formatted_entry)
         return formatted_data
 
+    def _format_ticker_array(self, ticker_data: List[Dict]):
+        """Decode raw OHLC data into a CANDLE_DTYPE structured array in one pass.
+
+        Args:
+            ticker_data: Raw OHLC data from Coinbase API.
+
+        Returns:
+            Structured array with epoch timestamps and float OHLCV.
+        """
+        rows = [(e['start'], e['open'], e['high'], e['low'], e['close'], e['volume']) for e in ticker_data]
+        return candles_from_rows(rows, columns=(0, 1, 2, 3, 4, 5))
+
     def get_available_pairs(self) -> List[str]:
         """Retrieve all available trading pairs on Coinbase.
 
@@ -205,9 +297,7 @@ class Coinbase:
             List of trading pair symbols or empty list on error.
         """
         try:
-            products = self.api.get_products()
-            return [product['product_id'] for product in products['products']]
+            return self.products().symbols()
         except Exception as e:
             logger.error(f"Error getting available pairs: {e}")
             return []
-
@@ -1,20 +1,141 @@
-from typing import List
+import uuid
+from typing import Dict, List
+
+from common.metrics import instrument_class
+from common.exchange.utils.downloader import ChunkedDownloader, plan_chunks
+from common.exchange.utils.products import Product, ProductIndex
+from common.exchange.utils.rate_limiter import BULK, RateLimiter, get_limiter, request_priority
+
+def new_client_order_id() -> str:
+    """Client order id accepted by every exchange (32 hex characters: Binance allows 36, Kraken a UUID)."""
+    return uuid.uuid4().hex
+
 
 class Exchange: 
+    # Candle sizes (seconds) supported by get_ticker_history, mapped to the exchange's own value
+    INTERVALS: Dict[int, any] = {}
+    # Max candles returned by one history call
+    MAX_CANDLES = 300
+    # Concurrent history calls in flight (their rate is set by the exchange limiter)
+    HISTORY_WORKERS = 4
+    # Key of the exchange in rate_limiter.EXCHANGE_LIMITS
+    LIMITER = "default"
+    # Methods whose latency and errors are recorded in common.metrics
+    INSTRUMENTED = ("get_account_details", "get_spot_pair", "get_spot_pairs", "get_ticker_data",
+                    "get_ticker_history", "execute_order", "load_products")
+    # Product rules of each adapter class, loaded once and shared by its instances
+    _product_indexes: Dict[str, ProductIndex] = {}
+
     def __init__(self, name) -> None:
         self.name = name
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        instrument_class(cls, cls.INSTRUMENTED)
+
+    @classmethod
+    def limiter(cls) -> RateLimiter:
+        # Every outbound call of the adapter goes through it, see rate_limiter
+        return get_limiter(cls.LIMITER)
+
+    def products(self) -> ProductIndex:
+        """Order rules of every product, loaded from ``load_products`` on first use."""
+        key = type(self).__name__
+        if key not in Exchange._product_indexes:
+            Exchange._product_indexes[key] = ProductIndex(self.load_products)
+        return Exchange._product_indexes[key]
+
+    def load_products(self) -> List[Product]:
+        """Every product of the exchange with its size and price rules (one call to the products endpoint)."""
+        raise NotImplementedError("Not implemented here")
+
+    def get_available_pairs(self) -> List[str]:
+        return self.products().symbols()
+
     def get_account_details(self, all_details: bool = False, flag_portfolio: bool = False):
         raise NotImplementedError("Not implemented here")
     
     def get_spot_pair(self, first_pair: str = "BTC", second_pair: str = "USD", interval: str = "1m"):
         raise NotImplementedError("Not implemented here")
     
+    def get_spot_pairs(self, first_pairs: List[str], second_pair: str = "USD") -> Dict[str, float]:
+        """Latest price of each asset of ``first_pairs`` in ``second_pair``, keyed by asset.
+
+        Adapters override this with the exchange's multi-symbol ticker endpoint;
+        assets without a price are left out.
+        """
+        spots = {}
+        for asset in first_pairs:
+            spot = self.get_spot_pair(first_pair=asset, second_pair=second_pair)
+            if spot:
+                spots[asset] = float(spot)
+        return spots
+
     def get_ticker_data(self, symbol: str, time_basis: str ='1m', limit: int=5):
         raise NotImplementedError("Not implemented here")
     
+    def get_ticker_history(self, symbol: str, granularity: int, start: int, end: int,
+                           checkpoint_dir: str = None, as_array: bool = False):
+        """Candles of ``granularity`` seconds with ``start <= open time < end`` (epoch seconds).
+
+        The range is split into ``MAX_CANDLES`` chunks fetched concurrently through
+        ``_get_ticker_chunk``; ``checkpoint_dir`` lets an interrupted download resume,
+        its files stay until ``downloader.clear_checkpoints`` (once the candles are stored).
+        With ``as_array`` the candles come back as a ``CANDLE_DTYPE`` structured array
+        instead of a list of dicts. The calls are ``BULK`` priority: they give way
+        to pricing and account calls on the same exchange.
+        """
+        if granularity not in self.INTERVALS:
+            raise ValueError(f"Invalid granularity {granularity}. Valid intervals: {list(self.INTERVALS)}")
+
+        def fetch(chunk_start: int, chunk_end: int):
+            with request_priority(BULK):
+                return self._get_ticker_chunk(symbol, granularity, chunk_start, chunk_end, as_array=as_array)
+
+        downloader = ChunkedDownloader(fetch, max_workers=self.HISTORY_WORKERS, checkpoint_dir=checkpoint_dir,
+                                       step=granularity * self.MAX_CANDLES, clear=False)
+        return downloader.download(plan_chunks(start, end, granularity, self.MAX_CANDLES))
+
+    def history_start(self, granularity: int):
+        """Open time of the oldest candle of ``granularity`` the exchange still serves, None when it keeps them all."""
+        return None
+
+    def _get_ticker_chunk(self, symbol: str, granularity: int, start: int, end: int, as_array: bool = False):
+        """One history call: at most ``MAX_CANDLES`` candles with ``start <= open time < end``, oldest first."""
+        raise NotImplementedError("Not implemented here")
+
     def _format_ticker_data(self, ticker_data: List[any], limit: int):
         raise NotImplementedError("Not implemented here")
+
+    def _format_ticker_array(self, ticker_data: List[any]):
+        """Bulk decode of raw candles into a ``CANDLE_DTYPE`` array (no per-row dicts or strftime)."""
+        raise NotImplementedError("Not implemented here")
     
-    def execute_order(quantity: float, pair: str, buy: bool, order_type: str):
-        raise NotImplementedError("Not implemented here")
\ No newline at end of file
+    def execute_order(self, quantity, pair: str, buy: bool, order_type: str = "market", price=None,
+                      client_order_id: str = None) -> Dict[str, any]:
+        """Send an order and return its acknowledgement, ``{"error": ...}`` when the exchange refused it.
+
+        ``quantity`` (base currency) and ``price`` (limit orders) are expected on the
+        product increments, see ``process.execution.OrderExecutor``. The exchange
+        keeps ``client_order_id`` with the order, a resent order with the same id
+        is not placed twice where the exchange supports it. The acknowledgement
+        holds ``order_id``, ``client_order_id``, ``pair``, ``side``, ``quantity``,
+        ``price``, ``order_type`` and ``status`` ("open" or "filled").
+        """
+        raise NotImplementedError("Not implemented here")
+
+    @staticmethod
+    def _acknowledgement(order_id, client_order_id: str, pair: str, buy: bool, quantity, price, order_type: str,
+                         status: str, response: any = None) -> Dict[str, any]:
+        # Same shape on every exchange: it is what strategies get in ``on_fill``
+        return {
+            "order_id": str(order_id),
+            "client_order_id": client_order_id,
+            "pair": pair,
+            "side": "BUY" if buy else "SELL",
+            "quantity": float(quantity),
+            "price": float(price) if price is not None else None,
+            "order_type": order_type,
+            "status": status,
+            "response": response,
+        }
@@ -1,16 +1,34 @@
+import importlib
+from typing import Dict, Tuple, Type
+
 from common.exchange.exchange import Exchange
-from common.exchange.binance.binance import Binance
-from common.exchange.kraken.kraken import Kraken
 
-from app.common.exchange.coinbase.coinbase import Coinbase
+# Adapter of each exchange as (module, class). A module (and its SDK) is only imported the first time
+# its exchange is asked for.
+EXCHANGE_REGISTRY: Dict[str, Tuple[str, str]] = {
+    "binance": ("common.exchange.binance.binance", "Binance"),
+    "kraken": ("common.exchange.kraken.kraken", "Kraken"),
+    "coinbase": ("common.exchange.coinbase.coinbase", "Coinbase"),
+    # Recorded or synthetic answers, no exchange access (load tests, offline runs)
+    "replay": ("common.exchange.replay.replay", "Replay"),
+}
+
+_classes: Dict[str, Type[Exchange]] = {}
+
+
+def register_exchange(exchange_used: str, module: str, class_name: str) -> None:
+    EXCHANGE_REGISTRY[exchange_used] = (module, class_name)
+    _classes.pop(exchange_used, None)
+
+
+def exchange_class(exchange_used: str) -> Type[Exchange]:
+    if exchange_used not in _classes:
+        if exchange_used not in EXCHANGE_REGISTRY:
+            raise Exception("Exchange Unknown")
+        module, class_name = EXCHANGE_REGISTRY[exchange_used]
+        _classes[exchange_used] = getattr(importlib.import_module(module), class_name)
+    return _classes[exchange_used]
 
 
 def exchange_factory(exchange_used: str) -> Exchange:
-    if exchange_used == "binance":
-        return Binance("binance")
-    elif exchange_used == "kraken":
-        return Kraken("kraken")
-    elif exchange_used == "coinbase":
-        return Coinbase("coinbase")
-    else:
-        raise Exception("Exchange Unknown")
\ No newline at end of file
+    return exchange_class(exchange_used)(exchange_used)
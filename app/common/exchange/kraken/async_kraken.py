@@ -0,0 +1,101 @@
+import base64
+import hashlib
+import hmac
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlencode
+
+from common.exchange.async_exchange import AsyncExchange
+from common.exchange.kraken.errors import TRADE_METHODS, raise_for_retryable
+from settings import get_settings
+
+
+class AsyncKraken(AsyncExchange):
+    BASE_URL = "https://api.kraken.com"
+    LIMITER = "kraken"
+    asset_pairs: Dict[str, Dict[str, any]] = None
+    _nonce = 0
+    _nonce_lock = threading.Lock()
+
+    @classmethod
+    def _next_nonce(cls) -> int:
+        # Kraken rejects a nonce that is not greater than the previous one, concurrent calls included
+        with cls._nonce_lock:
+            cls._nonce = max(cls._nonce + 1, int(time.time() * 1000))
+            return cls._nonce
+
+    async def _query_private(self, method: str, data: Dict[str, any] = None) -> Dict[str, any]:
+        path = f"/0/private/{method}"
+
+        async def request():
+            # Signed per attempt: every retry needs a new nonce
+            signed = {**(data or {}), "nonce": self._next_nonce()}
+            postdata = urlencode(signed)
+            message = path.encode() + hashlib.sha256((str(signed["nonce"]) + postdata).encode()).digest()
+            settings = get_settings()
+            signature = hmac.new(base64.b64decode(settings["API_SECRET_KEY_KRAKEN"]), message, hashlib.sha512)
+            response = await self.http().post(path, content=postdata, headers={
+                "API-Key": settings["API_KEY_KRAKEN"],
+                "API-Sign": base64.b64encode(signature.digest()).decode(),
+                "Content-Type": "application/x-www-form-urlencoded; charset=utf-8",
+            })
+            response.raise_for_status()
+            return response.json()
+
+        endpoint = "trade" if method in TRADE_METHODS else "private"
+        return self._result(method, await self.limiter().acall(request, endpoint=endpoint, check=raise_for_retryable))
+
+    async def _query_public(self, method: str, params: Dict[str, any] = None) -> Dict[str, any]:
+        async def request():
+            response = await self.http().get(f"/0/public/{method}", params=params)
+            response.raise_for_status()
+            return response.json()
+
+        return self._result(method, await self.limiter().acall(request, endpoint="public", check=raise_for_retryable))
+
+    @staticmethod
+    def _result(method: str, response: Dict[str, any]) -> Dict[str, any]:
+        if response.get('error'):
+            raise Exception(f"Error calling {method}: {response['error']}")
+        return response['result']
+
+    async def get_account_details(self, all_details: bool = False, flag_portfolio: bool = False) -> Dict[str, any]:
+        balances = await self._query_private('Balance')
+        if all_details:
+            return {
+                "all": balances
+            }
+        if flag_portfolio:
+            portfolio = [{k: v, "asset": k} for k, v in balances.items() if float(v) > 0.1]
+            return {
+                "portfolio": portfolio,
+                "assets": [p["asset"] for p in portfolio]
+            }
+        raise Exception("please select an option (e.g., all_details or flag_portfolio)")
+
+    async def get_spot_pair(self, first_pair: str = "BTC", second_pair: str = "USD") -> Optional[float]:
+        if first_pair == "USDT":
+            return 1.0
+        symbol = f'{first_pair}{second_pair}'
+        try:
+            tickers = await self._query_public('Ticker', {'pair': symbol})
+            return float(next(iter(tickers.values()))['c'][0])
+        except Exception as e:
+            print(f"Error getting data for symbol {symbol}: {e}")
+            return 0
+
+    async def get_spot_pairs(self, first_pairs: List[str], second_pair: str = "USD") -> Dict[str, float]:
+        # Same lookup as Kraken.get_spot_pairs: balance codes are the ``base`` of AssetPairs
+        if AsyncKraken.asset_pairs is None:
+            AsyncKraken.asset_pairs = await self._query_public('AssetPairs')
+        quotes = {second_pair, f"Z{second_pair}"}
+        pairs = {pair: details['base'] for pair, details in AsyncKraken.asset_pairs.items()
+                 if details.get('quote') in quotes and details.get('base') in first_pairs}
+        spots = {asset: 1.0 for asset in first_pairs if asset in quotes}
+        if pairs:
+            tickers = await self._query_public('Ticker', {'pair': ','.join(pairs)})
+            for pair, ticker in tickers.items():
+                if pair in pairs:
+                    spots[pairs[pair]] = float(ticker['c'][0])
+        return spots
@@ -0,0 +1,23 @@
+from typing import Dict
+
+from common.exchange.utils.rate_limiter import RetryableError
+
+# Private methods counted by the trading rate limit instead of the private API counter
+TRADE_METHODS = {"AddOrder", "AddOrderBatch", "EditOrder", "CancelOrder", "CancelAll", "CancelOrderBatch"}
+# Kraken answers with HTTP 200 and an ``error`` list, these are worth waiting for
+RATE_LIMIT_ERRORS = ("EAPI:Rate limit exceeded", "EGeneral:Too many requests", "EGeneral:Temporary lockout",
+                     "EOrder:Rate limit exceeded")
+UNAVAILABLE_ERRORS = ("EService:Unavailable", "EService:Busy")
+
+
+def raise_for_retryable(response: Dict[str, any]) -> None:
+    """Raise ``RetryableError`` when the response failed for a reason that goes away by itself.
+
+    Other errors are left in the response for the caller.
+    """
+    errors = response.get('error') if isinstance(response, dict) else None
+    for error in errors or []:
+        if error.startswith(RATE_LIMIT_ERRORS):
+            raise RetryableError(f"Kraken: {error}", rate_limited=True)
+        if error.startswith(UNAVAILABLE_ERRORS):
+            raise RetryableError(f"Kraken: {error}")
@@ -1,23 +1,48 @@
+import time
 from typing import Dict, List
 from krakenex import API
 from datetime import datetime
+from decimal import Decimal
 
-from common.exchange.exchange import Exchange
-from settings import API_KEY_KRAKEN, API_SECRET_KEY_KRAKEN
+from common.exchange.exchange import Exchange, new_client_order_id
+from common.exchange.kraken.errors import TRADE_METHODS, raise_for_retryable
+from common.exchange.utils.candles import candles_from_rows
+from common.exchange.utils.products import Product, format_decimal
+from common.exchange.utils.rate_limiter import LimitedClient
+from settings import get_settings
 
 class Kraken(Exchange):
-    api: API = None
+    _api: API = None
+    asset_pairs: Dict[str, Dict[str, any]] = None
+    # OHLC intervals (minutes) keyed by candle size in seconds
+    INTERVALS = {60: 1, 300: 5, 900: 15, 3600: 60, 14400: 240, 86400: 1440}
+    # Kraken only serves the most recent 720 candles of an interval
+    MAX_CANDLES = 720
+    HISTORY_WORKERS = 2
+    LIMITER = "kraken"
 
     def __init__(self, name):
         super().__init__(name)
-        if self.api is None:
-            self.create_api_kraken()
+
+    @property
+    def api(self) -> API:
+        return self.create_api_kraken()
 
     @classmethod
     def create_api_kraken(cls):
-        if cls.api is None:
-            cls.api = API(key=API_KEY_KRAKEN, secret=API_SECRET_KEY_KRAKEN)
-        return cls.api
+        if cls._api is None:
+            settings = get_settings()
+            api = API(key=settings["API_KEY_KRAKEN"], secret=settings["API_SECRET_KEY_KRAKEN"])
+            cls._api = LimitedClient(api, cls.limiter(), endpoint=cls._endpoint, check=raise_for_retryable,
+                                     unsafe={"trade"})
+        return cls._api
+
+    @staticmethod
+    def _endpoint(name: str, args: tuple) -> str:
+        # query_public('OHLC', ...) -> "public", query_private('Balance') -> "private", orders -> "trade"
+        if name == "query_private":
+            return "trade" if args and args[0] in TRADE_METHODS else "private"
+        return "public" if name == "query_public" else name
     
     def get_account_details(self, all_details: bool = False, flag_portfolio: bool = False) -> Dict[str, any]:
         account_details = self.api.query_private('Balance')
@@ -55,24 +80,118 @@ class Kraken(Exchange):
             print(f"Error getting data for symbol {symbol}: {e}")
             return 0
         
-    def execute_order(self, quantity: float, pair: str, buy: bool, order_type: str):
-        # Implement order execution for Kraken
-        # You may use the 'AddOrder' API method with appropriate parameters
-        pass
+    def get_spot_pairs(self, first_pairs: List[str], second_pair: str = "USD") -> Dict[str, float]:
+        # Balance assets use Kraken's codes (XXBT, XETH, ...) which are the ``base`` of AssetPairs,
+        # so the pair of each asset is looked up there and all of them are priced in one Ticker call
+        if Kraken.asset_pairs is None:
+            Kraken.asset_pairs = self._query_public('AssetPairs')
+        quotes = {second_pair, f"Z{second_pair}"}
+        pairs = {}
+        for pair, details in Kraken.asset_pairs.items():
+            if details.get('quote') in quotes and details.get('base') in first_pairs:
+                pairs[pair] = details['base']
+        spots = {asset: 1.0 for asset in first_pairs if asset in quotes}
+        if pairs:
+            tickers = self._query_public('Ticker', {'pair': ','.join(pairs)})
+            for pair, ticker in tickers.items():
+                if pair in pairs:
+                    # ``c`` is the last trade closed: [price, lot volume]
+                    spots[pairs[pair]] = float(ticker['c'][0])
+        return spots
+
+    def _query_public(self, method: str, params: Dict[str, any] = None) -> Dict[str, any]:
+        response = self.api.query_public(method, params or {})
+        if response.get('error'):
+            raise Exception(f"Error calling {method}: {response['error']}")
+        return response['result']
 
-    def get_ticker_data(self, symbol: str, time_basis: str ='1m', limit: int=5):
+    def load_products(self) -> List[Product]:
+        Kraken.asset_pairs = self._query_public('AssetPairs')
+        products = []
+        for pair, details in Kraken.asset_pairs.items():
+            if details.get('status', 'online') != 'online':
+                continue
+            # Volumes have ``lot_decimals`` decimals, prices are multiples of ``tick_size``
+            tick_size = details.get('tick_size') or Decimal(1).scaleb(-int(details['pair_decimals']))
+            aliases = [name for name in (details.get('altname'), details.get('wsname')) if name]
+            products.append(Product(pair, details['base'], details['quote'],
+                                    base_increment=Decimal(1).scaleb(-int(details['lot_decimals'])),
+                                    quote_increment=tick_size, min_size=details.get('ordermin', 0),
+                                    min_notional=details.get('costmin', 0), aliases=aliases))
+        return products
+
+    def execute_order(self, quantity, pair: str, buy: bool, order_type: str = "market", price=None,
+                      client_order_id: str = None) -> Dict[str, any]:
+        client_order_id = client_order_id or new_client_order_id()
+        params = {'pair': pair, 'type': 'buy' if buy else 'sell', 'ordertype': order_type,
+                  'volume': format_decimal(quantity), 'cl_ord_id': client_order_id}
+        if order_type == 'limit':
+            if price is None:
+                return {"error": "Limit orders require a price", "client_order_id": client_order_id}
+            params['price'] = format_decimal(price)
+        elif order_type != 'market':
+            return {"error": f"Unsupported order type: {order_type}", "client_order_id": client_order_id}
         try:
-            ticker_data = self.api.query_public('OHLC', {'pair': symbol, 'interval': time_basis})
-            print(ticker_data)
-            formatted_data = self._format_ticker_data(ticker_data['result'][symbol], limit)
+            # Not retried after a timeout: the caller reconciles with ``client_order_id``
+            response = self.api.query_private('AddOrder', params)
+        except Exception as e:
+            print(f"Error executing order for {pair}: {e}")
+            return {"error": str(e), "client_order_id": client_order_id}
+        if response.get('error'):
+            print(f"Order refused for {pair}: {response['error']}")
+            return {"error": ", ".join(response['error']), "client_order_id": client_order_id}
+        result = response['result']
+        return self._acknowledgement(result['txid'][0], client_order_id, pair, buy, quantity, price, order_type,
+                                     "open", result)
+
+    def get_ticker_data(self, symbol: str, time_basis: str ='1m', limit: int=5, since: int = None,
+                        as_array: bool = False):
+        try:
+            ticker_data, _ = self._query_ohlc(symbol, time_basis, since)
+            if as_array:
+                return self._format_ticker_array(ticker_data[-limit:] if limit else ticker_data)
+            formatted_data = self._format_ticker_data(ticker_data, limit)
             return formatted_data
         except Exception as e:
             print(f"Error retrieving ticker data: {e}")
             return None
 
-    def _format_ticker_data(self, ticker_data: List[any], limit: int):
+    def history_start(self, granularity: int) -> int:
+        # The newest MAX_CANDLES candles, the one still open included: older ``since`` values are ignored
+        now = int(time.time())
+        return now - now % granularity - (self.MAX_CANDLES - 1) * granularity
+
+    def _get_ticker_chunk(self, symbol: str, granularity: int, start: int, end: int, as_array: bool = False):
+        # ``since`` is exclusive, each page holds up to MAX_CANDLES candles after it and
+        # the ``last`` cursor (open time of its last committed candle) to ask the next page from
+        ticker_data, since = [], start - 1
+        while True:
+            page, last = self._query_ohlc(symbol, self.INTERVALS[granularity], since)
+            # Pages overlap on the candle still open when they were served
+            newest = int(ticker_data[-1][0]) if ticker_data else start - 1
+            ticker_data.extend(e for e in page if newest < int(e[0]) < end)
+            if not page or last is None or int(last) <= since or int(last) + granularity >= end:
+                break
+            since = int(last)
+        if as_array:
+            return self._format_ticker_array(ticker_data)
+        return self._format_ticker_data(ticker_data)
+
+    def _query_ohlc(self, symbol: str, interval, since: int = None):
+        params = {'pair': symbol, 'interval': interval}
+        if since is not None:
+            params['since'] = since
+        ticker_data = self.api.query_public('OHLC', params)
+        if ticker_data.get('error'):
+            raise Exception(f"Error retrieving OHLC data: {ticker_data['error']}")
+        result = ticker_data['result']
+        # The result is keyed by Kraken's own pair name (e.g. XXBTZUSD), next to the ``last`` cursor
+        pair = next(k for k in result if k != 'last')
+        return result[pair], result.get('last')
+
+    def _format_ticker_data(self, ticker_data: List[any], limit: int = None):
         formatted_data = []
-        for entry in ticker_data[-limit:]:
+        for entry in (ticker_data[-limit:] if limit else ticker_data):
             timestamp = datetime.utcfromtimestamp(entry[0]).strftime('%Y-%m-%d %H:%M:%S')
             open_price = float(entry[1])
             high_price = float(entry[2])
@@ -93,15 +212,13 @@ class Kraken(Exchange):
 
         return formatted_data
 
+    def _format_ticker_array(self, ticker_data: List[any]):
+        # [time, open, high, low, close, vwap, volume, count]
+        return candles_from_rows(ticker_data, columns=(0, 1, 2, 3, 4, 6))
+
     def get_available_pairs(self):
         try:
-            asset_pairs = self.api.query_public('AssetPairs')
-            print(asset_pairs['result'].keys())
-            if 'error' in asset_pairs:
-                raise Exception(f"Error retrieving asset pairs: {asset_pairs['error']}")
-            if 'result' not in asset_pairs or not asset_pairs['result']:
-                raise Exception("No asset pairs found")
-            return list(asset_pairs['result'].keys())
+            return self.products().symbols()
         except Exception as e:
             print(f"Error getting available pairs: {e}")
-            return []
\ No newline at end of file
+            return []
@@ -0,0 +1,41 @@
+import asyncio
+from typing import Dict, List, Optional
+
+from common.exchange.async_exchange import AsyncExchange
+from common.exchange.replay.replay import Replay, order_kwargs
+
+
+class AsyncReplay(AsyncExchange):
+    """``Replay`` for the async API path: same answers, balances and orders, the latency is awaited."""
+    LIMITER = "replay"
+
+    def __init__(self, name: str = "replay"):
+        super().__init__(name)
+        self.replay = Replay(name)
+
+    async def _call(self, method: str, **kwargs):
+        async def call():
+            if self.replay.source is None:
+                await asyncio.sleep(self.replay.latency_sample())
+                self.replay.inject_error(method)
+            return self.replay.respond(method, **kwargs)
+
+        return await self.limiter().acall(call, endpoint=method)
+
+    async def get_account_details(self, all_details: bool = False, flag_portfolio: bool = False) -> Dict[str, any]:
+        return await self._call("get_account_details", all_details=all_details, flag_portfolio=flag_portfolio)
+
+    async def get_spot_pair(self, first_pair: str = "BTC", second_pair: str = "USD") -> Optional[float]:
+        return await self._call("get_spot_pair", first_pair=first_pair, second_pair=second_pair)
+
+    async def get_spot_pairs(self, first_pairs: List[str], second_pair: str = "USD") -> Dict[str, float]:
+        return await self._call("get_spot_pairs", first_pairs=list(first_pairs), second_pair=second_pair)
+
+    async def get_ticker_data(self, symbol: str, time_basis='1m', limit: int = 5, as_array: bool = False):
+        return await self._call("get_ticker_data", symbol=symbol, time_basis=time_basis, limit=limit,
+                                as_array=as_array)
+
+    async def execute_order(self, quantity, pair: str, buy: bool, order_type: str = "market", price=None,
+                            client_order_id: str = None) -> Dict[str, any]:
+        return await self._call("execute_order",
+                                **order_kwargs(quantity, pair, buy, order_type, price, client_order_id))
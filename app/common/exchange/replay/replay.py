@@ -0,0 +1,520 @@
+"""
+Exchange without an exchange, for load tests and offline runs.
+
+``Replay`` implements the whole ``Exchange`` interface from one of two sources:
+
+* a recording (JSONL, ``REPLAY_RECORDING``): the answers a real adapter gave,
+  captured by running ``Replay`` with ``REPLAY_RECORD_FROM`` set to that
+  exchange. Calls are matched on method and arguments, repeated calls cycle
+  through the recorded answers; calls that were never recorded fall back to
+  the synthetic market;
+* a synthetic market: seeded random walks (one per pair) of one minute candles
+  from ``ORIGIN`` on, coarser candles aggregated from them. A candle only
+  depends on the seed, the pair and its time, so any range or any order of
+  calls gives the same prices. Balances come from ``REPLAY_BALANCES`` and
+  orders fill against the walk.
+
+Every call waits the configured latency and fails with probability
+``REPLAY_ERROR_RATE`` (as a connection error, retried by the rate limiter like a
+real one), so the whole stack can be soak-tested at any request rate.
+"""
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from common.exchange.exchange import Exchange
+from common.exchange.utils.candles import CANDLE_DTYPE, empty_candles
+from common.exchange.utils.products import Product
+from settings import get_settings
+
+# First candle of every walk (2020-01-01 UTC, aligned on every granularity)
+ORIGIN = 1_577_836_800
+BLOCK_MINUTES = 1440
+STABLE_QUOTES = ("USDT", "USDC", "USD", "EUR")
+START_PRICES = {"BTC": 7_000.0, "ETH": 130.0, "SOL": 1.0, "ADA": 0.03, "XRP": 0.2, "DOT": 3.0, "DOGE": 0.002,
+                "LINK": 2.0, "LTC": 40.0, "AVAX": 5.0, "MATIC": 0.015, "ATOM": 4.0, "UNI": 3.0, "XLM": 0.05}
+TIME_BASIS = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600, "6h": 21600, "1d": 86400}
+_MISSING = object()
+
+
+class ReplayError(ConnectionError):
+    """Injected failure, seen by the rate limiter as a transient connection error."""
+
+
+def split_pair(symbol: str, quote: str = "USD") -> Tuple[str, str]:
+    """"BTC-USD", "BTC/USD" and "BTCUSD" -> ("BTC", "USD")."""
+    for separator in ("-", "/"):
+        if separator in symbol:
+            base, quote = symbol.split(separator, 1)
+            return base, quote
+    for candidate in STABLE_QUOTES:
+        if symbol.endswith(candidate) and len(symbol) > len(candidate):
+            return symbol[:-len(candidate)], candidate
+    return symbol, quote
+
+
+def order_kwargs(quantity, pair: str, buy: bool, order_type: str, price=None, client_order_id: str = None):
+    # Floats (not the Decimals of the executor) so the call can be recorded, optional arguments only when set
+    kwargs = {"quantity": float(quantity), "pair": pair, "buy": buy, "order_type": order_type}
+    if price is not None:
+        kwargs["price"] = float(price)
+    if client_order_id is not None:
+        kwargs["client_order_id"] = client_order_id
+    return kwargs
+
+
+class RandomWalkMarket:
+    """Deterministic one minute candles per pair, generated a day (block) at a time."""
+
+    def __init__(self, seed: int = 0, volatility: float = 0.001, max_blocks: int = 512):
+        self.seed = seed
+        self.volatility = volatility
+        self.max_blocks = max_blocks
+        self._blocks: "OrderedDict[Tuple[str, int], Dict[str, np.ndarray]]" = OrderedDict()
+        self._offsets: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(symbol: str) -> str:
+        base, quote = split_pair(symbol)
+        # Stablecoin quotes share the USD walk
+        return f"{base}-{'USD' if quote in STABLE_QUOTES else quote}"
+
+    def _rng(self, key: str, block: int) -> np.random.Generator:
+        return np.random.default_rng([self.seed, zlib.crc32(key.encode()), block])
+
+    def _start_price(self, key: str) -> float:
+        base, quote = key.split("-", 1)
+        if base == quote:
+            return 1.0
+        return START_PRICES.get(base, 10.0 ** (zlib.crc32(base.encode()) % 5 - 1))
+
+    def _offset(self, key: str, block: int) -> float:
+        # Log return accumulated before ``block``, the returns of a block are the first draws of its generator
+        with self._lock:
+            offsets = self._offsets.setdefault(key, [0.0])
+            while len(offsets) <= block:
+                offsets.append(offsets[-1] + self._rng(key, len(offsets) - 1).normal(0, self.volatility,
+                                                                                     BLOCK_MINUTES).sum())
+            return offsets[block]
+
+    def _block(self, key: str, block: int) -> Dict[str, np.ndarray]:
+        with self._lock:
+            cached = self._blocks.get((key, block))
+            if cached is not None:
+                self._blocks.move_to_end((key, block))
+                return cached
+        rng = self._rng(key, block)
+        returns = rng.normal(0, self.volatility, BLOCK_MINUTES)
+        spread = np.abs(rng.normal(0, self.volatility / 2, BLOCK_MINUTES))
+        volume = rng.lognormal(1, 1, BLOCK_MINUTES)
+        log_close = self._offset(key, block) + np.cumsum(returns)
+        close = self._start_price(key) * np.exp(log_close)
+        open_price = np.concatenate([[close[0] / np.exp(returns[0])], close[:-1]])
+        columns = {
+            "open_price": open_price,
+            "high_price": np.maximum(open_price, close) * (1 + spread),
+            "low_price": np.minimum(open_price, close) * (1 - spread),
+            "close_price": close,
+            "volume": volume,
+        }
+        with self._lock:
+            self._blocks[(key, block)] = columns
+            while len(self._blocks) > self.max_blocks:
+                self._blocks.popitem(last=False)
+        return columns
+
+    def minutes(self, symbol: str, first: int, last: int) -> Dict[str, np.ndarray]:
+        """Columns of the one minute candles ``first <= index < last`` (minutes since ``ORIGIN``)."""
+        key = self.key(symbol)
+        first = max(first, 0)
+        parts = []
+        for block in range(first // BLOCK_MINUTES, (last - 1) // BLOCK_MINUTES + 1) if last > first else []:
+            lo = max(first - block * BLOCK_MINUTES, 0)
+            hi = min(last - block * BLOCK_MINUTES, BLOCK_MINUTES)
+            parts.append({name: values[lo:hi] for name, values in self._block(key, block).items()})
+        if not parts:
+            return {name: np.empty(0) for name in CANDLE_DTYPE.names[1:]}
+        return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+    def candles(self, symbol: str, granularity: int, start: int, end: int) -> np.ndarray:
+        """``CANDLE_DTYPE`` candles of ``granularity`` seconds with ``start <= open time < end``."""
+        step = granularity // 60
+        # Candles open at ORIGIN + k * granularity (ORIGIN is aligned on every granularity)
+        k_first = -(-(max(start, ORIGIN) - ORIGIN) // granularity)
+        k_last = -(-(end - ORIGIN) // granularity) if end > ORIGIN else 0
+        if k_last <= k_first:
+            return empty_candles()
+        first, last = k_first * step, k_last * step
+        columns = self.minutes(symbol, first, last)
+        n = k_last - k_first
+        candles = np.empty(n, dtype=CANDLE_DTYPE)
+        candles["timestamp"] = ORIGIN + (first + np.arange(n) * step) * 60
+        grouped = {name: values.reshape(n, step) for name, values in columns.items()}
+        candles["open_price"] = grouped["open_price"][:, 0]
+        candles["high_price"] = grouped["high_price"].max(axis=1)
+        candles["low_price"] = grouped["low_price"].min(axis=1)
+        candles["close_price"] = grouped["close_price"][:, -1]
+        candles["volume"] = grouped["volume"].sum(axis=1)
+        return candles
+
+    def price(self, symbol: str, timestamp: float) -> float:
+        """Close of the minute containing ``timestamp``."""
+        index = int(max(timestamp - ORIGIN, 0) // 60)
+        return float(self.minutes(symbol, index, index + 1)["close_price"][0])
+
+
+class Recording:
+    """Exchange answers keyed by method and arguments, in a JSONL file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.responses: Dict[str, List[any]] = {}
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r") as stream:
+                for line in stream:
+                    entry = json.loads(line)
+                    self.responses.setdefault(entry["key"], []).append(entry["response"])
+
+    @staticmethod
+    def key(method: str, kwargs: Dict[str, any]) -> str:
+        return json.dumps([method, kwargs], sort_keys=True, default=str)
+
+    @staticmethod
+    def _encode(response):
+        if isinstance(response, np.ndarray):
+            return {"__candles__": response.tolist()}
+        return response
+
+    @staticmethod
+    def _decode(response):
+        if isinstance(response, dict) and "__candles__" in response:
+            return np.array([tuple(row) for row in response["__candles__"]], dtype=CANDLE_DTYPE)
+        return response
+
+    def get(self, key: str):
+        """Next recorded answer of ``key`` (cycling through them), ``_MISSING`` if there is none."""
+        with self._lock:
+            responses = self.responses.get(key)
+            if not responses:
+                return _MISSING
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+        return self._decode(responses[position % len(responses)])
+
+    def append(self, key: str, response) -> None:
+        with self._lock:
+            self.responses.setdefault(key, []).append(self._encode(response))
+            with open(self.path, "a") as stream:
+                stream.write(json.dumps({"key": key, "response": self._encode(response)}, default=str) + "\n")
+
+
+class ReplayBook:
+    """Balances, fills and resting orders of a replay exchange, shared by its sync and async adapters."""
+
+    def __init__(self, balances: Dict[str, float]):
+        self.balances = dict(balances)
+        self.fills: List[Dict[str, any]] = []
+        self.open_orders: Dict[str, Dict[str, any]] = {}
+        # Funds held by the open orders per asset, they pay for the fill and can't be spent meanwhile
+        self.held: Dict[str, float] = {}
+        # Open orders that could not be filled when they matched
+        self.rejected: List[Dict[str, any]] = []
+        # Acknowledgements by client order id: an order sent twice is placed once
+        self.client_orders: Dict[str, Dict[str, any]] = {}
+        # Reentrant: an order is checked, placed and recorded under one hold of the lock
+        self.lock = threading.RLock()
+        self.next_id = 0
+
+
+class Replay(Exchange):
+    INTERVALS = {60: 60, 300: 300, 900: 900, 3600: 3600, 21600: 21600, 86400: 86400}
+    MAX_CANDLES = 1000
+    HISTORY_WORKERS = 8
+    LIMITER = "replay"
+    _books: Dict[str, ReplayBook] = {}
+    _markets: Dict[int, RandomWalkMarket] = {}
+    _recordings: Dict[str, Recording] = {}
+
+    def __init__(self, name: str = "replay", seed: int = None, recording: str = None, record_from: str = None,
+                 latency: float = None, latency_jitter: float = None, error_rate: float = None,
+                 balances: Dict[str, float] = None, fee: float = 0.001, slippage: float = 0.0005,
+                 clock: Callable[[], float] = time.time):
+        super().__init__(name)
+        settings = get_settings()
+        self.seed = settings["REPLAY_SEED"] if seed is None else seed
+        self.latency = settings["REPLAY_LATENCY"] if latency is None else latency
+        self.latency_jitter = settings["REPLAY_LATENCY_JITTER"] if latency_jitter is None else latency_jitter
+        self.error_rate = settings["REPLAY_ERROR_RATE"] if error_rate is None else error_rate
+        self.fee = fee
+        self.slippage = slippage
+        self.clock = clock
+        self.random = random.Random(self.seed)
+        self.market = Replay._markets.setdefault(self.seed, RandomWalkMarket(self.seed))
+        balances = settings["REPLAY_BALANCES"] if balances is None else balances
+        self.book = Replay._books.setdefault(name, ReplayBook(balances))
+
+        recording = settings["REPLAY_RECORDING"] if recording is None else recording
+        if recording and recording not in Replay._recordings:
+            Replay._recordings[recording] = Recording(recording)
+        self.recording = Replay._recordings.get(recording) if recording else None
+        record_from = settings["REPLAY_RECORD_FROM"] if record_from is None else record_from
+        self.source: Optional[Exchange] = None
+        if record_from:
+            if self.recording is None:
+                raise ValueError("Recording an exchange needs REPLAY_RECORDING (the file to write)")
+            from common.exchange.exchange_factory import exchange_factory
+            self.source = exchange_factory(record_from)
+            # History is chunked like the recorded exchange so the chunks can be matched again
+            self.INTERVALS = self.source.INTERVALS
+            self.MAX_CANDLES = self.source.MAX_CANDLES
+
+    @classmethod
+    def reset(cls, name: str = None) -> None:
+        """Forget the balances, fills and orders of ``name`` (every replay exchange by default)."""
+        if name is None:
+            cls._books.clear()
+        else:
+            cls._books.pop(name, None)
+
+    # ------------------------------------------------------------- plumbing
+    def latency_sample(self) -> float:
+        return self.latency + self.random.uniform(0, self.latency_jitter) if self.latency or self.latency_jitter else 0.0
+
+    def inject_error(self, method: str) -> None:
+        if self.error_rate and self.random.random() < self.error_rate:
+            raise ReplayError(f"Injected {method} failure on {self.name}")
+
+    def respond(self, method: str, **kwargs):
+        """Answer of ``method``: recorded (or recorded now from the source), synthetic otherwise."""
+        key = Recording.key(method, kwargs)
+        if self.source is not None:
+            response = getattr(self.source, method)(**kwargs)
+            self.recording.append(key, response)
+            return response
+        if self.recording is not None:
+            recorded = self.recording.get(key)
+            if recorded is not _MISSING:
+                return recorded
+        return getattr(self, f"_synthetic_{method.lstrip('_')}")(**kwargs)
+
+    def _call(self, method: str, **kwargs):
+        def call():
+            if self.source is None:
+                time.sleep(self.latency_sample())
+                self.inject_error(method)
+            return self.respond(method, **kwargs)
+
+        return self.limiter().call(call, endpoint=method)
+
+    # ------------------------------------------------------------ interface
+    def get_account_details(self, all_details: bool = False, flag_portfolio: bool = False) -> Dict[str, any]:
+        return self._call("get_account_details", all_details=all_details, flag_portfolio=flag_portfolio)
+
+    def get_spot_pair(self, first_pair: str = "BTC", second_pair: str = "USD", interval: str = None):
+        return self._call("get_spot_pair", first_pair=first_pair, second_pair=second_pair)
+
+    def get_spot_pairs(self, first_pairs: List[str], second_pair: str = "USD") -> Dict[str, float]:
+        return self._call("get_spot_pairs", first_pairs=list(first_pairs), second_pair=second_pair)
+
+    def get_ticker_data(self, symbol: str, time_basis='1m', limit: int = 5, as_array: bool = False):
+        return self._call("get_ticker_data", symbol=symbol, time_basis=time_basis, limit=limit, as_array=as_array)
+
+    def _get_ticker_chunk(self, symbol: str, granularity: int, start: int, end: int, as_array: bool = False):
+        return self._call("_get_ticker_chunk", symbol=symbol, granularity=granularity, start=start, end=end,
+                          as_array=as_array)
+
+    def execute_order(self, quantity, pair: str, buy: bool, order_type: str = "market", price=None,
+                      client_order_id: str = None) -> Dict[str, any]:
+        return self._call("execute_order", **order_kwargs(quantity, pair, buy, order_type, price, client_order_id))
+
+    def cancel_order(self, order_id: str) -> Dict[str, any]:
+        with self.book.lock:
+            order = self.book.open_orders.pop(order_id, None)
+            if order is not None:
+                self._release(order)
+        return {**order, "status": "cancelled"} if order else {"error": f"Unknown order {order_id}"}
+
+    def get_available_pairs(self) -> List[str]:
+        return self._call("get_available_pairs")
+
+    def load_products(self) -> List[Product]:
+        if self.source is not None:
+            return self.source.load_products()
+        # Rules of a typical USD book: satoshi sizes, cents (hundredths of a cent below $10), $1 minimum
+        products = []
+        for symbol in self.get_available_pairs():
+            base, quote = split_pair(symbol)
+            tick = "0.01" if START_PRICES.get(base, 10.0) >= 10 else "0.0001"
+            products.append(Product(symbol, base, quote, base_increment="0.00000001", quote_increment=tick,
+                                    min_size="0.00001", min_notional="1"))
+        return products
+
+    # ------------------------------------------------------------ synthetic
+    def _now(self) -> float:
+        return self.clock()
+
+    def _synthetic_get_account_details(self, all_details: bool = False, flag_portfolio: bool = False):
+        self._match_open_orders()
+        with self.book.lock:
+            balances = {asset: amount for asset, amount in self.book.balances.items() if amount > 0}
+        if all_details:
+            return {"all": balances}
+        if flag_portfolio:
+            portfolio = [{"asset": k, k: v} for k, v in balances.items()]
+            return {"portfolio": portfolio, "assets": list(balances)}
+        raise Exception("Please select an option (e.g., all_details or flag_portfolio)")
+
+    def _synthetic_get_spot_pair(self, first_pair: str = "BTC", second_pair: str = "USD") -> float:
+        if first_pair == second_pair or (first_pair in STABLE_QUOTES and second_pair in STABLE_QUOTES):
+            return 1.0
+        return self.market.price(f"{first_pair}-{second_pair}", self._now())
+
+    def _synthetic_get_spot_pairs(self, first_pairs: List[str], second_pair: str = "USD") -> Dict[str, float]:
+        return {asset: self._synthetic_get_spot_pair(asset, second_pair) for asset in first_pairs}
+
+    def _synthetic_get_ticker_data(self, symbol: str, time_basis='1m', limit: int = 5, as_array: bool = False):
+        granularity = TIME_BASIS.get(time_basis) or int(time_basis)
+        end = int(self._now()) // granularity * granularity
+        return self._synthetic_get_ticker_chunk(symbol, granularity, end - limit * granularity, end, as_array)
+
+    def _synthetic_get_ticker_chunk(self, symbol: str, granularity: int, start: int, end: int,
+                                    as_array: bool = False):
+        # Only closed candles: nothing opening after the current time
+        now = int(self._now()) // granularity * granularity
+        candles = self.market.candles(symbol, granularity, start, min(end, now))
+        return candles if as_array else self._format_ticker_data(candles)
+
+    def _synthetic_get_available_pairs(self) -> List[str]:
+        return [f"{asset}-USD" for asset in START_PRICES]
+
+    def _synthetic_execute_order(self, quantity: float, pair: str, buy: bool, order_type: str = "market",
+                                 price: float = None, client_order_id: str = None) -> Dict[str, any]:
+        # The id is checked and the order placed in one step: the same id sent twice at once is placed once
+        with self.book.lock:
+            known = self.book.client_orders.get(client_order_id) if client_order_id is not None else None
+            if known is not None:
+                return dict(known)
+            order = self._place_order(quantity, pair, buy, order_type, price)
+            if "error" not in order:
+                order.update(order_type=order_type, client_order_id=client_order_id)
+                if client_order_id is not None:
+                    self.book.client_orders[client_order_id] = dict(order)
+                if order["order_id"] in self.book.open_orders:
+                    self.book.open_orders[order["order_id"]].update(order_type=order_type,
+                                                                    client_order_id=client_order_id)
+        return order
+
+    def _place_order(self, quantity: float, pair: str, buy: bool, order_type: str, price: float = None):
+        spot = self.market.price(pair, self._now())
+        if order_type == "market":
+            return self._fill(pair, buy, quantity, spot * (1 + self.slippage if buy else 1 - self.slippage))
+        if order_type != "limit":
+            return {"error": f"Unsupported order type: {order_type}"}
+        if price is None:
+            return {"error": "Limit orders require a price"}
+        if buy and price >= spot or not buy and price <= spot:
+            # Marketable: fills now at the better of the limit and the market
+            return self._fill(pair, buy, quantity, min(price, spot) if buy else max(price, spot))
+        asset, amount = self._hold(pair, buy, quantity, price)
+        with self.book.lock:
+            if self._available(asset) < amount:
+                return {"error": f"Insufficient {asset} balance"}
+            self.book.held[asset] = self.book.held.get(asset, 0.0) + amount
+            order_id = f"{self.name}-{self.book.next_id}"
+            self.book.next_id += 1
+            order = {"order_id": order_id, "pair": pair, "side": "BUY" if buy else "SELL", "quantity": quantity,
+                     "price": price, "status": "open", "timestamp": int(self._now())}
+            self.book.open_orders[order_id] = order
+        return dict(order)
+
+    def _hold(self, pair: str, buy: bool, quantity: float, price: float) -> Tuple[str, float]:
+        # Asset and amount an open order holds: what its fill costs
+        base, quote = split_pair(pair)
+        if buy:
+            notional = quantity * price
+            return quote, notional + notional * self.fee
+        return base, quantity
+
+    def _available(self, asset: str) -> float:
+        # Called with the lock held: the balance the open orders don't hold
+        return self.book.balances.get(asset, 0.0) - self.book.held.get(asset, 0.0)
+
+    def _release(self, order: Dict[str, any]) -> None:
+        # Called with the lock held
+        asset, amount = self._hold(order["pair"], order["side"] == "BUY", order["quantity"], order["price"])
+        held = self.book.held.get(asset, 0.0) - amount
+        if held > 1e-9:
+            self.book.held[asset] = held
+        else:
+            self.book.held.pop(asset, None)
+
+    def _match_open_orders(self) -> None:
+        with self.book.lock:
+            orders = list(self.book.open_orders.values())
+        for order in orders:
+            spot = self.market.price(order["pair"], self._now())
+            buy = order["side"] == "BUY"
+            if buy and order["price"] >= spot or not buy and order["price"] <= spot:
+                with self.book.lock:
+                    if self.book.open_orders.pop(order["order_id"], None) is None:
+                        continue
+                    # The funds the order held pay for its fill
+                    self._release(order)
+                    fill = self._fill(order["pair"], buy, order["quantity"], order["price"],
+                                      order_id=order["order_id"])
+                    if "error" in fill:
+                        print(f"Open order {order['order_id']} rejected when it matched: {fill['error']}")
+                        result = {**order, "status": "rejected", "error": fill["error"]}
+                        self.book.rejected.append(result)
+                    else:
+                        result = {**order, **fill}
+                    if order.get("client_order_id") in self.book.client_orders:
+                        self.book.client_orders[order["client_order_id"]] = result
+
+    def _fill(self, pair: str, buy: bool, quantity: float, fill_price: float, order_id: str = None):
+        base, quote = split_pair(pair)
+        notional = quantity * fill_price
+        fee = notional * self.fee
+        with self.book.lock:
+            balances = self.book.balances
+            if buy:
+                if self._available(quote) < notional + fee:
+                    return {"error": f"Insufficient {quote} balance"}
+                balances[quote] = balances.get(quote, 0.0) - notional - fee
+                balances[base] = balances.get(base, 0.0) + quantity
+            else:
+                if self._available(base) < quantity:
+                    return {"error": f"Insufficient {base} balance"}
+                balances[base] = balances.get(base, 0.0) - quantity
+                balances[quote] = balances.get(quote, 0.0) + notional - fee
+            if order_id is None:
+                order_id = f"{self.name}-{self.book.next_id}"
+                self.book.next_id += 1
+            fill = {"order_id": order_id, "pair": pair, "side": "BUY" if buy else "SELL", "quantity": quantity,
+                    "price": fill_price, "fee": fee, "status": "filled", "timestamp": int(self._now())}
+            self.book.fills.append(fill)
+        return dict(fill)
+
+    def _format_ticker_data(self, ticker_data: np.ndarray, limit: int = None) -> List[Dict[str, any]]:
+        return [{
+            'timestamp': datetime.utcfromtimestamp(t).strftime('%Y-%m-%d %H:%M:%S'),
+            'open_price': o,
+            'high_price': h,
+            'low_price': l,
+            'close_price': c,
+            'volume': v,
+        } for t, o, h, l, c, v in ticker_data.tolist()]
+
+    def _format_ticker_array(self, ticker_data: np.ndarray) -> np.ndarray:
+        return ticker_data
@@ -0,0 +1,162 @@
+import functools
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from common.exchange.exchange import Exchange
+from common.exchange.utils.candles import CANDLE_DTYPE
+from common.exchange.utils.products import Product, ProductIndex
+
+
+class SimulatedExchange(Exchange):
+    """
+    Exchange backed by stored candles, used to replay history through the live
+    strategy code path. ``cursor`` is the index of the current bar: prices,
+    candles and fills never look past it. Orders fill immediately against the
+    current bar with fees and slippage. Order rules are those given to ``load``
+    or, by default, a typical USD book (see ``load_products``).
+    """
+    # In-process fills: a Prometheus observation per order would cost more than the fill itself
+    INSTRUMENTED = ()
+
+    def __init__(self, name: str = "simulated", balances: Optional[Dict[str, float]] = None,
+                 fee: float = 0.001, slippage: float = 0.0005):
+        super().__init__(name)
+        self.balances: Dict[str, float] = dict(balances or {"USD": 100_000.0})
+        self.fee = fee
+        self.slippage = slippage
+        self.candles: Dict[str, Dict[str, np.ndarray]] = {}
+        self.cursor = 0
+        self.fills: List[Dict[str, any]] = []
+        self.rules: Dict[str, Product] = {}
+        self._products: Optional[ProductIndex] = None
+
+    def load(self, pair: str, candles, product: Product = None) -> None:
+        """Register the candles of ``pair`` (DataFrame, dict of arrays or CANDLE_DTYPE array).
+
+        ``product`` sets the order rules of the pair, to replay with those of a real exchange.
+        """
+        columns = {}
+        for name in CANDLE_DTYPE.names:
+            if name == "timestamp" and hasattr(candles, "index") and "timestamp" not in candles:
+                columns[name] = np.asarray(candles.index, dtype=np.int64)
+            else:
+                columns[name] = np.asarray(candles[name])
+        self.candles[pair] = columns
+        if product is not None:
+            self.rules[pair] = product
+        # The pairs are this instance's own, not shared by the class like the adapters' products
+        self._products = None
+
+    def products(self) -> ProductIndex:
+        if self._products is None:
+            self._products = ProductIndex(self.load_products)
+        return self._products
+
+    def load_products(self) -> List[Product]:
+        # Satoshi sizes, cents (hundredths of a cent for pairs starting below 10), 1 unit of quote minimum
+        products = []
+        for pair, columns in self.candles.items():
+            if pair in self.rules:
+                products.append(self.rules[pair])
+                continue
+            base, quote = self._split(pair)
+            first_close = float(columns["close_price"][0]) if len(columns["close_price"]) else 0.0
+            products.append(Product(pair, base, quote, base_increment="0.00000001",
+                                    quote_increment="0.01" if first_close >= 10 else "0.0001",
+                                    min_size="0.00001", min_notional="1"))
+        return products
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _split(pair: str):
+        base, quote = pair.split("-")
+        return base, quote
+
+    def _bar(self, pair: str, column: str) -> float:
+        return float(self.candles[pair][column][self.cursor])
+
+    def get_account_details(self, all_details: bool = False, flag_portfolio: bool = False,
+                            min_balance: float = 0.0) -> Dict[str, any]:
+        if all_details:
+            return {"all": dict(self.balances)}
+        if flag_portfolio:
+            portfolio = [{"asset": k, k: v} for k, v in self.balances.items() if v > min_balance]
+            return {"portfolio": portfolio, "assets": [line["asset"] for line in portfolio]}
+        raise Exception("Please select an option (e.g., all_details or flag_portfolio)")
+
+    def get_spot_pair(self, first_pair: str = "BTC", second_pair: str = "USD", interval: str = None) -> Optional[float]:
+        pair = f"{first_pair}-{second_pair}"
+        if pair not in self.candles:
+            return None
+        return self._bar(pair, "close_price")
+
+    def get_ticker_data(self, symbol: str, time_basis: str = None, limit: int = 5, as_array: bool = False):
+        candles = self.candles[symbol]
+        stop = self.cursor + 1
+        window = {name: values[max(0, stop - limit):stop] for name, values in candles.items()}
+        return self._output(window, as_array)
+
+    def get_ticker_history(self, symbol: str, granularity: int, start: int, end: int,
+                           checkpoint_dir: str = None, as_array: bool = False):
+        candles = self.candles[symbol]
+        timestamps = candles["timestamp"][:self.cursor + 1]
+        lo, hi = np.searchsorted(timestamps, start), np.searchsorted(timestamps, end)
+        return self._output({name: values[lo:hi] for name, values in candles.items()}, as_array)
+
+    @staticmethod
+    def _output(window: Dict[str, np.ndarray], as_array: bool):
+        candles = np.empty(len(window["timestamp"]), dtype=CANDLE_DTYPE)
+        for name in CANDLE_DTYPE.names:
+            candles[name] = window[name]
+        if as_array:
+            return candles
+        return [dict(zip(CANDLE_DTYPE.names, row)) for row in candles.tolist()]
+
+    def execute_order(self, quantity, pair: str, buy: bool, order_type: str = "market", price=None,
+                      client_order_id: str = None) -> Dict[str, any]:
+        base, quote = self._split(pair)
+        quantity = float(quantity)
+        if price is not None:
+            price = float(price)
+        if order_type == "market":
+            fill_price = self._bar(pair, "close_price") * (1 + self.slippage if buy else 1 - self.slippage)
+        elif order_type == "limit":
+            if price is None:
+                return {"error": "Limit orders require a price"}
+            # Marketable limit orders only: fill if the bar traded through the limit
+            if buy and self._bar(pair, "low_price") > price or not buy and self._bar(pair, "high_price") < price:
+                return {"error": f"Limit order at {price} not filled"}
+            fill_price = price
+        else:
+            return {"error": f"Unsupported order type: {order_type}"}
+
+        notional = quantity * fill_price
+        fee = notional * self.fee
+        if buy:
+            if self.balances.get(quote, 0.0) < notional + fee:
+                return {"error": f"Insufficient {quote} balance"}
+            self.balances[quote] = self.balances.get(quote, 0.0) - notional - fee
+            self.balances[base] = self.balances.get(base, 0.0) + quantity
+        else:
+            if self.balances.get(base, 0.0) < quantity:
+                return {"error": f"Insufficient {base} balance"}
+            self.balances[base] = self.balances.get(base, 0.0) - quantity
+            self.balances[quote] = self.balances.get(quote, 0.0) + notional - fee
+
+        fill = self._acknowledgement(len(self.fills), client_order_id, pair, buy, quantity, fill_price, order_type,
+                                     "filled")
+        fill["fee"] = fee
+        fill["timestamp"] = int(self.candles[pair]["timestamp"][self.cursor])
+        self.fills.append(fill)
+        return fill
+
+    def equity(self, quote: str = "USD") -> float:
+        """Value of every balance in ``quote`` at the current bar."""
+        total = 0.0
+        for asset, amount in self.balances.items():
+            if asset == quote:
+                total += amount
+            elif amount:
+                total += amount * (self.get_spot_pair(asset, quote) or 0.0)
+        return total
@@ -0,0 +1,46 @@
+"""
+Array representation of candles.
+
+``CANDLE_DTYPE`` is the structured dtype shared by the bulk decode path of the
+adapters, the candle store and the indicators: int64 epoch seconds and float64
+OHLCV, with the same field names as the dicts of ``_format_ticker_data``.
+"""
+from typing import List, Sequence
+
+import numpy as np
+
+CANDLE_DTYPE = np.dtype([
+    ("timestamp", np.int64),
+    ("open_price", np.float64),
+    ("high_price", np.float64),
+    ("low_price", np.float64),
+    ("close_price", np.float64),
+    ("volume", np.float64),
+])
+
+
+def empty_candles() -> np.ndarray:
+    return np.empty(0, dtype=CANDLE_DTYPE)
+
+
+def candles_from_rows(rows: Sequence[Sequence], columns: Sequence[int], timestamp_divisor: int = 1) -> np.ndarray:
+    """Decode raw exchange rows in one vectorized conversion.
+
+    Args:
+        rows: Raw rows as returned by the exchange (numbers or numeric strings).
+        columns: Position of timestamp, open, high, low, close and volume in a row.
+        timestamp_divisor: 1000 for millisecond timestamps.
+    """
+    if len(rows) == 0:
+        return empty_candles()
+    raw = np.asarray(rows, dtype=object)[:, list(columns)].astype(np.float64)
+    candles = np.empty(len(raw), dtype=CANDLE_DTYPE)
+    candles["timestamp"] = raw[:, 0].astype(np.int64) // timestamp_divisor
+    for i, name in enumerate(CANDLE_DTYPE.names[1:], start=1):
+        candles[name] = raw[:, i]
+    return candles
+
+
+def concat_candles(chunks: List[np.ndarray]) -> np.ndarray:
+    chunks = [chunk for chunk in chunks if len(chunk)]
+    return np.concatenate(chunks) if chunks else empty_candles()
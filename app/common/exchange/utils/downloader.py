@@ -0,0 +1,138 @@
+"""
+Concurrent, rate limited download of candle history.
+
+The requested range is split into chunks up front (one API call each), the
+chunks are fetched on a thread pool (throttled by the exchange adapter's rate
+limiter, or an optional token bucket of their own), and the
+results are put back together in chronological order. With a checkpoint
+directory every finished chunk is saved to disk, so an interrupted download
+resumes with only the chunks that are still missing.
+
+Chunks are cut on multiples of their span, so the same candles fall in the
+same chunk whatever the range asked for, and a checkpoint file is named after
+that aligned span: a range ending at "now" rewrites the same file on every
+attempt instead of adding one. The checkpoints are removed once the download
+completes, or by the caller (``clear_checkpoints``) once it has stored the
+candles.
+"""
+import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from common.exchange.utils.candles import concat_candles
+from common.exchange.utils.rate_limiter import TokenBucket
+
+
+def plan_chunks(start: int, end: int, granularity: int, max_candles: int) -> List[Tuple[int, int]]:
+    """Split ``[start, end)`` into ``[chunk_start, chunk_end)`` ranges of at most ``max_candles`` candles.
+
+    The chunks are cut on multiples of ``granularity * max_candles``.
+    """
+    if start >= end:
+        return []
+    step = granularity * max_candles
+    bounds = [start, *range(start - start % step + step, end, step), end]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def clear_checkpoints(checkpoint_dir: str, start: int, end: int) -> None:
+    """Remove the checkpoints of the chunks overlapping ``[start, end)``."""
+    if not os.path.isdir(checkpoint_dir):
+        return
+    for name in os.listdir(checkpoint_dir):
+        try:
+            chunk_start, chunk_end = map(int, name[:-len(".pkl")].split("_"))
+        except ValueError:
+            continue
+        if name.endswith(".pkl") and chunk_start < end and chunk_end > start:
+            os.remove(os.path.join(checkpoint_dir, name))
+
+
+class ChunkedDownloader:
+    def __init__(self, fetch_chunk: Callable[[int, int], List], max_workers: int = 4,
+                 limiter: Optional[TokenBucket] = None, checkpoint_dir: Optional[str] = None,
+                 step: Optional[int] = None, clear: bool = True):
+        """``step`` is the span chunks are aligned on (``plan_chunks``), a checkpoint file per aligned span.
+
+        With ``clear=False`` the checkpoints outlive the download, ``clear_checkpoints`` removes them.
+        """
+        self.fetch_chunk = fetch_chunk
+        self.max_workers = max_workers
+        self.limiter = limiter
+        self.checkpoint_dir = checkpoint_dir
+        self.step = step
+        self.clear = clear
+
+    def download(self, chunks: List[Tuple[int, int]]) -> List:
+        """Fetch every chunk and return the concatenated results in chunk order.
+
+        A failing chunk re-raises once the other chunks are done; with a
+        checkpoint directory those are kept for the next attempt.
+        """
+        results = [self._load(chunk) for chunk in chunks]
+        missing = [i for i, result in enumerate(results) if result is None]
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as executor:
+                futures = {i: executor.submit(self._fetch, chunks[i]) for i in missing}
+                errors = []
+                for i, future in futures.items():
+                    try:
+                        results[i] = future.result()
+                    except Exception as e:
+                        errors.append(e)
+                if errors:
+                    raise errors[0]
+
+        if self.clear:
+            self._clear(chunks)
+        return self._concat(results)
+
+    def _fetch(self, chunk: Tuple[int, int]):
+        if self.limiter is not None:
+            self.limiter.acquire()
+        result = self.fetch_chunk(*chunk)
+        self._save(chunk, result)
+        return result
+
+    @staticmethod
+    def _concat(results: List):
+        if results and all(isinstance(result, np.ndarray) for result in results):
+            return concat_candles(results)
+        return [item for result in results for item in result]
+
+    # ------------------------------------------------------------ checkpoint
+    def _path(self, chunk: Tuple[int, int]) -> str:
+        if self.step:
+            span_start = chunk[0] - chunk[0] % self.step
+            chunk = (span_start, span_start + self.step)
+        return os.path.join(self.checkpoint_dir, f"{chunk[0]}_{chunk[1]}.pkl")
+
+    def _load(self, chunk: Tuple[int, int]):
+        if self.checkpoint_dir is None or not os.path.exists(self._path(chunk)):
+            return None
+        with open(self._path(chunk), "rb") as stream:
+            saved = pickle.load(stream)
+        # The file of the span may hold another part of it (a range that ended earlier)
+        if not isinstance(saved, tuple) or saved[0] != chunk:
+            return None
+        return saved[1]
+
+    def _save(self, chunk: Tuple[int, int], result) -> None:
+        if self.checkpoint_dir is None:
+            return
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        tmp = self._path(chunk) + ".tmp"
+        with open(tmp, "wb") as stream:
+            pickle.dump((chunk, result), stream)
+        os.replace(tmp, self._path(chunk))
+
+    def _clear(self, chunks: List[Tuple[int, int]]) -> None:
+        if self.checkpoint_dir is None:
+            return
+        for chunk in chunks:
+            if os.path.exists(self._path(chunk)):
+                os.remove(self._path(chunk))
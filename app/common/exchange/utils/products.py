@@ -0,0 +1,139 @@
+"""
+Trading rules of the exchange products, used to validate and round orders locally.
+
+Each adapter turns its products endpoint into ``Product`` objects
+(``Exchange.load_products``); ``ProductIndex`` loads them once per adapter
+class and serves every later lookup from memory, so an order is checked
+against the minimum size, the increments and the minimum notional without a
+round trip. Quantities and prices are ``Decimal`` from there on: the exchanges
+reject ``0.30000000000000004`` and ``float`` can't always say ``0.3``.
+"""
+import threading
+import time
+from decimal import ROUND_DOWN, ROUND_UP, Decimal
+from typing import Callable, Dict, Iterable, List, Optional
+
+ZERO = Decimal(0)
+
+
+def to_decimal(value) -> Decimal:
+    """``Decimal`` of a number or numeric string, floats through their shortest repr."""
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(repr(value)) if isinstance(value, float) else Decimal(value)
+
+
+def format_decimal(value) -> str:
+    """Plain notation without trailing zeros, as the order endpoints expect (``1E-7`` is rejected)."""
+    value = to_decimal(value)
+    text = format(value.normalize(), "f")
+    return text if text != "-0" else "0"
+
+
+def round_step(value: Decimal, step: Decimal, rounding: str = ROUND_DOWN) -> Decimal:
+    """``value`` as a multiple of ``step`` (unchanged when ``step`` is 0)."""
+    if not step:
+        return value
+    return (value / step).to_integral_value(rounding=rounding) * step
+
+
+class Product:
+    """
+    Order rules of one pair: sizes in the base currency, prices in the quote one.
+
+    ``aliases`` are the other names the exchange accepts for the pair (Kraken's
+    ``XBTUSD`` for ``XXBTZUSD``, ...); ``max_size`` is None when unbounded.
+    """
+
+    def __init__(self, symbol: str, base: str, quote: str, base_increment, quote_increment, min_size=0,
+                 max_size=None, min_notional=0, aliases: Iterable[str] = ()):
+        self.symbol = symbol
+        self.base = base
+        self.quote = quote
+        self.base_increment = to_decimal(base_increment).normalize()
+        self.quote_increment = to_decimal(quote_increment).normalize()
+        self.min_size = to_decimal(min_size)
+        self.max_size = to_decimal(max_size) if max_size not in (None, "", 0, "0") else None
+        self.min_notional = to_decimal(min_notional or 0)
+        self.aliases = tuple(aliases)
+
+    def __repr__(self) -> str:
+        return (f"Product({self.symbol}, size {format_decimal(self.min_size)}+ "
+                f"by {format_decimal(self.base_increment)}, price by {format_decimal(self.quote_increment)}, "
+                f"notional {format_decimal(self.min_notional)}+)")
+
+    def round_quantity(self, quantity) -> Decimal:
+        """Quantity rounded down to the base increment: never more than asked."""
+        return round_step(to_decimal(quantity), self.base_increment, ROUND_DOWN)
+
+    def round_price(self, price, buy: bool) -> Decimal:
+        """Limit price on the quote increment, rounded away from the market: down for buys, up for sells."""
+        return round_step(to_decimal(price), self.quote_increment, ROUND_DOWN if buy else ROUND_UP)
+
+    def validate(self, quantity: Decimal, price: Optional[Decimal] = None) -> Optional[str]:
+        """Why the exchange would reject the order, None when it passes.
+
+        The notional is only checked when the price is known (limit orders).
+        """
+        if quantity <= ZERO:
+            return (f"{self.symbol}: quantity rounds to 0 with a base increment of "
+                    f"{format_decimal(self.base_increment)}")
+        if quantity < self.min_size:
+            return (f"{self.symbol}: quantity {format_decimal(quantity)} below the minimum size "
+                    f"{format_decimal(self.min_size)}")
+        if self.max_size is not None and quantity > self.max_size:
+            return (f"{self.symbol}: quantity {format_decimal(quantity)} above the maximum size "
+                    f"{format_decimal(self.max_size)}")
+        if price is not None:
+            if price <= ZERO:
+                return f"{self.symbol}: price {format_decimal(price)} must be positive"
+            if quantity * price < self.min_notional:
+                return (f"{self.symbol}: order value {format_decimal(quantity * price)} below the minimum "
+                        f"{format_decimal(self.min_notional)}")
+        return None
+
+
+class ProductIndex:
+    """
+    Products of one exchange, loaded by ``loader`` on first use.
+
+    A symbol missing from the index triggers one reload (a new listing), at
+    most every ``refresh_interval`` seconds; the rules of known products are
+    not refreshed.
+    """
+
+    def __init__(self, loader: Callable[[], List[Product]], refresh_interval: float = 300.0):
+        self._loader = loader
+        self.refresh_interval = refresh_interval
+        self._products: Optional[Dict[str, Product]] = None
+        self._aliases: Dict[str, str] = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self) -> None:
+        products = {product.symbol: product for product in self._loader()}
+        aliases = {alias: product.symbol for product in products.values() for alias in product.aliases}
+        self._products, self._aliases = products, aliases
+        self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self) -> Dict[str, Product]:
+        if self._products is None:
+            with self._lock:
+                if self._products is None:
+                    self._load()
+        return self._products
+
+    def symbols(self) -> List[str]:
+        """Symbols of every product, in the exchange's own notation."""
+        return list(self._ensure_loaded())
+
+    def get(self, symbol: str) -> Optional[Product]:
+        """Rules of ``symbol`` (or one of its aliases), None when the exchange doesn't list it."""
+        products = self._ensure_loaded()
+        product = products.get(symbol) or products.get(self._aliases.get(symbol))
+        if product is not None:
+            return product
+        with self._lock:
+            if time.monotonic() - self._loaded_at >= self.refresh_interval:
+                self._load()
+        return self._products.get(symbol) or self._products.get(self._aliases.get(symbol))
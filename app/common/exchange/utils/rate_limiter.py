@@ -0,0 +1,345 @@
+"""
+Rate limiting, retries and priorities for the exchange APIs.
+
+Every outbound call of an adapter goes through the ``RateLimiter`` of its
+exchange (``get_limiter(name)``), shared by the sync and async adapters and
+by every thread and task:
+
+* one weighted token bucket per exchange (Binance counts request weight, the
+  others requests) and optional buckets of their own for endpoints with a
+  separate limit (Kraken's private counter, Binance orders, ...);
+* a priority lane: a call waits while calls of a higher priority are waiting,
+  and ``BULK`` calls (history backfills) leave part of the bucket for the rest,
+  so pricing the portfolio never queues behind a download;
+* failed calls are retried with exponential backoff and full jitter, rate limit
+  answers (429/418, "too many requests") pause the whole exchange for the
+  ``Retry-After`` the exchange asked for. Calls that are not idempotent (placing
+  an order) are only retried on rate limit answers: after a timeout or a 5xx the
+  order may well have gone through.
+
+The priority of a call comes from ``request_priority``, so a whole code path
+(e.g. a history download) can be lowered without passing it around.
+"""
+import asyncio
+import contextvars
+import functools
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from common.metrics import (EXCHANGE_LIMITER_WAIT, EXCHANGE_REQUEST_ERRORS, EXCHANGE_REQUEST_SECONDS,
+                            PRIORITY_NAMES, instrument_session)
+
+HIGH, NORMAL, BULK = 0, 1, 2
+
+# Exchange limits: requests (or weight) per second and burst of the exchange bucket, weight of each
+# endpoint in it (1 when not listed) and endpoints with a bucket of their own as (rate, capacity)
+EXCHANGE_LIMITS: Dict[str, Dict[str, Any]] = {
+    # 6000 weight per minute per IP, orders 100 per 10 seconds
+    "binance": {"rate": 80, "capacity": 1000,
+                "weights": {"ping": 1, "klines": 2, "ticker": 4, "account": 20, "order": 1, "order_status": 4,
+                            "exchange_info": 20},
+                "endpoints": {"order": (5, 50)}},
+    # Public calls about 1 per second per IP; private calls share a counter of 15 decaying by 0.33 per second
+    # (starter tier), orders a counter of 60 decaying by 1 per second
+    "kraken": {"rate": 1, "capacity": 2,
+               "weights": {"private": 0, "trade": 0},
+               "endpoints": {"private": (0.33, 15), "trade": (1, 60)}},
+    # Advanced Trade: 30 private requests per second, 10 public ones
+    "coinbase": {"rate": 25, "capacity": 30,
+                 "weights": {"public": 0},
+                 "endpoints": {"public": (10, 10)}},
+    # Replay exchange: no limit of its own, load tests run at any rate
+    "replay": {"rate": 1_000_000, "capacity": 1_000_000},
+}
+DEFAULT_LIMITS = {"rate": 10, "capacity": 10}
+
+RATE_LIMIT_STATUS = {418, 429}
+RATE_LIMIT_MESSAGES = ("too many requests", "rate limit")
+# Connection and timeout errors of the builtins, requests and httpx
+TRANSIENT_ERRORS = {"ConnectionError", "TimeoutError", "Timeout", "TransportError", "TimeoutException"}
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("request_priority", default=NORMAL)
+_limiters: Dict[str, "RateLimiter"] = {}
+_limiters_lock = threading.Lock()
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, bursts up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, tokens: float = 1, reserve: float = 0) -> float:
+        """Seconds until ``tokens`` can be taken with ``reserve`` tokens still left in the bucket."""
+        with self._lock:
+            self._refill(time.monotonic())
+            # A call heavier than the bucket only waits for a full bucket
+            needed = min(tokens + reserve, self.capacity)
+            return max(needed - self._tokens, 0.0) / self.rate
+
+    def take(self, tokens: float = 1) -> None:
+        """Take ``tokens`` without checking, ``wait_time`` said they are there."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= tokens
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Take ``tokens`` if available and return 0, otherwise return the seconds to wait."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1) -> None:
+        """Block until ``tokens`` are available."""
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+
+class RetryableError(Exception):
+    """Error the exchange reported in the body of a successful response that is worth retrying."""
+
+    def __init__(self, message: str, rate_limited: bool = False, retry_after: float = None):
+        super().__init__(message)
+        self.rate_limited = rate_limited
+        self.retry_after = retry_after
+
+
+@contextmanager
+def request_priority(priority: int):
+    """Priority of the exchange calls made in the block (thread or task)."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def _retry_after(response) -> Optional[float]:
+    headers = getattr(response, "headers", None)
+    value = headers.get("Retry-After") if headers is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def classify(error: Exception) -> Tuple[Optional[str], Optional[float]]:
+    """("rate_limit" | "retry" | None, seconds the exchange asked to wait) for a failed call."""
+    if isinstance(error, RetryableError):
+        return ("rate_limit" if error.rate_limited else "retry"), error.retry_after
+    # SDK errors (python-binance) carry the status, requests and httpx errors their response
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    retry_after = _retry_after(response)
+    if status in RATE_LIMIT_STATUS or any(m in str(error).lower() for m in RATE_LIMIT_MESSAGES):
+        return "rate_limit", retry_after
+    if isinstance(status, int) and status >= 500:
+        return "retry", retry_after
+    if any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__):
+        return "retry", None
+    return None, None
+
+
+class RateLimiter:
+    # Seconds between checks while a higher priority call is waiting
+    PRIORITY_POLL = 0.01
+
+    def __init__(self, name: str, rate: float, capacity: float = None, weights: Dict[str, float] = None,
+                 endpoints: Dict[str, Tuple[float, float]] = None, max_retries: int = 5,
+                 base_delay: float = 0.5, max_delay: float = 30.0, bulk_reserve: float = 0.2):
+        self.name = name
+        self.bucket = TokenBucket(rate, capacity)
+        self.weights = weights or {}
+        self.endpoints = {endpoint: TokenBucket(*limits) for endpoint, limits in (endpoints or {}).items()}
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Share of the exchange bucket BULK calls leave to the other priorities
+        self.bulk_reserve = bulk_reserve
+        self._waiting = [0, 0, 0]
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------------------- tokens
+    def pause(self, seconds: float) -> None:
+        """Hold every call to the exchange for ``seconds`` (the exchange asked us to back off)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _try_acquire(self, endpoint: Optional[str], priority: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            if any(self._waiting[:priority]):
+                return self.PRIORITY_POLL
+            weight = self.weights.get(endpoint, 1)
+            reserve = self.bulk_reserve * self.bucket.capacity if priority >= BULK else 0
+            bucket = self.endpoints.get(endpoint)
+            wait = max(self.bucket.wait_time(weight, reserve) if weight else 0.0,
+                       bucket.wait_time() if bucket is not None else 0.0)
+            if wait > 0:
+                return wait
+            if weight:
+                self.bucket.take(weight)
+            if bucket is not None:
+                bucket.take()
+            return 0.0
+
+    @contextmanager
+    def _queued(self, priority: int):
+        with self._lock:
+            self._waiting[priority] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._waiting[priority] -= 1
+
+    def acquire(self, endpoint: str = None, priority: int = None) -> None:
+        """Block until a call to ``endpoint`` is allowed."""
+        priority = _priority.get() if priority is None else priority
+        started = time.perf_counter()
+        with self._queued(priority):
+            while True:
+                wait = self._try_acquire(endpoint, priority)
+                if wait <= 0:
+                    break
+                time.sleep(wait)
+        EXCHANGE_LIMITER_WAIT.labels(self.name, PRIORITY_NAMES[priority]).observe(time.perf_counter() - started)
+
+    async def aacquire(self, endpoint: str = None, priority: int = None) -> None:
+        """``acquire`` for the event loop: waits without blocking it."""
+        priority = _priority.get() if priority is None else priority
+        started = time.perf_counter()
+        with self._queued(priority):
+            while True:
+                wait = self._try_acquire(endpoint, priority)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+        EXCHANGE_LIMITER_WAIT.labels(self.name, PRIORITY_NAMES[priority]).observe(time.perf_counter() - started)
+
+    # ------------------------------------------------------------- retries
+    def _retry_delay(self, error: Exception, attempt: int, endpoint: Optional[str],
+                     idempotent: bool = True) -> Optional[float]:
+        kind, retry_after = classify(error)
+        EXCHANGE_REQUEST_ERRORS.labels(self.name, endpoint or "", kind or "fatal").inc()
+        if kind is None or attempt >= self.max_retries or not idempotent and kind != "rate_limit":
+            return None
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if kind == "rate_limit":
+            delay = retry_after if retry_after is not None else max(backoff, self.base_delay)
+            self.pause(delay)
+        else:
+            delay = backoff
+        target = f"{self.name} {endpoint}" if endpoint else self.name
+        print(f"{target} call failed ({error}), retry {attempt + 1} in {delay:.2f}s")
+        return delay
+
+    def call(self, fn: Callable, *args, endpoint: str = None, priority: int = None,
+             check: Callable[[Any], None] = None, idempotent: bool = True, **kwargs) -> Any:
+        """``fn(*args, **kwargs)`` once allowed, retried on transient errors.
+
+        ``check`` inspects the result and raises ``RetryableError`` for errors
+        sent in a successful response. Without ``idempotent`` only rate limit
+        answers are retried. The last error is raised once the retries are
+        exhausted.
+        """
+        attempt = 0
+        while True:
+            self.acquire(endpoint, priority)
+            started = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+                if check is not None:
+                    check(result)
+                return result
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, endpoint, idempotent)
+                if delay is None:
+                    raise
+            finally:
+                EXCHANGE_REQUEST_SECONDS.labels(self.name, endpoint or "").observe(time.perf_counter() - started)
+            time.sleep(delay)
+            attempt += 1
+
+    async def acall(self, fn: Callable, *args, endpoint: str = None, priority: int = None,
+                    check: Callable[[Any], None] = None, idempotent: bool = True, **kwargs) -> Any:
+        """``call`` for coroutine functions: ``fn`` is awaited again on every attempt."""
+        attempt = 0
+        while True:
+            await self.aacquire(endpoint, priority)
+            started = time.perf_counter()
+            try:
+                result = await fn(*args, **kwargs)
+                if check is not None:
+                    check(result)
+                return result
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, endpoint, idempotent)
+                if delay is None:
+                    raise
+            finally:
+                EXCHANGE_REQUEST_SECONDS.labels(self.name, endpoint or "").observe(time.perf_counter() - started)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+class LimitedClient:
+    """
+    Exchange SDK client whose every method call goes through ``limiter.call``.
+
+    ``endpoint(method_name, args)`` names the endpoint of a call (the method
+    name by default); ``check`` is passed on to ``call``. Calls to the
+    ``unsafe`` endpoints are not idempotent (see ``RateLimiter.call``).
+    """
+
+    def __init__(self, client: Any, limiter: RateLimiter, endpoint: Callable[[str, tuple], str] = None,
+                 check: Callable[[Any], None] = None, unsafe: Iterable[str] = ()):
+        self._client = client
+        self._limiter = limiter
+        self._endpoint = endpoint
+        self._check = check
+        self._unsafe = frozenset(unsafe)
+        session = getattr(client, "session", None)
+        if session is not None and hasattr(session, "hooks"):
+            instrument_session(session, limiter.name)
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._client, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def limited(*args, **kwargs):
+            endpoint = self._endpoint(name, args) if self._endpoint is not None else name
+            return self._limiter.call(attr, *args, endpoint=endpoint, check=self._check,
+                                      idempotent=endpoint not in self._unsafe, **kwargs)
+
+        return limited
+
+
+def get_limiter(name: str) -> RateLimiter:
+    """The limiter of exchange ``name``, shared by everything calling that exchange."""
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = RateLimiter(name, **EXCHANGE_LIMITS.get(name, DEFAULT_LIMITS))
+        return _limiters[name]
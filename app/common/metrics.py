@@ -0,0 +1,244 @@
+"""
+Latency, error, cache and traffic metrics, exposed in the Prometheus text format.
+
+* adapter methods (``Exchange.INSTRUMENTED``): latency histogram and errors per
+  exchange and method, wrapped automatically in every adapter class;
+* outbound requests: latency, retried/failed calls per endpoint, time spent
+  waiting on the rate limiter and response bytes (``rate_limiter`` records them);
+* orders: latency from the strategy signal to the exchange acknowledgement and
+  outcome per exchange and order type (``process.execution.OrderExecutor``);
+* API routes: latency per route and status, response bytes (``MetricsMiddleware``);
+* caches registered with ``register_cache``: hits, stale hits, misses, hit ratio.
+
+``render()`` returns the exposition served on ``/metrics``. ``MetricsMiddleware``
+can also profile a sample of the requests and keep the profiles of the slow
+ones (pyinstrument when installed, cProfile otherwise).
+"""
+import cProfile
+import functools
+import inspect
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Orders are acknowledged in milliseconds to a few hundred
+ORDER_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PRIORITY_NAMES = {0: "high", 1: "normal", 2: "bulk"}
+
+EXCHANGE_CALL_SECONDS = Histogram("exchange_call_seconds", "Latency of the exchange adapter methods",
+                                  ["exchange", "method"], buckets=LATENCY_BUCKETS)
+EXCHANGE_CALL_ERRORS = Counter("exchange_call_errors", "Exchange adapter methods that raised",
+                               ["exchange", "method", "error"])
+EXCHANGE_REQUEST_SECONDS = Histogram("exchange_request_seconds", "Latency of one outbound exchange API request",
+                                     ["exchange", "endpoint"], buckets=LATENCY_BUCKETS)
+EXCHANGE_REQUEST_ERRORS = Counter("exchange_request_errors",
+                                  "Failed exchange API requests by outcome (rate_limit, retry, fatal)",
+                                  ["exchange", "endpoint", "kind"])
+EXCHANGE_LIMITER_WAIT = Histogram("exchange_limiter_wait_seconds", "Time requests waited for the rate limiter",
+                                  ["exchange", "priority"], buckets=LATENCY_BUCKETS)
+EXCHANGE_RESPONSE_BYTES = Counter("exchange_response_bytes", "Bytes received from the exchange APIs", ["exchange"])
+ORDER_ACK_SECONDS = Histogram("order_ack_seconds", "Time from the strategy signal to the exchange acknowledgement",
+                              ["exchange", "order_type"], buckets=ORDER_LATENCY_BUCKETS)
+ORDERS = Counter("orders", "Orders by outcome (acknowledged, rejected before sending, failed on the exchange)",
+                 ["exchange", "order_type", "result"])
+HTTP_REQUEST_SECONDS = Histogram("http_request_seconds", "Latency of the API routes",
+                                 ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+HTTP_RESPONSE_BYTES = Counter("http_response_bytes", "Bytes sent by the API routes", ["route"])
+
+_caches: Dict[str, Any] = {}
+
+
+# ------------------------------------------------------------------ caches
+def register_cache(name: str, cache: Any) -> None:
+    """Export the counters of ``cache``: a ``TTLCache`` or a ``functools.lru_cache`` function."""
+    _caches[name] = cache
+
+
+def _cache_counts(cache: Any) -> Dict[str, int]:
+    if hasattr(cache, "cache_info"):
+        info = cache.cache_info()
+        return {"hit": info.hits, "stale": 0, "miss": info.misses}
+    return {"hit": cache.hits, "stale": cache.stale_hits, "miss": cache.misses}
+
+
+class _CacheCollector:
+    def collect(self):
+        requests = CounterMetricFamily("cache_requests", "Cache lookups by result", labels=["cache", "result"])
+        ratio = GaugeMetricFamily("cache_hit_ratio", "Share of lookups answered from the cache (stale included)",
+                                  labels=["cache"])
+        for name, cache in list(_caches.items()):
+            counts = _cache_counts(cache)
+            for result, count in counts.items():
+                requests.add_metric([name, result], count)
+            total = sum(counts.values())
+            ratio.add_metric([name], (counts["hit"] + counts["stale"]) / total if total else 0.0)
+        yield requests
+        yield ratio
+
+
+REGISTRY.register(_CacheCollector())
+
+
+# ---------------------------------------------------------------- exchanges
+def timed(method: Callable) -> Callable:
+    """Record the latency and the errors of an adapter method (sync or coroutine), labelled with ``self.name``."""
+    if getattr(method, "__timed__", False):
+        return method
+    name = method.__name__
+
+    def record(exchange: str, started: float, error: Exception = None) -> None:
+        EXCHANGE_CALL_SECONDS.labels(exchange, name).observe(time.perf_counter() - started)
+        if error is not None:
+            EXCHANGE_CALL_ERRORS.labels(exchange, name, type(error).__name__).inc()
+
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = await method(self, *args, **kwargs)
+            except Exception as e:
+                record(self.name, started, e)
+                raise
+            record(self.name, started)
+            return result
+    else:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = method(self, *args, **kwargs)
+            except Exception as e:
+                record(self.name, started, e)
+                raise
+            record(self.name, started)
+            return result
+
+    wrapper.__timed__ = True
+    return wrapper
+
+
+def instrument_class(cls: type, methods) -> None:
+    """Wrap the ``methods`` defined by ``cls`` itself with ``timed``."""
+    for name in methods:
+        if name in cls.__dict__:
+            setattr(cls, name, timed(cls.__dict__[name]))
+
+
+def instrument_session(session: Any, exchange: str) -> None:
+    """Count the bytes of every response of a ``requests.Session`` (the exchange SDKs use one)."""
+    def count_bytes(response, *args, **kwargs):
+        length = response.headers.get("Content-Length")
+        EXCHANGE_RESPONSE_BYTES.labels(exchange).inc(int(length) if length else len(response.content))
+
+    session.hooks.setdefault("response", []).append(count_bytes)
+
+
+def httpx_bytes_hook(exchange: str) -> Callable:
+    """Response event hook of an ``httpx.AsyncClient`` counting the bytes received."""
+    async def count_bytes(response) -> None:
+        await response.aread()
+        EXCHANGE_RESPONSE_BYTES.labels(exchange).inc(response.num_bytes_downloaded)
+
+    return count_bytes
+
+
+# ---------------------------------------------------------------------- API
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request by route template and status.
+
+    With ``profile_threshold`` set, ``profile_rate`` of the requests run under
+    a profiler (one at a time) and the profile of those slower than the
+    threshold is written to ``profile_dir``. cProfile sees every coroutine
+    running meanwhile on the event loop, pyinstrument only the request's.
+    """
+
+    def __init__(self, app, profile_threshold: float = None, profile_rate: float = 0.05,
+                 profile_dir: str = "./api/profiles"):
+        self.app = app
+        self.profile_threshold = profile_threshold
+        self.profile_rate = profile_rate
+        self.profile_dir = profile_dir
+        self._profiling = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+        sent = {"bytes": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            elif message["type"] == "http.response.body":
+                sent["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        profiler = self._start_profiler()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            # The route template once the router matched one (FastAPI sets it in the scope)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route, str(status["code"])).observe(elapsed)
+            HTTP_RESPONSE_BYTES.labels(route).inc(sent["bytes"])
+            if profiler is not None:
+                self._stop_profiler(profiler, elapsed, scope["method"], route)
+
+    def _start_profiler(self):
+        if self.profile_threshold is None or random.random() >= self.profile_rate:
+            return None
+        if not self._profiling.acquire(blocking=False):
+            return None
+        try:
+            from pyinstrument import Profiler
+            profiler = Profiler(async_mode="enabled")
+        except ImportError:
+            profiler = cProfile.Profile()
+        try:
+            if isinstance(profiler, cProfile.Profile):
+                profiler.enable()
+            else:
+                profiler.start()
+        except Exception:
+            # Another profiler already active in the process
+            self._profiling.release()
+            return None
+        return profiler
+
+    def _stop_profiler(self, profiler, elapsed: float, method: str, route: str) -> None:
+        try:
+            if isinstance(profiler, cProfile.Profile):
+                profiler.disable()
+            else:
+                profiler.stop()
+            if elapsed < self.profile_threshold:
+                return
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f"{int(time.time() * 1000)}_{method}_"
+                                                  f"{route.strip('/').replace('/', '_') or 'root'}")
+            if isinstance(profiler, cProfile.Profile):
+                profiler.dump_stats(f"{path}.prof")
+            else:
+                with open(f"{path}.html", "w") as stream:
+                    stream.write(profiler.output_html())
+            print(f"Slow request {method} {route} ({elapsed:.3f}s) profiled in {path}")
+        finally:
+            self._profiling.release()
+
+
+def render() -> bytes:
+    """Every metric in the Prometheus text exposition format."""
+    return generate_latest(REGISTRY)
+
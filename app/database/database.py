@@ -1,18 +1,35 @@
 from pymongo import MongoClient
-from datetime import datetime
-from settings import MONGODB_URI
+from settings import get_settings
+
+
+def create_client(uri: str = None):
+    uri = get_settings()["MONGODB_URI"] if uri is None else uri
+    # mongomock:// runs everything in memory (tests, local development without a server)
+    if uri.startswith("mongomock://"):
+        import mongomock
+        return mongomock.MongoClient()
+    return MongoClient(uri)
+
 
 class Database:
     client = None
+    # MONGODB_DATABASE unless a subclass names one
+    database_name = None
 
     def __init__(self, collection_name):
         self.collection_name = collection_name
+        if self.database_name is None:
+            self.database_name = get_settings()["MONGODB_DATABASE"]
         if self.client is None:
             self.connect_to_db()
         
         
     def connect_to_db(self):
-        self.client = MongoClient(MONGODB_URI).client
+        self.client = create_client()
+
+    @property
+    def collection(self):
+        return self.client[self.database_name][self.collection_name]
 
     def close_connection(self):
         if self.client:
@@ -1,49 +1,147 @@
-from pymongo import MongoClient
-from datetime import datetime
-from settings import MONGODB_URI
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pymongo import ASCENDING, InsertOne
+from pymongo.errors import BulkWriteError, CollectionInvalid, OperationFailure
+
 from database.database import Database
 
 
 class PortfolioDB(Database):
+    """
+    Portfolio snapshots, one document per exchange and snapshot time.
+
+    The collection is a MongoDB time-series collection (``timestamp`` as time
+    field, ``exchange`` as meta field) when the server supports it, with a
+    compound (exchange, timestamp) index either way, unique where the server
+    allows it (not on time-series collections), so a snapshot written twice is
+    stored once. Reads stream from a cursor and pages are taken by timestamp
+    range (keyset pagination), so neither depends on how many snapshots are
+    stored.
+    """
+    BATCH_SIZE = 1000
+    DUPLICATE_KEY = 11000
+
     def __init__(self, collection_name):
         super().__init__(collection_name=collection_name)
+        self.ensure_collection()
 
-    def connect_to_db(self):
-        self.client = MongoClient(MONGODB_URI)
+    def ensure_collection(self):
+        db = self.client[self.database_name]
+        if self.collection_name not in db.list_collection_names():
+            try:
+                db.create_collection(self.collection_name, timeseries={
+                    "timeField": "timestamp",
+                    "metaField": "exchange",
+                    "granularity": "minutes",
+                })
+            except CollectionInvalid:
+                pass
+            except (OperationFailure, NotImplementedError, TypeError) as e:
+                # Servers before MongoDB 5.0 (and in-memory stand-ins) only have regular collections
+                print(f"Time-series collection not available, using a regular one: {e}")
+        keys = [("exchange", ASCENDING), ("timestamp", ASCENDING)]
+        try:
+            self.collection.create_index(keys, unique=True)
+        except OperationFailure as e:
+            # Time-series collections (and collections holding duplicates already) take no unique index
+            print(f"Unique (exchange, timestamp) index not available: {e}")
+            self.collection.create_index(keys)
 
-    def close_connection(self):
-        if self.client:
-            self.client.close()
+    def insert_portfolio_data(self, exchange_name, portfolio_data, timestamp: Optional[datetime] = None):
+        self.insert_many_portfolio_data([(exchange_name, portfolio_data, timestamp)])
 
-    def insert_portfolio_data(self, exchange_name, portfolio_data):
-        try:
-            db = self.client[self.database_name]
-            collection = db[self.collection_name]
+    def insert_many_portfolio_data(self, snapshots: Iterable[Tuple[str, Any, Optional[datetime]]],
+                                   raise_errors: bool = False) -> int:
+        """Write ``(exchange, portfolio, timestamp)`` snapshots in batches, returning how many were written.
 
-            # Insert portfolio data to MongoDB
-            collection.insert_one({
-                "exchange": exchange_name,
-                "timestamp": datetime.now(),
-                "portfolio": portfolio_data
-            })
+        Errors are printed, or raised with ``raise_errors`` for callers that retry.
+        """
+        written, failed, error = self.write_portfolio_data(snapshots)
+        if failed and raise_errors:
+            raise error
+        return len(written)
 
-            print("Portfolio data saved to MongoDB successfully.")
-        except Exception as e:
-            print(f"Error saving portfolio data to MongoDB: {e}")
+    def write_portfolio_data(self, snapshots: Iterable[Tuple[str, Any, Optional[datetime]]]
+                             ) -> Tuple[List[Tuple[str, Any, datetime]], List[Tuple[str, Any, datetime]],
+                                        Optional[Exception]]:
+        """Write snapshots in batches: the ones written, the ones that failed and the last error.
 
-    def query_portfolio_data(self, exchange_name, start_date=None, end_date=None):
-        try:
-            db = self.client[self.database_name]
-            collection = db[self.collection_name]
+        The batches are unordered, so one bad document doesn't stop the others;
+        only the failed snapshots need to be written again. Snapshots already
+        stored (duplicate key) count as neither.
+        """
+        snapshots = [(exchange_name, portfolio_data, timestamp or datetime.now(timezone.utc))
+                     for exchange_name, portfolio_data, timestamp in snapshots]
+        written, failed, error = [], [], None
+        for start in range(0, len(snapshots), self.BATCH_SIZE):
+            batch = snapshots[start:start + self.BATCH_SIZE]
+            requests = [InsertOne({"exchange": exchange_name, "timestamp": timestamp, "portfolio": portfolio_data})
+                        for exchange_name, portfolio_data, timestamp in batch]
+            try:
+                self.collection.bulk_write(requests, ordered=False)
+                written.extend(batch)
+            except BulkWriteError as e:
+                write_errors = {write_error["index"]: write_error for write_error in e.details.get("writeErrors", [])}
+                written.extend(snapshot for i, snapshot in enumerate(batch) if i not in write_errors)
+                failed_indexes = [i for i, write_error in write_errors.items()
+                                  if write_error.get("code") != self.DUPLICATE_KEY]
+                failed.extend(batch[i] for i in sorted(failed_indexes))
+                if failed_indexes:
+                    error = e
+            except Exception as e:
+                # Nothing of this batch is known to be written, and the next ones would fail the same way
+                failed.extend(snapshots[start:])
+                error = e
+                break
+        if failed:
+            print(f"Error saving portfolio data to MongoDB, {len(failed)} snapshots not saved: {error}")
+        if written:
+            print(f"{len(written)} portfolio snapshots saved to MongoDB successfully.")
+        return written, failed, error
+
+    @staticmethod
+    def _query(exchange_name, start_date=None, end_date=None, after=None) -> Dict[str, Any]:
+        query = {"exchange": exchange_name}
+        timestamp = {}
+        if start_date:
+            timestamp["$gte"] = start_date
+        if end_date:
+            timestamp["$lte"] = end_date
+        if after:
+            timestamp["$gt"] = after
+        if timestamp:
+            query["timestamp"] = timestamp
+        return query
 
-            query = {"exchange": exchange_name}
-            if start_date and end_date:
-                query["timestamp"] = {"$gte": start_date, "$lte": end_date}
+    @staticmethod
+    def _projection(fields: Optional[List[str]]) -> Dict[str, int]:
+        projection = {"_id": 0}
+        if fields:
+            projection.update({field: 1 for field in ["timestamp", *fields]})
+        return projection
 
-            # Query portfolio data from MongoDB
-            result = list(collection.find(query))
+    def iter_portfolio_data(self, exchange_name, start_date=None, end_date=None,
+                            fields: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Stream the snapshots of a range in time order, fetching ``BATCH_SIZE`` documents at a time."""
+        cursor = self.collection.find(self._query(exchange_name, start_date, end_date), self._projection(fields))
+        yield from cursor.sort("timestamp", ASCENDING).batch_size(self.BATCH_SIZE)
 
-            return result
+    def page_portfolio_data(self, exchange_name, start_date=None, end_date=None, after: Optional[datetime] = None,
+                            limit: int = 500, fields: Optional[List[str]] = None
+                            ) -> Tuple[List[Dict[str, Any]], Optional[datetime]]:
+        """One page of snapshots after the ``after`` timestamp, and the timestamp to ask the next page from.
+
+        The next page timestamp is None on the last page.
+        """
+        cursor = self.collection.find(self._query(exchange_name, start_date, end_date, after),
+                                      self._projection(fields))
+        page = list(cursor.sort("timestamp", ASCENDING).limit(limit))
+        return page, page[-1]["timestamp"] if len(page) == limit else None
+
+    def query_portfolio_data(self, exchange_name, start_date=None, end_date=None, fields: Optional[List[str]] = None):
+        try:
+            return list(self.iter_portfolio_data(exchange_name, start_date, end_date, fields))
         except Exception as e:
             print(f"Error querying portfolio data from MongoDB: {e}")
             return None
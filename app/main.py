@@ -1,5 +1,5 @@
 from database.database import Database
-from run_server import run
+from services.run_server import run
 
 if __name__ == "__main__":
     run()
@@ -1,20 +1,153 @@
-import pandas as pd 
-from typing import Any
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Optional
+
 
 class Backtest:
-    def __init__(self, data: Any, capital: float):
+    """
+    Vectorized backtest over a candle series.
+
+    ``data`` is anything indexable by column name with at least ``close_price``
+    (a DataFrame from the candle/feature store, a dict of arrays or a
+    ``CANDLE_DTYPE`` array). Signals are target exposures per bar (1 long,
+    -1 short, 0 flat, fractions allowed, NaN keeps the previous target),
+    decided on the close of a bar and filled on the open of the next one.
+    Everything is computed with NumPy over the whole series.
+    """
+
+    def __init__(self, data: Any, capital: float = 100_000.0, fee: float = 0.001, slippage: float = 0.0005):
         self.data = data
-        self.capital = 100_000.0
+        self.capital = capital
+        self.fee = fee
+        self.slippage = slippage
         self.position = 0
 
-    def apply_strategy(self):
-        pass
+        self.close = np.asarray(data["close_price"], dtype=np.float64)
+        self.open = np.asarray(data["open_price"], dtype=np.float64) if self._has(data, "open_price") else self.close
+        if self._has(data, "timestamp"):
+            self.timestamps = np.asarray(data["timestamp"], dtype=np.int64)
+        elif isinstance(data, pd.DataFrame):
+            self.timestamps = np.asarray(data.index, dtype=np.int64)
+        else:
+            self.timestamps = np.arange(len(self.close), dtype=np.int64)
+
+        self.signals: Optional[np.ndarray] = None
+        self.positions: Optional[np.ndarray] = None
+        self.equity: Optional[np.ndarray] = None
+        self.trades: Optional[pd.DataFrame] = None
+
+    @staticmethod
+    def _has(data: Any, column: str) -> bool:
+        if isinstance(data, np.ndarray):
+            return data.dtype.names is not None and column in data.dtype.names
+        return column in data
+
+    def generate_signals(self) -> np.ndarray:
+        """Signals of the strategy, implemented by the strategy backtests."""
+        raise NotImplementedError("Not implemented here")
+
+    def apply_strategy(self, signals: Optional[np.ndarray] = None) -> np.ndarray:
+        """Turn signals into the position held during each bar."""
+        signals = self.generate_signals() if signals is None else signals
+        signals = np.asarray(signals, dtype=np.float64)
+        if len(signals) != len(self.close):
+            raise ValueError(f"Expected {len(self.close)} signals, got {len(signals)}")
+
+        # Forward fill the NaNs (keep the previous target), flat before the first signal
+        valid = ~np.isnan(signals)
+        last_valid = np.maximum.accumulate(np.where(valid, np.arange(len(signals)), -1))
+        targets = np.where(last_valid >= 0, signals[np.maximum(last_valid, 0)], 0.0)
+
+        # Decided on the close of bar t, filled on the open of bar t + 1
+        positions = np.concatenate([[0.0], targets[:-1]]) if len(targets) else targets
+        self.signals = signals
+        self.positions = positions
+        self.position = positions[-1] if len(positions) else 0
+        return positions
 
-    def execute_trades(self):
-        pass
+    def execute_trades(self) -> pd.DataFrame:
+        """Fill the position changes with fees and slippage, build the equity curve and the trade list."""
+        if self.positions is None:
+            self.apply_strategy()
+        positions = self.positions
+        previous = np.concatenate([[0.0], positions[:-1]])
+        # The first bar has no previous close: no gap (and nothing at all without data)
+        previous_close = np.concatenate([self.open[:1], self.close[:-1]])
 
-    def calculate_returns(self):
-        pass
+        # Overnight gap at the previous position, position change at the open, intraday move at the new one
+        gap_return = previous * (self.open / previous_close - 1)
+        turnover = np.abs(positions - previous)
+        costs = turnover * (self.fee + self.slippage)
+        intraday_return = positions * (self.close / self.open - 1)
+        growth = (1 + gap_return) * (1 - costs) * (1 + intraday_return)
+        self.equity = self.capital * np.cumprod(growth)
+
+        self.trades = self._trade_list(positions, previous)
+        return self.trades
+
+    def _trade_list(self, positions: np.ndarray, previous: np.ndarray) -> pd.DataFrame:
+        n = len(positions)
+        changes = np.flatnonzero(positions != previous)
+        entries = changes[positions[changes] != 0]
+        # A trade lasts until the next position change, or is still open on the last bar
+        next_change = np.searchsorted(changes, entries, side="right")
+        exits = np.where(next_change < len(changes), changes[np.minimum(next_change, len(changes) - 1)], n)
+
+        size = positions[entries]
+        side = np.sign(size)
+        entry_price = self.open[entries] * (1 + side * self.slippage)
+        still_open = exits >= n
+        exit_reference = np.where(still_open, self.close[-1] if n else 0.0, self.open[np.minimum(exits, n - 1)])
+        exit_price = exit_reference * (1 - side * self.slippage)
+        trade_return = side * (exit_price / entry_price - 1) - 2 * self.fee
+
+        return pd.DataFrame({
+            "entry_time": self.timestamps[entries],
+            "exit_time": np.where(still_open, self.timestamps[-1] if n else 0,
+                                  self.timestamps[np.minimum(exits, n - 1)]),
+            "size": size,
+            "entry_price": entry_price,
+            "exit_price": exit_price,
+            "return": trade_return,
+            "bars": np.minimum(exits, n) - entries,
+            "open": still_open,
+        })
+
+    def calculate_returns(self) -> Dict[str, float]:
+        """Summary statistics of the equity curve and the trades."""
+        if self.equity is None:
+            self.execute_trades()
+        equity = self.equity
+        returns = np.diff(equity, prepend=self.capital) / np.concatenate([[self.capital], equity[:-1]])
+        running_max = np.maximum.accumulate(equity)
+        drawdown = equity / running_max - 1
+
+        bar_seconds = np.median(np.diff(self.timestamps)) if len(self.timestamps) > 1 else 0
+        periods_per_year = 365 * 86400 / bar_seconds if bar_seconds > 0 else 252
+        std = returns.std() if len(returns) else 0.0
+        trades = self.trades
+        return {
+            "final_equity": float(equity[-1]) if len(equity) else self.capital,
+            "total_return": float(equity[-1] / self.capital - 1) if len(equity) else 0.0,
+            "sharpe": float(returns.mean() / std * np.sqrt(periods_per_year)) if std > 0 else 0.0,
+            "max_drawdown": float(drawdown.min()) if len(drawdown) else 0.0,
+            "trades": int(len(trades)),
+            "win_rate": float((trades["return"] > 0).mean()) if len(trades) else 0.0,
+            "exposure": float((self.positions != 0).mean()) if len(self.positions) else 0.0,
+        }
+
+    def run(self, signals: Optional[np.ndarray] = None) -> Dict[str, float]:
+        self.apply_strategy(signals)
+        self.execute_trades()
+        return self.calculate_returns()
 
     def visualize_results(self):
-        pass
\ No newline at end of file
+        import matplotlib.pyplot as plt
+
+        if self.equity is None:
+            self.execute_trades()
+        fig, ax = plt.subplots(figsize=(12, 5))
+        ax.plot(pd.to_datetime(self.timestamps, unit="s"), self.equity)
+        ax.set_title("Equity curve")
+        ax.set_ylabel("Equity")
+        return fig
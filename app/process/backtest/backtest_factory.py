@@ -1,6 +1,7 @@
+from process.backtest.momentum import MomentumBacktest
 
 
-def backtest_factory(backtest_name: str):
+def backtest_factory(backtest_name: str, *args, **kwargs):
     if backtest_name == "momentum":
-        return 
+        return MomentumBacktest(*args, **kwargs)
     raise Exception(f"this name {backtest_name} is unknown")
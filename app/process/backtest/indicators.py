@@ -0,0 +1,424 @@
+"""
+Streaming versions of the indicators computed by ``add_technical_indicators``.
+
+Every indicator updates in constant time per candle and reproduces the pandas
+batch values: the rolling mean and variance follow the compensated add/remove
+updates pandas uses for fixed windows, the rolling min/max use monotonic
+deques and the EMAs carry the ``adjust=False`` recursion. All columns are
+bit-identical to the batch ones except the Bollinger bands, whose rolling std
+agrees to floating point rounding (pandas versions differ there too).
+
+Each object exposes ``update(...)`` returning the latest value, ``state()``
+returning a JSON serialisable dict and ``from_state(state)`` to rebuild it, so
+a process can restart without warming up again::
+
+    engine = IndicatorEngine()
+    for candle in candles:
+        values = engine.update(**candle)
+    json.dump(engine.state(), stream)
+"""
+import math
+from collections import deque
+from typing import Dict, Optional
+
+NAN = float("nan")
+
+
+def _divide(a: float, b: float) -> float:
+    """Float division with NumPy semantics (x/0 -> +-inf, 0/0 -> nan) instead of ZeroDivisionError."""
+    if b == 0:
+        if a == 0 or math.isnan(a):
+            return NAN
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+class RollingMean:
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque()
+        self.nobs = 0
+        self.sum_x = 0.0
+        self.neg_ct = 0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.num_consecutive_same_value = 0
+        self.prev_value = NAN
+
+    def update(self, value: float) -> float:
+        if len(self.values) == self.window:
+            self._remove(self.values.popleft())
+        self.values.append(value)
+        self._add(value)
+        if self.nobs < self.window or self.nobs == 0:
+            return NAN
+        result = self.sum_x / self.nobs
+        if self.num_consecutive_same_value >= self.nobs:
+            result = self.prev_value
+        elif self.neg_ct == 0 and result < 0:
+            result = 0.0
+        elif self.neg_ct == self.nobs and result > 0:
+            result = 0.0
+        return result
+
+    def _add(self, value: float) -> None:
+        if math.isnan(value):
+            return
+        self.nobs += 1
+        y = value - self.compensation_add
+        t = self.sum_x + y
+        self.compensation_add = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, value) < 0:
+            self.neg_ct += 1
+        if value == self.prev_value:
+            self.num_consecutive_same_value += 1
+        else:
+            self.num_consecutive_same_value = 1
+        self.prev_value = value
+
+    def _remove(self, value: float) -> None:
+        if math.isnan(value):
+            return
+        self.nobs -= 1
+        y = -value - self.compensation_remove
+        t = self.sum_x + y
+        self.compensation_remove = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, value) < 0:
+            self.neg_ct -= 1
+
+    def state(self) -> Dict[str, any]:
+        state = dict(self.__dict__)
+        state["values"] = list(self.values)
+        return state
+
+    @classmethod
+    def from_state(cls, state: Dict[str, any]):
+        indicator = cls(state["window"])
+        indicator.__dict__.update(state)
+        indicator.values = deque(state["values"])
+        return indicator
+
+
+class RollingStd:
+    """Sample standard deviation (ddof=1) over a fixed window, Welford add/remove updates."""
+
+    def __init__(self, window: int, ddof: int = 1):
+        self.window = window
+        self.ddof = ddof
+        self.values = deque()
+        self.nobs = 0
+        self.mean_x = 0.0
+        self.ssqdm_x = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.num_consecutive_same_value = 0
+        self.prev_value = NAN
+
+    def update(self, value: float) -> float:
+        if len(self.values) == self.window:
+            self._remove(self.values.popleft())
+        self.values.append(value)
+        self._add(value)
+        if self.nobs < self.window or self.nobs <= self.ddof:
+            return NAN
+        if self.nobs == 1 or self.num_consecutive_same_value >= self.nobs:
+            return 0.0
+        variance = self.ssqdm_x / (self.nobs - self.ddof)
+        return math.sqrt(variance) if variance >= 0 else 0.0
+
+    def _add(self, value: float) -> None:
+        if math.isnan(value):
+            return
+        if value == self.prev_value:
+            self.num_consecutive_same_value += 1
+        else:
+            self.num_consecutive_same_value = 1
+        self.prev_value = value
+        self.nobs += 1
+        prev_mean = self.mean_x - self.compensation_add
+        y = value - self.compensation_add
+        t = y - self.mean_x
+        self.compensation_add = t + self.mean_x - y
+        self.mean_x = self.mean_x + t / self.nobs
+        self.ssqdm_x = self.ssqdm_x + (value - prev_mean) * (value - self.mean_x)
+
+    def _remove(self, value: float) -> None:
+        if math.isnan(value):
+            return
+        self.nobs -= 1
+        if self.nobs:
+            prev_mean = self.mean_x - self.compensation_remove
+            y = value - self.compensation_remove
+            t = y - self.mean_x
+            self.compensation_remove = t + self.mean_x - y
+            self.mean_x = self.mean_x - t / self.nobs
+            self.ssqdm_x = self.ssqdm_x - (value - prev_mean) * (value - self.mean_x)
+        else:
+            self.mean_x = 0.0
+            self.ssqdm_x = 0.0
+
+    state = RollingMean.state
+
+    @classmethod
+    def from_state(cls, state: Dict[str, any]):
+        indicator = cls(state["window"], state["ddof"])
+        indicator.__dict__.update(state)
+        indicator.values = deque(state["values"])
+        return indicator
+
+
+class RollingExtremum:
+    """Rolling min (``maximum=False``) or max over a fixed window with a monotonic deque."""
+
+    def __init__(self, window: int, maximum: bool = False):
+        self.window = window
+        self.maximum = maximum
+        self.count = 0
+        # (position, value) pairs, values monotonic from the front (the current extremum)
+        self.candidates = deque()
+
+    def update(self, value: float) -> float:
+        if self.maximum:
+            while self.candidates and self.candidates[-1][1] <= value:
+                self.candidates.pop()
+        else:
+            while self.candidates and self.candidates[-1][1] >= value:
+                self.candidates.pop()
+        self.candidates.append((self.count, value))
+        if self.candidates[0][0] <= self.count - self.window:
+            self.candidates.popleft()
+        self.count += 1
+        return self.candidates[0][1] if self.count >= self.window else NAN
+
+    def state(self) -> Dict[str, any]:
+        return {"window": self.window, "maximum": self.maximum, "count": self.count,
+                "candidates": [list(c) for c in self.candidates]}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, any]):
+        indicator = cls(state["window"], state["maximum"])
+        indicator.count = state["count"]
+        indicator.candidates = deque(tuple(c) for c in state["candidates"])
+        return indicator
+
+
+class EMA:
+    """``Series.ewm(span=span, adjust=False).mean()`` one value at a time."""
+
+    def __init__(self, span: int):
+        self.span = span
+        com = (span - 1) / 2
+        self.alpha = 1.0 / (1.0 + com)
+        self.value = NAN
+
+    def update(self, value: float) -> float:
+        if math.isnan(self.value):
+            self.value = value
+        elif not math.isnan(value) and self.value != value:
+            old_wt = 1.0 - self.alpha
+            self.value = (old_wt * self.value + self.alpha * value) / (old_wt + self.alpha)
+        return self.value
+
+    def state(self) -> Dict[str, any]:
+        return {"span": self.span, "value": self.value}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, any]):
+        indicator = cls(state["span"])
+        indicator.value = state["value"]
+        return indicator
+
+
+class RSI:
+    def __init__(self, window: int = 14):
+        self.window = window
+        self.prev_close = NAN
+        self.gain = RollingMean(window)
+        self.loss = RollingMean(window)
+
+    def update(self, close: float) -> float:
+        delta = close - self.prev_close
+        self.prev_close = close
+        # Same as delta.where(delta > 0, 0) and -delta.where(delta < 0, 0), signed zeros included
+        gain = self.gain.update(delta if delta > 0 else 0.0)
+        loss = self.loss.update(-delta if delta < 0 else -0.0)
+        rs = _divide(gain, loss)
+        return 100 - _divide(100, 1 + rs)
+
+    def state(self) -> Dict[str, any]:
+        return {"window": self.window, "prev_close": self.prev_close,
+                "gain": self.gain.state(), "loss": self.loss.state()}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, any]):
+        indicator = cls(state["window"])
+        indicator.prev_close = state["prev_close"]
+        indicator.gain = RollingMean.from_state(state["gain"])
+        indicator.loss = RollingMean.from_state(state["loss"])
+        return indicator
+
+
+class MACD:
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal = EMA(signal)
+
+    def update(self, close: float):
+        """Return (MACD, signal line, histogram)."""
+        macd = self.fast.update(close) - self.slow.update(close)
+        signal = self.signal.update(macd)
+        return macd, signal, macd - signal
+
+    def state(self) -> Dict[str, any]:
+        return {"fast": self.fast.state(), "slow": self.slow.state(), "signal": self.signal.state()}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, any]):
+        indicator = cls()
+        indicator.fast = EMA.from_state(state["fast"])
+        indicator.slow = EMA.from_state(state["slow"])
+        indicator.signal = EMA.from_state(state["signal"])
+        return indicator
+
+
+class ATR:
+    def __init__(self, window: int = 14):
+        self.window = window
+        self.prev_close = NAN
+        self.mean = RollingMean(window)
+
+    def update(self, high: float, low: float, close: float) -> float:
+        # max(axis=1) skips the NaN true ranges of the first candle
+        ranges = [high - low, abs(high - self.prev_close), abs(low - self.prev_close)]
+        true_range = max((r for r in ranges if not math.isnan(r)), default=NAN)
+        self.prev_close = close
+        return self.mean.update(true_range)
+
+    def state(self) -> Dict[str, any]:
+        return {"window": self.window, "prev_close": self.prev_close, "mean": self.mean.state()}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, any]):
+        indicator = cls(state["window"])
+        indicator.prev_close = state["prev_close"]
+        indicator.mean = RollingMean.from_state(state["mean"])
+        return indicator
+
+
+class Stochastic:
+    def __init__(self, window: int = 14):
+        self.lowest = RollingExtremum(window, maximum=False)
+        self.highest = RollingExtremum(window, maximum=True)
+
+    def update(self, high: float, low: float, close: float) -> float:
+        lowest_low = self.lowest.update(low)
+        highest_high = self.highest.update(high)
+        return _divide(100 * (close - lowest_low), highest_high - lowest_low)
+
+    def state(self) -> Dict[str, any]:
+        return {"lowest": self.lowest.state(), "highest": self.highest.state()}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, any]):
+        indicator = cls()
+        indicator.lowest = RollingExtremum.from_state(state["lowest"])
+        indicator.highest = RollingExtremum.from_state(state["highest"])
+        return indicator
+
+
+class OBV:
+    def __init__(self):
+        self.prev_close = NAN
+        self.value = 0.0
+
+    def update(self, close: float, volume: float) -> float:
+        # The first candle (no previous close) counts as a down move, like the batch code
+        self.value += volume * (1 if close > self.prev_close else -1)
+        self.prev_close = close
+        return self.value
+
+    def state(self) -> Dict[str, any]:
+        return {"prev_close": self.prev_close, "value": self.value}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, any]):
+        indicator = cls()
+        indicator.prev_close = state["prev_close"]
+        indicator.value = state["value"]
+        return indicator
+
+
+class IndicatorEngine:
+    """All the ``add_technical_indicators`` columns, updated one candle at a time."""
+
+    def __init__(self):
+        self.sma_20 = RollingMean(20)
+        self.std_20 = RollingStd(20)
+        self.ema_20 = EMA(20)
+        self.rsi_14 = RSI(14)
+        self.macd = MACD(12, 26, 9)
+        self.atr_14 = ATR(14)
+        self.stochastic = Stochastic(14)
+        self.obv = OBV()
+        self.last: Optional[Dict[str, float]] = None
+
+    def update(self, open_price: float, high_price: float, low_price: float, close_price: float,
+               volume: float, **_) -> Dict[str, float]:
+        sma = self.sma_20.update(close_price)
+        std = self.std_20.update(close_price)
+        macd, signal, histogram = self.macd.update(close_price)
+        self.last = {
+            "SMA_20": sma,
+            "EMA_20": self.ema_20.update(close_price),
+            "RSI_14": self.rsi_14.update(close_price),
+            "MACD": macd,
+            "MACD_Signal": signal,
+            "MACD_Histogram": histogram,
+            "BB_Middle": sma,
+            "BB_Upper": sma + 2 * std,
+            "BB_Lower": sma - 2 * std,
+            "ATR_14": self.atr_14.update(high_price, low_price, close_price),
+            "Stochastic_K": self.stochastic.update(high_price, low_price, close_price),
+            "OBV": self.obv.update(close_price, volume),
+        }
+        return self.last
+
+    def warm_up(self, candles) -> Optional[Dict[str, float]]:
+        """Feed candles (oldest first) and return the latest values.
+
+        ``candles`` can be a DataFrame, a dict of arrays or a ``CANDLE_DTYPE`` array.
+        """
+        columns = [candles[name] for name in ("open_price", "high_price", "low_price", "close_price", "volume")]
+        for candle in zip(*(column.tolist() if hasattr(column, "tolist") else list(column) for column in columns)):
+            self.update(*candle)
+        return self.last
+
+    def state(self) -> Dict[str, any]:
+        return {
+            "sma_20": self.sma_20.state(),
+            "std_20": self.std_20.state(),
+            "ema_20": self.ema_20.state(),
+            "rsi_14": self.rsi_14.state(),
+            "macd": self.macd.state(),
+            "atr_14": self.atr_14.state(),
+            "stochastic": self.stochastic.state(),
+            "obv": self.obv.state(),
+            "last": self.last,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, any]):
+        engine = cls()
+        engine.sma_20 = RollingMean.from_state(state["sma_20"])
+        engine.std_20 = RollingStd.from_state(state["std_20"])
+        engine.ema_20 = EMA.from_state(state["ema_20"])
+        engine.rsi_14 = RSI.from_state(state["rsi_14"])
+        engine.macd = MACD.from_state(state["macd"])
+        engine.atr_14 = ATR.from_state(state["atr_14"])
+        engine.stochastic = Stochastic.from_state(state["stochastic"])
+        engine.obv = OBV.from_state(state["obv"])
+        engine.last = state["last"]
+        return engine
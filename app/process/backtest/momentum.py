@@ -0,0 +1,33 @@
+import numpy as np
+from typing import Any
+
+from process.backtest.backtest import Backtest
+
+
+class MomentumBacktest(Backtest):
+    """
+    Time-series momentum: long when the return over ``lookback`` bars is above
+    ``threshold``, short (or flat when ``allow_short`` is False) when it is
+    below ``-threshold``, flat in between.
+    """
+
+    def __init__(self, data: Any, capital: float = 100_000.0, fee: float = 0.001, slippage: float = 0.0005,
+                 lookback: int = 20, threshold: float = 0.0, allow_short: bool = False):
+        if int(lookback) < 1:
+            raise ValueError(f"lookback must be at least 1 bar, got {lookback}")
+        super().__init__(data, capital=capital, fee=fee, slippage=slippage)
+        self.lookback = int(lookback)
+        self.threshold = float(threshold)
+        self.allow_short = bool(allow_short)
+
+    def generate_signals(self) -> np.ndarray:
+        close = self.close
+        momentum = np.full(len(close), np.nan)
+        if self.lookback < len(close):
+            momentum[self.lookback:] = close[self.lookback:] / close[:-self.lookback] - 1
+        signals = np.where(momentum > self.threshold, 1.0, 0.0)
+        if self.allow_short:
+            signals = np.where(momentum < -self.threshold, -1.0, signals)
+        # No opinion until the lookback window is filled
+        signals[np.isnan(momentum)] = np.nan
+        return signals
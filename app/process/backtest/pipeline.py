@@ -0,0 +1,108 @@
+"""
+Batch historization of a whole exchange universe.
+
+Candles are downloaded on a thread pool (the work is I/O bound and each
+download is already rate limited per exchange), and as soon as a ticker is
+stored its technical indicators are computed on a process pool so the CPU
+bound part runs on every core. Failures are collected per ticker and stage.
+
+    python -m process.backtest.pipeline --exchange coinbase --quote USD \
+        --start 04-01-2025 --end 05-01-2025 --granularity one_hour
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+from common.exchange.exchange_factory import exchange_factory
+from process.backtest.store import CandleStore, DEFAULT_ROOT
+from process.backtest.sync import CandleSync
+from process.backtest.utils import FEATURE_ROOT, compute_technical_indicators
+
+
+def _matches_quote(pair: str, quote: str) -> bool:
+    # Coinbase pairs look like BTC-USD, Binance/Kraken ones like BTCUSDT
+    if "-" in pair:
+        return pair.split("-")[-1] == quote
+    return pair.endswith(quote)
+
+
+def _compute_features(ticker: str, source: str, start, end, granularity: str, store_root: str,
+                      feature_root: str) -> int:
+    # Runs in a worker process, only the row count travels back
+    df = compute_technical_indicators(ticker, CandleStore(store_root), CandleStore(feature_root), source=source,
+                                      start=start, end=end, granularity=granularity)
+    return len(df)
+
+
+def historize_universe(exchange_name: str = "coinbase", quote: str = "USD", tickers: Optional[List[str]] = None,
+                       start="01-01-2025", end=None, granularity: str = "one_day",
+                       download_workers: int = 8, feature_workers: Optional[int] = None,
+                       store_root: str = DEFAULT_ROOT, feature_root: str = FEATURE_ROOT) -> Dict[str, Dict]:
+    """Download and add features to every ``quote`` pair of an exchange (or to ``tickers``).
+
+    Returns ``{"downloaded": {ticker: new candles}, "features": {ticker: rows},
+    "failures": {ticker: "<stage>: <error>"}}``.
+    """
+    exchange = exchange_factory(exchange_name)
+    if tickers is None:
+        tickers = [t for t in exchange.get_available_pairs() if _matches_quote(t, quote)]
+    syncer = CandleSync(CandleStore(store_root))
+    feature_workers = feature_workers or os.cpu_count()
+    report = {"downloaded": {}, "features": {}, "failures": {}}
+    total = len(tickers)
+    started = time.monotonic()
+    print(f"Historizing {total} tickers from {exchange_name} ({download_workers} download / "
+          f"{feature_workers} feature workers)")
+
+    with ThreadPoolExecutor(max_workers=download_workers) as downloads, \
+            ProcessPoolExecutor(max_workers=feature_workers) as features:
+        download_futures = {
+            downloads.submit(syncer.sync, exchange, ticker, granularity, start=start, end=end): ticker
+            for ticker in tickers
+        }
+        feature_futures = {}
+        for done, future in enumerate(as_completed(download_futures), start=1):
+            ticker = download_futures[future]
+            try:
+                report["downloaded"][ticker] = future.result()
+            except Exception as e:
+                report["failures"][ticker] = f"download: {e}"
+                print(f"[download {done}/{total}] {ticker} failed: {e}")
+                continue
+            print(f"[download {done}/{total}] {ticker}: {report['downloaded'][ticker]} new candles")
+            feature_futures[features.submit(_compute_features, ticker, exchange.name, start, end, granularity,
+                                            store_root, feature_root)] = ticker
+
+        for done, future in enumerate(as_completed(feature_futures), start=1):
+            ticker = feature_futures[future]
+            try:
+                report["features"][ticker] = future.result()
+                print(f"[features {done}/{len(feature_futures)}] {ticker}: {report['features'][ticker]} rows")
+            except Exception as e:
+                report["failures"][ticker] = f"features: {e}"
+                print(f"[features {done}/{len(feature_futures)}] {ticker} failed: {e}")
+
+    print(f"Processed {total} tickers in {time.monotonic() - started:.1f}s, {len(report['failures'])} failures")
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Dict]:
+    parser = argparse.ArgumentParser(description="Historize an exchange universe and compute its features")
+    parser.add_argument("--exchange", default="coinbase")
+    parser.add_argument("--quote", default="USD")
+    parser.add_argument("--tickers", nargs="*", help="Restrict to these tickers instead of the whole universe")
+    parser.add_argument("--start", default="01-01-2025", help="MM-DD-YYYY")
+    parser.add_argument("--end", default=None, help="MM-DD-YYYY, defaults to now")
+    parser.add_argument("--granularity", default="one_day")
+    parser.add_argument("--download-workers", type=int, default=8)
+    parser.add_argument("--feature-workers", type=int, default=None, help="Defaults to the number of cores")
+    args = parser.parse_args(argv)
+    return historize_universe(args.exchange, quote=args.quote, tickers=args.tickers or None, start=args.start,
+                              end=args.end, granularity=args.granularity,
+                              download_workers=args.download_workers, feature_workers=args.feature_workers)
+
+
+if __name__ == "__main__":
+    main()
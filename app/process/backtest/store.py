@@ -0,0 +1,386 @@
+"""
+Columnar candle store.
+
+Each (exchange, ticker, granularity) partition is a directory holding one raw
+binary file per column (int64 epoch seconds for ``timestamp``, float64 for the
+OHLCV columns). Files are read back through ``np.memmap`` so a range read only
+touches the rows and columns it asks for.
+
+Layout::
+
+    <root>/<exchange>/<ticker>/<granularity>/timestamp.bin
+                                            /open_price.bin
+                                            /...
+                                            /_meta.json
+
+Coarser granularities can be derived from the finest one pulled from the
+exchange (``rollup``): each level is aggregated from the level below it,
+incrementally from its last (possibly partial) bucket, and stored as a
+regular partition whose metadata names its source (``rollup_of``).
+"""
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_ROOT = "./process/backtest/store"
+
+CANDLE_COLUMNS = ["open_price", "high_price", "low_price", "close_price", "volume"]
+
+# Granularity names used across the backtest pipeline, in seconds
+GRANULARITY_SECONDS = {
+    "one_minute": 60,
+    "five_minute": 300,
+    "fifteen_minute": 900,
+    "one_hour": 3600,
+    "six_hour": 21600,
+    "one_day": 86400,
+}
+
+_TIMESTAMP = "timestamp"
+_META = "_meta.json"
+
+
+def to_epoch(date: Union[str, int, float, datetime, None]) -> Optional[int]:
+    """Convert a MM-DD-YYYY string, a datetime or an epoch number to epoch seconds (UTC)."""
+    if date is None or date == "":
+        return None
+    if isinstance(date, (int, np.integer)):
+        return int(date)
+    if isinstance(date, float):
+        return int(date)
+    if isinstance(date, datetime):
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        return int(date.timestamp())
+    return int(datetime.strptime(date, "%m-%d-%Y").replace(tzinfo=timezone.utc).timestamp())
+
+
+def is_partition_name(name: str) -> bool:
+    """Whether ``name`` can be an exchange or ticker folder: no path separator, not ``..``."""
+    return bool(name) and ".." not in name and not any(sep in name for sep in ("/", "\\", os.sep, "\0"))
+
+
+def aggregate_candles(columns: Dict[str, np.ndarray], seconds: int) -> Dict[str, np.ndarray]:
+    """OHLCV candles grouped into ``seconds`` buckets aligned on the epoch (UTC midnight for days)."""
+    buckets = columns[_TIMESTAMP] - columns[_TIMESTAMP] % seconds
+    if len(buckets) == 0:
+        return {c: v[:0] for c, v in columns.items()}
+    starts = np.flatnonzero(np.concatenate([[True], buckets[1:] != buckets[:-1]]))
+    ends = np.append(starts[1:], len(buckets)) - 1
+    result = {_TIMESTAMP: buckets[starts]}
+    for column, values in columns.items():
+        if column == "open_price":
+            result[column] = values[starts]
+        elif column == "high_price":
+            result[column] = np.maximum.reduceat(values, starts)
+        elif column == "low_price":
+            result[column] = np.minimum.reduceat(values, starts)
+        elif column == "close_price":
+            result[column] = values[ends]
+        elif column == "volume":
+            result[column] = np.add.reduceat(values, starts)
+    return result
+
+
+class CandleStore:
+    def __init__(self, root: str = DEFAULT_ROOT):
+        self.root = root
+
+    def partition(self, exchange: str, ticker: str, granularity: str) -> str:
+        return os.path.join(self.root, exchange, ticker, granularity)
+
+    def tickers(self, exchange: str, granularity: Optional[str] = None) -> List[str]:
+        """List the tickers stored for an exchange (optionally only those holding a granularity)."""
+        base = os.path.join(self.root, exchange)
+        if not os.path.isdir(base):
+            return []
+        tickers = sorted(os.listdir(base))
+        if granularity is None:
+            return tickers
+        return [t for t in tickers if os.path.isdir(os.path.join(base, t, granularity))]
+
+    def columns(self, exchange: str, ticker: str, granularity: str) -> List[str]:
+        meta = self.read_meta(exchange, ticker, granularity)
+        return meta.get("columns", list(CANDLE_COLUMNS))
+
+    # ------------------------------------------------------------------ meta
+    def read_meta(self, exchange: str, ticker: str, granularity: str) -> Dict[str, any]:
+        path = os.path.join(self.partition(exchange, ticker, granularity), _META)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r") as stream:
+            return json.load(stream)
+
+    def write_meta(self, exchange: str, ticker: str, granularity: str, meta: Dict[str, any]) -> None:
+        folder = self.partition(exchange, ticker, granularity)
+        os.makedirs(folder, exist_ok=True)
+        tmp = os.path.join(folder, _META + ".tmp")
+        with open(tmp, "w") as stream:
+            json.dump(meta, stream)
+        os.replace(tmp, os.path.join(folder, _META))
+
+    def version(self, exchange: str, ticker: str, granularity: str) -> int:
+        """Write counter of a partition, bumped by every append, refresh of the last candle or rewrite.
+
+        Caches of derived data key on it: the row count and the last timestamp
+        don't change when the last (partial) candle is refreshed in place.
+        """
+        return self.read_meta(exchange, ticker, granularity).get("writes", 0)
+
+    def _bump_version(self, exchange, ticker, granularity, **meta) -> None:
+        # Called once the data is written, so a reader seeing the new version reads the new rows
+        current = self.read_meta(exchange, ticker, granularity)
+        self.write_meta(exchange, ticker, granularity, {**current, **meta, "writes": current.get("writes", 0) + 1})
+
+    # ----------------------------------------------------------------- reads
+    def count(self, exchange: str, ticker: str, granularity: str) -> int:
+        # The timestamp column is always written last, so its length is the committed row count
+        path = self._column_path(exchange, ticker, granularity, _TIMESTAMP)
+        if not os.path.exists(path):
+            return 0
+        return os.path.getsize(path) // np.dtype(np.int64).itemsize
+
+    def first_timestamp(self, exchange: str, ticker: str, granularity: str) -> Optional[int]:
+        if self.count(exchange, ticker, granularity) == 0:
+            return None
+        return int(self._memmap(exchange, ticker, granularity, _TIMESTAMP)[0])
+
+    def last_timestamp(self, exchange: str, ticker: str, granularity: str) -> Optional[int]:
+        if self.count(exchange, ticker, granularity) == 0:
+            return None
+        return int(self._memmap(exchange, ticker, granularity, _TIMESTAMP)[-1])
+
+    def read(self, exchange: str, ticker: str, granularity: str, start=None, end=None,
+             columns: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        """Read the rows with ``start <= timestamp < end`` for the requested columns.
+
+        ``start``/``end`` accept epoch seconds, datetimes or MM-DD-YYYY strings.
+        Returns a dict of column name -> array, always including ``timestamp``.
+        """
+        columns = list(columns) if columns is not None else self.columns(exchange, ticker, granularity)
+        n = self.count(exchange, ticker, granularity)
+        if n == 0:
+            return self._empty(columns)
+
+        timestamps = self._memmap(exchange, ticker, granularity, _TIMESTAMP)
+        start, end = to_epoch(start), to_epoch(end)
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, side="left"))
+        hi = n if end is None else int(np.searchsorted(timestamps, end, side="left"))
+
+        result = {_TIMESTAMP: np.array(timestamps[lo:hi])}
+        for column in columns:
+            if column == _TIMESTAMP:
+                continue
+            result[column] = np.array(self._memmap(exchange, ticker, granularity, column, n)[lo:hi])
+        return result
+
+    def read_frame(self, exchange: str, ticker: str, granularity: str, start=None, end=None,
+                   columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """Same as ``read`` but returns a DataFrame indexed by epoch timestamp."""
+        data = self.read(exchange, ticker, granularity, start=start, end=end, columns=columns)
+        index = pd.Index(data.pop(_TIMESTAMP), name=_TIMESTAMP)
+        return pd.DataFrame(data, index=index)
+
+    # --------------------------------------------------------------- rollups
+    def levels(self, exchange: str, ticker: str) -> List[str]:
+        """Granularities stored for a ticker, finest first."""
+        return [g for g in GRANULARITY_SECONDS if self.count(exchange, ticker, g) > 0]
+
+    def rollup_source(self, exchange: str, ticker: str, granularity: str) -> Optional[str]:
+        return self.read_meta(exchange, ticker, granularity).get("rollup_of")
+
+    def rollup(self, exchange: str, ticker: str, base: str, since=None) -> Dict[str, int]:
+        """Derive every granularity coarser than ``base`` and return the new rows per level.
+
+        Each level is rebuilt from its last stored bucket onwards (the one that
+        may have been partial), or from ``since`` when older rows of the level
+        below changed (a filled gap or a re-fetched head).
+        """
+        since = to_epoch(since)
+        report = {}
+        source = base
+        for granularity, seconds in GRANULARITY_SECONDS.items():
+            if seconds <= GRANULARITY_SECONDS[base]:
+                continue
+            resume = self.last_timestamp(exchange, ticker, granularity)
+            if since is not None:
+                aligned = since - since % seconds
+                resume = aligned if resume is None else min(resume, aligned)
+            rows = self.read(exchange, ticker, source, start=resume,
+                             columns=[c for c in self.columns(exchange, ticker, source) if c in CANDLE_COLUMNS])
+            report[granularity] = self.append(exchange, ticker, granularity, aggregate_candles(rows, seconds))
+            if self.rollup_source(exchange, ticker, granularity) != source:
+                self.write_meta(exchange, ticker, granularity, {
+                    **self.read_meta(exchange, ticker, granularity), "rollup_of": source})
+            source = granularity
+        return report
+
+    def best_granularity(self, exchange: str, ticker: str, start=None, end=None,
+                         max_points: int = 2000) -> Optional[str]:
+        """Finest stored level with at most ``max_points`` bars over the range, else the coarsest one.
+
+        Zoomed-out ranges are then read from the rollups instead of the base candles.
+        """
+        levels = self.levels(exchange, ticker)
+        if not levels:
+            return None
+        start = to_epoch(start) or self.first_timestamp(exchange, ticker, levels[0])
+        end = to_epoch(end) or self.last_timestamp(exchange, ticker, levels[0])
+        for granularity in levels:
+            if (end - start) / GRANULARITY_SECONDS[granularity] <= max_points:
+                return granularity
+        return levels[-1]
+
+    # ---------------------------------------------------------------- writes
+    def append(self, exchange: str, ticker: str, granularity: str, data) -> int:
+        """Append candles to a partition and return the number of new rows.
+
+        ``data`` may be a DataFrame (epoch or datetime-like index/``timestamp``
+        column), a dict of arrays, a NumPy structured array or a list of dicts as
+        returned by ``Exchange.get_ticker_data``. Rows newer than the last stored
+        candle are appended in place; anything overlapping the stored range goes
+        through a merge so the partition stays sorted and free of duplicates.
+        """
+        columns = self._normalize(data)
+        if len(columns[_TIMESTAMP]) == 0:
+            return 0
+        stored_columns = self.columns(exchange, ticker, granularity)
+        new_columns = [c for c in columns if c != _TIMESTAMP]
+        last = self.last_timestamp(exchange, ticker, granularity)
+
+        if last is not None and set(new_columns) != set(stored_columns):
+            raise ValueError(f"Columns {new_columns} do not match stored columns {stored_columns}")
+
+        timestamps = columns[_TIMESTAMP]
+        if last is None or timestamps[0] > last:
+            return self._append_rows(exchange, ticker, granularity, columns)
+        if timestamps[0] == last:
+            # The last stored candle may have been partial: refresh it in place, append the rest
+            self._overwrite_last(exchange, ticker, granularity, {c: v[0] for c, v in columns.items()})
+            return self._append_rows(exchange, ticker, granularity, {c: v[1:] for c, v in columns.items()})
+        if timestamps[-1] < last and self._covered(exchange, ticker, granularity, timestamps):
+            return 0
+        return self._merge(exchange, ticker, granularity, columns)
+
+    def replace(self, exchange: str, ticker: str, granularity: str, data) -> int:
+        """Overwrite a partition with ``data`` (used for derived datasets such as features)."""
+        columns = self._normalize(data)
+        self._rewrite(exchange, ticker, granularity, columns)
+        return len(columns[_TIMESTAMP])
+
+    def _append_rows(self, exchange, ticker, granularity, columns: Dict[str, np.ndarray]) -> int:
+        if len(columns[_TIMESTAMP]) == 0:
+            return 0
+        folder = self.partition(exchange, ticker, granularity)
+        os.makedirs(folder, exist_ok=True)
+        n = self.count(exchange, ticker, granularity)
+        if n == 0:
+            self.write_meta(exchange, ticker, granularity, {
+                **self.read_meta(exchange, ticker, granularity),
+                "columns": [c for c in columns if c != _TIMESTAMP],
+            })
+        for column, values in columns.items():
+            if column == _TIMESTAMP:
+                continue
+            path = self._column_path(exchange, ticker, granularity, column)
+            # Drop any tail left behind by an interrupted append before writing
+            with open(path, "ab") as stream:
+                stream.truncate(n * np.dtype(np.float64).itemsize)
+                stream.write(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+        with open(self._column_path(exchange, ticker, granularity, _TIMESTAMP), "ab") as stream:
+            stream.write(np.ascontiguousarray(columns[_TIMESTAMP], dtype=np.int64).tobytes())
+        self._bump_version(exchange, ticker, granularity)
+        return len(columns[_TIMESTAMP])
+
+    def _overwrite_last(self, exchange, ticker, granularity, row: Dict[str, any]) -> None:
+        n = self.count(exchange, ticker, granularity)
+        for column, value in row.items():
+            if column == _TIMESTAMP:
+                continue
+            with open(self._column_path(exchange, ticker, granularity, column), "r+b") as stream:
+                stream.seek((n - 1) * np.dtype(np.float64).itemsize)
+                stream.write(np.float64(value).tobytes())
+        self._bump_version(exchange, ticker, granularity)
+
+    def _merge(self, exchange, ticker, granularity, columns: Dict[str, np.ndarray]) -> int:
+        stored = self.read(exchange, ticker, granularity)
+        before = len(stored[_TIMESTAMP])
+        merged = {c: np.concatenate([stored[c], columns[c]]) for c in stored}
+        # Keep the most recent value for duplicated timestamps (new data wins)
+        order = np.argsort(merged[_TIMESTAMP], kind="stable")
+        timestamps = merged[_TIMESTAMP][order]
+        keep = np.ones(len(timestamps), dtype=bool)
+        keep[:-1] = timestamps[1:] != timestamps[:-1]
+        merged = {c: values[order][keep] for c, values in merged.items()}
+        self._rewrite(exchange, ticker, granularity, merged)
+        return len(merged[_TIMESTAMP]) - before
+
+    def _rewrite(self, exchange, ticker, granularity, columns: Dict[str, np.ndarray]) -> None:
+        folder = self.partition(exchange, ticker, granularity)
+        os.makedirs(folder, exist_ok=True)
+        names = [c for c in columns if c != _TIMESTAMP]
+        for column in names + [_TIMESTAMP]:
+            dtype = np.int64 if column == _TIMESTAMP else np.float64
+            path = self._column_path(exchange, ticker, granularity, column)
+            np.ascontiguousarray(columns[column], dtype=dtype).tofile(path + ".tmp")
+        for column in names + [_TIMESTAMP]:
+            path = self._column_path(exchange, ticker, granularity, column)
+            os.replace(path + ".tmp", path)
+        self._bump_version(exchange, ticker, granularity, columns=names)
+
+    def _covered(self, exchange, ticker, granularity, timestamps: np.ndarray) -> bool:
+        stored = self._memmap(exchange, ticker, granularity, _TIMESTAMP)
+        idx = np.searchsorted(stored, timestamps)
+        idx = np.minimum(idx, len(stored) - 1)
+        return bool(np.all(stored[idx] == timestamps))
+
+    # --------------------------------------------------------------- helpers
+    def _column_path(self, exchange, ticker, granularity, column) -> str:
+        return os.path.join(self.partition(exchange, ticker, granularity), f"{column}.bin")
+
+    def _memmap(self, exchange, ticker, granularity, column, n: Optional[int] = None) -> np.ndarray:
+        dtype = np.int64 if column == _TIMESTAMP else np.float64
+        if n is None:
+            n = self.count(exchange, ticker, granularity)
+        return np.memmap(self._column_path(exchange, ticker, granularity, column),
+                         dtype=dtype, mode="r", shape=(n,))
+
+    @staticmethod
+    def _empty(columns: Iterable[str]) -> Dict[str, np.ndarray]:
+        result = {_TIMESTAMP: np.empty(0, dtype=np.int64)}
+        for column in columns:
+            if column != _TIMESTAMP:
+                result[column] = np.empty(0, dtype=np.float64)
+        return result
+
+    @staticmethod
+    def _normalize(data) -> Dict[str, np.ndarray]:
+        """Turn the supported inputs into sorted, de-duplicated column arrays."""
+        if isinstance(data, pd.DataFrame):
+            frame = data.reset_index() if _TIMESTAMP not in data.columns else data
+            columns = {c: frame[c].to_numpy() for c in frame.columns if c != "index"}
+        elif isinstance(data, np.ndarray) and data.dtype.names:
+            columns = {c: data[c] for c in data.dtype.names}
+        elif isinstance(data, dict):
+            columns = {c: np.asarray(v) for c, v in data.items()}
+        else:
+            frame = pd.DataFrame(list(data))
+            if frame.empty:
+                return {_TIMESTAMP: np.empty(0, dtype=np.int64)}
+            columns = {c: frame[c].to_numpy() for c in frame.columns}
+
+        timestamps = columns[_TIMESTAMP]
+        if timestamps.dtype.kind in "OUSM":
+            epoch = pd.Timestamp(0, tz="UTC")
+            timestamps = (pd.to_datetime(timestamps, utc=True) - epoch) // pd.Timedelta(seconds=1)
+        columns[_TIMESTAMP] = np.asarray(timestamps, dtype=np.int64)
+
+        order = np.argsort(columns[_TIMESTAMP], kind="stable")
+        ordered = columns[_TIMESTAMP][order]
+        keep = np.ones(len(ordered), dtype=bool)
+        keep[:-1] = ordered[1:] != ordered[:-1]
+        return {c: np.asarray(v)[order][keep] for c, v in columns.items()}
@@ -0,0 +1,170 @@
+"""
+Parallel parameter sweeps over stored candles.
+
+Each pair's candles are read from the candle store once and copied into a
+shared memory block; worker processes attach to the blocks instead of
+receiving a copy of the data with every task. Parameter combinations are sent
+in batches and results stream back into one table (a DataFrame with a row
+per pair and combination) that can be sorted by any metric. Results are
+cached on disk by data version and parameters, so re-running a sweep only
+computes the new combinations or the pairs whose data changed.
+"""
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from process.backtest.backtest_factory import backtest_factory
+from process.backtest.store import CandleStore
+
+SWEEP_COLUMNS = ["timestamp", "open_price", "close_price"]
+DEFAULT_CACHE = "./process/backtest/sweep_cache.jsonl"
+
+# Blocks attached in a worker process, by shared memory name
+_attached: Dict[str, Tuple[shared_memory.SharedMemory, Dict[str, np.ndarray]]] = {}
+
+
+def expand_grid(grid: Dict[str, Iterable]) -> List[Dict[str, any]]:
+    """{"lookback": [10, 20], "threshold": [0, 0.01]} -> the 4 parameter dicts."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(list(grid[n]) for n in names))]
+
+
+class SharedCandles:
+    """Candle columns of one pair in a shared memory block, laid out as a (columns, rows) float64 matrix."""
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.names = list(columns)
+        self.rows = len(columns[self.names[0]])
+        self.shm = shared_memory.SharedMemory(create=True, size=max(8 * len(self.names) * self.rows, 1))
+        matrix = np.ndarray((len(self.names), self.rows), dtype=np.float64, buffer=self.shm.buf)
+        for i, name in enumerate(self.names):
+            matrix[i] = columns[name]
+
+    def descriptor(self) -> Tuple[str, List[str], int]:
+        return self.shm.name, self.names, self.rows
+
+    def close(self) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _attach(descriptor: Tuple[str, List[str], int]) -> Dict[str, np.ndarray]:
+    name, names, rows = descriptor
+    if name not in _attached:
+        shm = shared_memory.SharedMemory(name=name)
+        matrix = np.ndarray((len(names), rows), dtype=np.float64, buffer=shm.buf)
+        _attached[name] = (shm, {n: matrix[i] for i, n in enumerate(names)})
+    return _attached[name][1]
+
+
+def _run_batch(backtest_name: str, descriptor, batch: List[Dict[str, any]],
+               backtest_kwargs: Dict[str, any]) -> List[Dict[str, any]]:
+    data = _attach(descriptor)
+    results = []
+    for params in batch:
+        try:
+            results.append(backtest_factory(backtest_name, data, **backtest_kwargs, **params).run())
+        except Exception as e:
+            results.append({"error": str(e)})
+    return results
+
+
+class ParameterSweep:
+    def __init__(self, store: CandleStore = None, exchange: str = "coinbase", granularity: str = "one_hour",
+                 backtest_name: str = "momentum", cache_path: Optional[str] = DEFAULT_CACHE):
+        self.store = store or CandleStore()
+        self.exchange = exchange
+        self.granularity = granularity
+        self.backtest_name = backtest_name
+        self.cache_path = cache_path
+        self._cache = self._load_cache()
+
+    def data_version(self, pair: str, start=None, end=None) -> str:
+        """Changes whenever candles are added to, refreshed in or rewritten in the pair's partition."""
+        store, exchange, granularity = self.store, self.exchange, self.granularity
+        return (f"{store.count(exchange, pair, granularity)}:{store.last_timestamp(exchange, pair, granularity)}:"
+                f"{store.version(exchange, pair, granularity)}:{start}:{end}")
+
+    def run(self, pairs: List[str], grid: Dict[str, Iterable], start=None, end=None, max_workers: int = None,
+            batch_size: int = 64, **backtest_kwargs) -> pd.DataFrame:
+        """Backtest every combination of ``grid`` on every pair and return the results table."""
+        combinations = expand_grid(grid)
+        rows: List[Dict[str, any]] = []
+        blocks: List[SharedCandles] = []
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {}
+                for pair in pairs:
+                    version = self.data_version(pair, start, end)
+                    todo = []
+                    for params in combinations:
+                        cached = self._cache.get(self._key(pair, version, params, backtest_kwargs))
+                        if cached is not None:
+                            rows.append(cached)
+                        else:
+                            todo.append(params)
+                    if not todo:
+                        continue
+                    columns = self.store.read(self.exchange, pair, self.granularity, start=start, end=end,
+                                              columns=SWEEP_COLUMNS)
+                    if len(columns["timestamp"]) == 0:
+                        print(f"No candles stored for {pair}, skipped")
+                        continue
+                    block = SharedCandles(columns)
+                    blocks.append(block)
+                    for i in range(0, len(todo), batch_size):
+                        batch = todo[i:i + batch_size]
+                        future = executor.submit(_run_batch, self.backtest_name, block.descriptor(), batch,
+                                                 backtest_kwargs)
+                        futures[future] = (pair, version, batch)
+
+                for done, future in enumerate(as_completed(futures), start=1):
+                    pair, version, batch = futures[future]
+                    rows.extend(self._collect(pair, version, batch, future.result(), backtest_kwargs))
+                    print(f"[sweep {done}/{len(futures)}] {len(rows)} results")
+        finally:
+            for block in blocks:
+                block.close()
+
+        return pd.DataFrame(rows)
+
+    @staticmethod
+    def top(results: pd.DataFrame, metric: str = "sharpe", n: int = 10, ascending: bool = False) -> pd.DataFrame:
+        return results.sort_values(metric, ascending=ascending).head(n)
+
+    # ----------------------------------------------------------------- cache
+    def _key(self, pair: str, version: str, params: Dict[str, any], backtest_kwargs: Dict[str, any]) -> str:
+        payload = json.dumps([self.backtest_name, self.exchange, self.granularity, pair, version,
+                              params, backtest_kwargs], sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def _load_cache(self) -> Dict[str, Dict[str, any]]:
+        cache = {}
+        if self.cache_path and os.path.exists(self.cache_path):
+            with open(self.cache_path, "r") as stream:
+                for line in stream:
+                    entry = json.loads(line)
+                    cache[entry["key"]] = entry["result"]
+        return cache
+
+    def _collect(self, pair: str, version: str, batch: List[Dict[str, any]], metrics: List[Dict[str, any]],
+                 backtest_kwargs: Dict[str, any]) -> List[Dict[str, any]]:
+        rows = [{"pair": pair, **params, **result} for params, result in zip(batch, metrics)]
+        if not self.cache_path:
+            return rows
+        with open(self.cache_path, "a") as stream:
+            for params, row in zip(batch, rows):
+                # Failed runs are not cached so they are retried next time
+                if "error" in row:
+                    continue
+                key = self._key(pair, version, params, backtest_kwargs)
+                self._cache[key] = row
+                stream.write(json.dumps({"key": key, "result": row}) + "\n")
+        return rows
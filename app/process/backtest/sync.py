@@ -0,0 +1,139 @@
+"""
+Incremental candle synchronisation.
+
+Each (exchange, symbol, granularity) partition of the candle store keeps a
+watermark in its metadata: the open time of the last stored candle. A sync
+only asks the exchange for what is missing around it:
+
+* the tail from the watermark to ``end`` (the last candle is re-fetched since
+  it may have been stored while still open),
+* the head before the first stored candle when ``start`` goes further back,
+* the holes inside the stored range.
+
+Holes the exchange has no data for (no trades during the period) are
+remembered so they are not requested again on every run. So is the head: the
+exchange may not serve old candles at all (Kraken keeps the newest 720 of an
+interval, see ``Exchange.history_start``), what it didn't return before the
+first stored candle is recorded as ``unreachable_head`` and only an earlier
+``start`` asks for more.
+
+Only the granularity that is synced is pulled from the exchange, the coarser
+ones are rolled up from it by the store. Syncing a rolled up granularity syncs
+its base instead.
+"""
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from common.exchange.exchange import Exchange
+from common.exchange.utils.downloader import clear_checkpoints
+from process.backtest.store import CandleStore, GRANULARITY_SECONDS, to_epoch
+
+
+class CandleSync:
+    def __init__(self, store: CandleStore = None):
+        self.store = store or CandleStore()
+
+    def watermark(self, exchange_name: str, symbol: str, granularity: str) -> Optional[int]:
+        return self.store.read_meta(exchange_name, symbol, granularity).get("watermark")
+
+    def watermarks(self, exchange_name: str, granularity: str) -> Dict[str, Optional[int]]:
+        return {
+            symbol: self.watermark(exchange_name, symbol, granularity)
+            for symbol in self.store.tickers(exchange_name, granularity)
+        }
+
+    def sync(self, exchange: Exchange, symbol: str, granularity: str = "one_hour", start=None, end=None,
+             fill_gaps: bool = True, rollup: bool = True) -> int:
+        """Bring a partition up to date and return the number of new candles stored.
+
+        ``start`` is only needed for the first sync of a symbol (or to extend the
+        history further back); ``end`` defaults to now. With ``rollup`` the
+        coarser granularities are derived from the new candles.
+        """
+        source = self.store.rollup_source(exchange.name, symbol, granularity)
+        if source is not None:
+            return self.sync(exchange, symbol, source, start=start, end=end, fill_gaps=fill_gaps, rollup=rollup)
+        seconds = GRANULARITY_SECONDS[granularity]
+        start, end = to_epoch(start), to_epoch(end) or int(time.time())
+        first = self.store.first_timestamp(exchange.name, symbol, granularity)
+        last = self.store.last_timestamp(exchange.name, symbol, granularity)
+
+        ranges: List[Tuple[int, int]] = []
+        if last is None:
+            if start is None:
+                raise ValueError(f"No candles stored for {symbol}, a start date is required for the first sync")
+            ranges.append((self._align(start, seconds), end))
+        else:
+            # Down to unreachable_head the exchange had nothing before the first candle
+            unreachable = self.store.read_meta(exchange.name, symbol, granularity).get("unreachable_head", first)
+            head_end = min(first, unreachable)
+            if start is not None and start < head_end:
+                ranges.append((self._align(start, seconds), head_end))
+            if fill_gaps:
+                ranges.extend(self.find_gaps(exchange.name, symbol, granularity))
+            if last < end:
+                ranges.append((last, end))
+
+        # Candles older than the exchange serves are not asked for, they count as requested
+        oldest = exchange.history_start(seconds)
+        fetched = ranges if oldest is None else [(max(s, oldest), e) for s, e in ranges if e > oldest]
+
+        written = 0
+        checkpoint_dir = os.path.join(self.store.partition(exchange.name, symbol, granularity), "_checkpoint")
+        for range_start, range_end in fetched:
+            candles = exchange.get_ticker_history(symbol, seconds, range_start, range_end,
+                                                  checkpoint_dir=checkpoint_dir, as_array=True)
+            written += self.store.append(exchange.name, symbol, granularity, candles)
+            # Stored: a later sync won't need the chunks of this range
+            clear_checkpoints(checkpoint_dir, range_start, range_end)
+
+        self._update_meta(exchange.name, symbol, granularity, ranges)
+        if rollup and ranges:
+            self.store.rollup(exchange.name, symbol, granularity, since=min(r[0] for r in ranges))
+        return written
+
+    def sync_many(self, exchange: Exchange, symbols: List[str], granularity: str = "one_hour", start=None,
+                  end=None) -> Dict[str, any]:
+        """Sync several symbols, returning the new candle count (or the error) per symbol."""
+        report = {}
+        for symbol in symbols:
+            try:
+                report[symbol] = self.sync(exchange, symbol, granularity, start=start, end=end)
+            except Exception as e:
+                print(f"Issue when syncing {symbol}: {str(e)}")
+                report[symbol] = e
+        return report
+
+    def find_gaps(self, exchange_name: str, symbol: str, granularity: str) -> List[Tuple[int, int]]:
+        """Missing ``[start, end)`` ranges inside the stored history, skipping known empty ones."""
+        seconds = GRANULARITY_SECONDS[granularity]
+        timestamps = self.store.read(exchange_name, symbol, granularity, columns=[])["timestamp"]
+        if len(timestamps) < 2:
+            return []
+        holes = np.flatnonzero(np.diff(timestamps) > seconds)
+        known = {tuple(gap) for gap in self.store.read_meta(exchange_name, symbol, granularity).get("known_gaps", [])}
+        gaps = [(int(timestamps[i]) + seconds, int(timestamps[i + 1])) for i in holes]
+        return [gap for gap in gaps if gap not in known]
+
+    def _update_meta(self, exchange_name: str, symbol: str, granularity: str, requested: List[Tuple[int, int]]):
+        meta = self.store.read_meta(exchange_name, symbol, granularity)
+        # Whatever is still missing after being requested has no data on the exchange side
+        still_missing = set(self.find_gaps(exchange_name, symbol, granularity)) if requested else set()
+        known = {tuple(gap) for gap in meta.get("known_gaps", [])}
+        known |= {gap for gap in still_missing
+                  if any(start <= gap[0] and gap[1] <= end for start, end in requested)}
+        meta["known_gaps"] = sorted([list(gap) for gap in known])
+        first = self.store.first_timestamp(exchange_name, symbol, granularity)
+        head = min((start for start, _ in requested), default=None)
+        if first is not None and head is not None and head < first:
+            meta["unreachable_head"] = min(head, meta.get("unreachable_head", head))
+        meta["watermark"] = self.store.last_timestamp(exchange_name, symbol, granularity)
+        meta["synced_at"] = int(time.time())
+        self.store.write_meta(exchange_name, symbol, granularity, meta)
+
+    @staticmethod
+    def _align(timestamp: int, seconds: int) -> int:
+        return timestamp - timestamp % seconds
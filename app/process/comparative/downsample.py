@@ -0,0 +1,115 @@
+"""
+Downsampling of long series for charts.
+
+* ``lttb``: Largest-Triangle-Three-Buckets, keeps the points that shape a line
+  chart (first and last points are always kept).
+* ``minmax``: the lowest and highest point of each bucket, in time order, so
+  spikes survive.
+* ``minmax_candles``: buckets of candles merged into one candle (first open,
+  highest high, lowest low, last close, summed volume).
+
+Buckets are equal slices of the points; everything but the bucket-to-bucket
+step of LTTB (each bucket depends on the point picked in the previous one) is
+computed on whole arrays.
+"""
+from typing import Dict, Tuple
+
+import numpy as np
+
+# Fewest points the API accepts per method, fewer keep only the first and last points
+MIN_POINTS = {"lttb": 3, "minmax": 2}
+
+
+def _bounds(n: int, buckets: int) -> np.ndarray:
+    return np.linspace(0, n, buckets + 1).astype(np.int64)
+
+
+def _padded(values: np.ndarray, bounds: np.ndarray, fill: float) -> np.ndarray:
+    """(buckets, widest bucket) matrix of ``values`` padded with ``fill``."""
+    sizes = np.diff(bounds)
+    columns = np.arange(sizes.max())
+    index = bounds[:-1, None] + columns
+    matrix = values[np.minimum(index, len(values) - 1)].astype(np.float64)
+    matrix[columns >= sizes[:, None]] = fill
+    return matrix
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> Tuple[np.ndarray, np.ndarray]:
+    """``(x, y)`` of the ``points`` points that best keep the shape of the line."""
+    x, y = np.asarray(x), np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if points >= n or n <= 2:
+        return x, y
+    if points < 3:
+        return x[[0, -1]], y[[0, -1]]
+    xf = x.astype(np.float64)
+    # Inner points split in ``points - 2`` buckets, the first and last points are kept as is
+    bounds = 1 + _bounds(n - 2, points - 2)
+    sizes = np.diff(bounds)
+    avg_x = np.add.reduceat(xf, bounds[:-1]) / sizes
+    avg_y = np.add.reduceat(y, bounds[:-1]) / sizes
+    # The next bucket of the last one is the last point
+    next_x = np.append(avg_x[1:], xf[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = bounds[i], bounds[i + 1]
+        ax, ay = xf[a], y[a]
+        # Twice the area of the triangle (a, point, next bucket average), up to the sign
+        area = np.abs((ax - next_x[i]) * (y[lo:hi] - ay) - (ax - xf[lo:hi]) * (next_y[i] - ay))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return x[selected], y[selected]
+
+
+def minmax(x: np.ndarray, y: np.ndarray, points: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Lowest and highest point of ``points // 2`` buckets, in time order."""
+    x, y = np.asarray(x), np.asarray(y, dtype=np.float64)
+    n = len(x)
+    buckets = points // 2
+    if points >= n or n <= 2:
+        return x, y
+    if buckets < 1:
+        return x[[0, -1]], y[[0, -1]]
+    bounds = _bounds(n, buckets)
+    lows = bounds[:-1] + np.argmin(_padded(y, bounds, np.inf), axis=1)
+    highs = bounds[:-1] + np.argmax(_padded(y, bounds, -np.inf), axis=1)
+    selected = np.sort(np.stack([lows, highs], axis=1), axis=1).ravel()
+    # A flat bucket gives the same point twice
+    selected = selected[np.concatenate([[True], np.diff(selected) != 0])]
+    return x[selected], y[selected]
+
+
+def minmax_candles(candles: Dict[str, np.ndarray], points: int) -> Dict[str, np.ndarray]:
+    """Merge candle columns (``timestamp``, ``open_price``, ..., ``volume``) into ``points`` candles."""
+    n = len(candles["timestamp"])
+    if points >= n or n == 0:
+        return candles
+    # Never fewer than one candle
+    points = max(points, 1)
+    starts = _bounds(n, points)[:-1]
+    ends = np.append(starts[1:], n) - 1
+    merged = {"timestamp": np.asarray(candles["timestamp"])[starts]}
+    if "open_price" in candles:
+        merged["open_price"] = np.asarray(candles["open_price"])[starts]
+    if "high_price" in candles:
+        merged["high_price"] = np.maximum.reduceat(np.asarray(candles["high_price"]), starts)
+    if "low_price" in candles:
+        merged["low_price"] = np.minimum.reduceat(np.asarray(candles["low_price"]), starts)
+    if "close_price" in candles:
+        merged["close_price"] = np.asarray(candles["close_price"])[ends]
+    if "volume" in candles:
+        merged["volume"] = np.add.reduceat(np.asarray(candles["volume"]), starts)
+    return merged
+
+
+METHODS = {"lttb": lttb, "minmax": minmax}
+
+
+def downsample(x: np.ndarray, y: np.ndarray, points: int, method: str = "lttb") -> Tuple[np.ndarray, np.ndarray]:
+    if method not in METHODS:
+        raise ValueError(f"Unknown downsampling method {method}, expected one of {list(METHODS)}")
+    return METHODS[method](x, y, points)
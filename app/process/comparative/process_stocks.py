@@ -1,21 +1,102 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 import pandas as pd
-import time
-import datetime
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
 class ProcessStock():
+    """
+    Daily series of the CSV files of ``DATA_DIR`` (one ``<SYMBOL>.csv`` per stock).
+
+    A file is parsed once into NumPy arrays (epoch milliseconds, values) and
+    parsed again only when its modification time changes. Encoded responses
+    are kept too, keyed by the request and the mtimes of the files used.
+    """
+    _series: Dict[Tuple[str, str], Tuple[int, np.ndarray, np.ndarray]] = {}
+    _responses: "OrderedDict[tuple, any]" = OrderedDict()
+    MAX_RESPONSES = 64
+    _lock = threading.Lock()
+
     @staticmethod
-    def run():
-        stock1 = pd.read_csv("./process/comparative/data/AAPL.csv")
-        stock2 = pd.read_csv("./process/comparative/data/TSLA.csv")
+    def symbols() -> List[str]:
+        return sorted(f[:-4] for f in os.listdir(DATA_DIR) if f.endswith(".csv"))
 
-        stock1["Date"] = stock1["Date"].astype('datetime64[ns]')
-        stock2["Date"] = stock2["Date"].astype('datetime64[ns]')
+    @staticmethod
+    def _path(symbol: str) -> str:
+        # Symbols come from the query string, they must name a file of DATA_DIR
+        if symbol not in ProcessStock.symbols():
+            raise KeyError(f"Unknown symbol {symbol}")
+        return os.path.join(DATA_DIR, f"{symbol}.csv")
+
+    @classmethod
+    def load(cls, symbol: str, column: str = "Adj Close") -> Tuple[int, np.ndarray, np.ndarray]:
+        """``(mtime, timestamps in ms, values)`` of a symbol, parsed again only if the file changed."""
+        path = cls._path(symbol)
+        mtime = os.stat(path).st_mtime_ns
+        cached = cls._series.get((symbol, column))
+        if cached is not None and cached[0] == mtime:
+            return cached
+        df = pd.read_csv(path, usecols=["Date", column])
+        timestamps = pd.to_datetime(df["Date"]).to_numpy(dtype="datetime64[ms]").astype(np.int64)
+        values = df[column].to_numpy(dtype=np.float64)
+        order = np.argsort(timestamps, kind="stable")
+        series = (mtime, timestamps[order], values[order])
+        with cls._lock:
+            cls._series[(symbol, column)] = series
+        return series
+
+    @staticmethod
+    def to_ms(date: Optional[str]) -> Optional[int]:
+        """Epoch milliseconds of a date string, None when empty; ``ValueError`` when it isn't a date."""
+        if not date:
+            return None
+        timestamp = pd.Timestamp(date)
+        if timestamp is pd.NaT:
+            raise ValueError(f"{date!r} is not a date")
+        return int(timestamp.value // 1_000_000)
 
-        stock1 = stock1[["Date", "Adj Close"]].values.tolist()
-        stock2 = stock2[["Date", "Adj Close"]].values.tolist()
+    @classmethod
+    def series(cls, symbols: List[str], start: Optional[str] = None, end: Optional[str] = None,
+               column: str = "Adj Close") -> Dict[str, Dict[str, np.ndarray]]:
+        """Columnar series ``{symbol: {"timestamp": ms, "value": values}}`` with ``start <= date <= end``."""
+        start_ms, end_ms = cls.to_ms(start), cls.to_ms(end)
+        result = {}
+        for symbol in symbols:
+            _, timestamps, values = cls.load(symbol, column)
+            lo = np.searchsorted(timestamps, start_ms, side="left") if start_ms is not None else 0
+            hi = np.searchsorted(timestamps, end_ms, side="right") if end_ms is not None else len(timestamps)
+            result[symbol] = {"timestamp": timestamps[lo:hi], "value": values[lo:hi]}
+        return result
 
-        return {
-            "stock-1": stock1,
-            "stock-2": stock2,
-        }
+    @classmethod
+    def cached_response(cls, key: tuple, symbols: List[str], build) -> any:
+        """``build()`` once per ``key`` as long as the files of ``symbols`` are unchanged."""
+        key = key + tuple(cls.load(symbol)[0] for symbol in symbols)
+        with cls._lock:
+            if key in cls._responses:
+                cls._responses.move_to_end(key)
+                return cls._responses[key]
+        response = build()
+        with cls._lock:
+            cls._responses[key] = response
+            while len(cls._responses) > cls.MAX_RESPONSES:
+                cls._responses.popitem(last=False)
+        return response
 
+    @staticmethod
+    def run():
+        # Former payload of /test_comparative: [[date, adjusted close], ...] for AAPL and TSLA
+        symbols = ["AAPL", "TSLA"]
 
+        def build():
+            return {
+                f"stock-{i}": [[pd.Timestamp(t, unit="ms").isoformat(), v]
+                               for t, v in zip(s["timestamp"].tolist(), s["value"].tolist())]
+                for i, s in enumerate(ProcessStock.series(symbols).values(), start=1)
+            }
+        return ProcessStock.cached_response(("run",), symbols, build)
@@ -0,0 +1,153 @@
+"""
+Order execution: local validation, asynchronous submission, latency tracking.
+
+``OrderExecutor.submit`` does on the caller's thread only what needs no
+network: the product rules come from the exchange's ``ProductIndex`` (loaded
+once, ``warm`` loads it ahead of the first signal), the quantity and limit
+price are rounded to the increments and checked against the minimums, and an
+order the exchange would refuse is rejected right there. The order then goes
+to the exchange on a small thread pool at ``HIGH`` priority, so it jumps the
+queue of the rate limiter, and ``submit`` returns a ``Future`` of the
+acknowledgement straight away.
+
+Every order carries a client order id. Submitting the same id again returns the
+order already in flight instead of sending a second one, and the exchanges
+that support it (Coinbase, Binance for open orders, Replay) don't place it
+twice either. The time from the signal (``signal_time``, ``time.perf_counter``
+of when the strategy decided) to the acknowledgement is recorded in
+``common.metrics.ORDER_ACK_SECONDS``.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from common.exchange.exchange import Exchange, new_client_order_id
+from common.exchange.exchange_factory import exchange_factory
+from common.exchange.utils.rate_limiter import HIGH, request_priority
+from common.metrics import ORDER_ACK_SECONDS, ORDERS
+
+ORDER_TYPES = ("market", "limit")
+
+_executors: Dict[str, "OrderExecutor"] = {}
+_executors_lock = threading.Lock()
+
+
+class OrderRejected(ValueError):
+    """Order that breaks the product rules, refused before reaching the exchange."""
+
+
+def prepare_order(exchange: Exchange, quantity, pair: str, buy: bool, order_type: str = "market",
+                  price=None) -> Dict[str, Any]:
+    """Order rounded to the increments of ``exchange``'s product; raises ``OrderRejected`` when it would refuse it.
+
+    Shared by the live executor and the strategy replay, so backtests trade what the exchange would accept.
+    """
+    if order_type not in ORDER_TYPES:
+        raise OrderRejected(f"Unsupported order type: {order_type}")
+    if order_type == "limit" and price is None:
+        raise OrderRejected("Limit orders require a price")
+    product = exchange.products().get(pair)
+    if product is None:
+        raise OrderRejected(f"{pair} is not traded on {exchange.name}")
+    rounded_quantity = product.round_quantity(quantity)
+    rounded_price = product.round_price(price, buy) if order_type == "limit" else None
+    error = product.validate(rounded_quantity, rounded_price)
+    if error is not None:
+        raise OrderRejected(error)
+    return {"quantity": rounded_quantity, "pair": product.symbol, "buy": buy, "order_type": order_type,
+            "price": rounded_price}
+
+
+class OrderExecutor:
+    # Client order ids remembered for deduplication
+    MAX_TRACKED = 10_000
+
+    def __init__(self, exchange: Exchange, max_workers: int = 4):
+        self.exchange = exchange
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"orders-{exchange.name}")
+        self._orders: "OrderedDict[str, Future]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def warm(self) -> Future:
+        """Load the product rules (and the exchange client) in the background, before the first order needs them."""
+        return self._pool.submit(self.exchange.products().symbols)
+
+    def prepare(self, quantity, pair: str, buy: bool, order_type: str = "market", price=None) -> Dict[str, Any]:
+        """Order rounded to the product increments; raises ``OrderRejected`` when the exchange would refuse it."""
+        return prepare_order(self.exchange, quantity, pair, buy, order_type, price)
+
+    def submit(self, quantity, pair: str, buy: bool, order_type: str = "market", price=None,
+               client_order_id: str = None, signal_time: float = None) -> Future:
+        """Validate the order and send it in the background; the future resolves to the acknowledgement.
+
+        Rejected and failed orders resolve to ``{"error": ..., "client_order_id": ...}``
+        like the adapters. ``signal_time`` defaults to now.
+        """
+        signal_time = time.perf_counter() if signal_time is None else signal_time
+        client_order_id = client_order_id or new_client_order_id()
+        with self._lock:
+            if client_order_id in self._orders:
+                return self._orders[client_order_id]
+            future = Future()
+            self._orders[client_order_id] = future
+            while len(self._orders) > self.MAX_TRACKED:
+                self._orders.popitem(last=False)
+
+        try:
+            order = self.prepare(quantity, pair, buy, order_type, price)
+        except OrderRejected as e:
+            ORDERS.labels(self.exchange.name, order_type, "rejected").inc()
+            future.set_result({"error": str(e), "client_order_id": client_order_id})
+            return future
+        except Exception as e:
+            # The product rules could not be loaded: nothing was sent, the id can be submitted again
+            with self._lock:
+                self._orders.pop(client_order_id, None)
+            ORDERS.labels(self.exchange.name, order_type, "failed").inc()
+            future.set_result({"error": f"Cannot validate the order: {e}", "client_order_id": client_order_id})
+            return future
+
+        def send():
+            try:
+                with request_priority(HIGH):
+                    ack = self.exchange.execute_order(order["quantity"], order["pair"], buy, order_type,
+                                                      price=order["price"], client_order_id=client_order_id)
+            except Exception as e:
+                ack = {"error": str(e), "client_order_id": client_order_id}
+            ORDER_ACK_SECONDS.labels(self.exchange.name, order_type).observe(time.perf_counter() - signal_time)
+            ORDERS.labels(self.exchange.name, order_type, "failed" if "error" in ack else "acknowledged").inc()
+            future.set_result(ack)
+
+        self._pool.submit(send)
+        return future
+
+    async def asubmit(self, quantity, pair: str, buy: bool, order_type: str = "market", price=None,
+                      client_order_id: str = None, signal_time: float = None) -> Dict[str, Any]:
+        """``submit`` awaited from the event loop."""
+        return await asyncio.wrap_future(self.submit(quantity, pair, buy, order_type, price, client_order_id,
+                                                     signal_time))
+
+    def execute(self, quantity, pair: str, buy: bool, order_type: str = "market", price=None,
+                client_order_id: str = None, signal_time: float = None) -> Dict[str, Any]:
+        """``submit`` and wait for the acknowledgement."""
+        return self.submit(quantity, pair, buy, order_type, price, client_order_id, signal_time).result()
+
+    def order(self, client_order_id: str) -> Optional[Future]:
+        """Future of an order submitted with ``client_order_id``, None when unknown."""
+        with self._lock:
+            return self._orders.get(client_order_id)
+
+    def close(self) -> None:
+        """Wait for the orders in flight and stop the workers."""
+        self._pool.shutdown(wait=True)
+
+
+def order_executor(name: str) -> OrderExecutor:
+    """The executor of exchange ``name``, shared by every strategy trading there."""
+    with _executors_lock:
+        if name not in _executors:
+            _executors[name] = OrderExecutor(exchange_factory(name))
+        return _executors[name]
@@ -0,0 +1,139 @@
+"""
+Market data feeds: one WebSocket stream per exchange yielding ``(asset, price)``
+ticks for the assets it is asked for, plus a random-walk feed standing in for
+the exchanges when testing.
+"""
+import asyncio
+import json
+import random
+from typing import AsyncIterator, Dict, List, Tuple
+
+import websockets
+
+
+class MarketFeed:
+    URL = ""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    async def symbols(self, assets: List[str]) -> Dict[str, str]:
+        """Exchange symbol of each asset that can be streamed, mapped back to the asset."""
+        raise NotImplementedError("Not implemented here")
+
+    def subscription(self, symbols: List[str]) -> List[Dict[str, any]]:
+        """Messages sent once connected."""
+        return []
+
+    def parse(self, message: any) -> List[Tuple[str, float]]:
+        """``(symbol, price)`` ticks contained in a decoded message."""
+        raise NotImplementedError("Not implemented here")
+
+    def url(self, symbols: List[str]) -> str:
+        return self.URL
+
+    async def ticks(self, assets: List[str]) -> AsyncIterator[Tuple[str, float]]:
+        symbols = await self.symbols(assets)
+        if not symbols:
+            return
+        async with websockets.connect(self.url(list(symbols)), ping_interval=20) as socket:
+            for message in self.subscription(list(symbols)):
+                await socket.send(json.dumps(message))
+            async for raw in socket:
+                for symbol, price in self.parse(json.loads(raw)):
+                    if symbol in symbols:
+                        yield symbols[symbol], price
+
+
+class BinanceFeed(MarketFeed):
+    URL = "wss://stream.binance.com:9443/stream"
+    QUOTE = "USDT"
+
+    async def symbols(self, assets: List[str]) -> Dict[str, str]:
+        return {f"{asset}{self.QUOTE}": asset for asset in assets if asset != self.QUOTE}
+
+    def url(self, symbols: List[str]) -> str:
+        # Combined stream, the subscription is part of the URL
+        return f"{self.URL}?streams=" + "/".join(f"{symbol.lower()}@miniTicker" for symbol in symbols)
+
+    def parse(self, message: any) -> List[Tuple[str, float]]:
+        data = message.get("data", {})
+        return [(data["s"], float(data["c"]))] if "c" in data else []
+
+
+class KrakenFeed(MarketFeed):
+    URL = "wss://ws.kraken.com"
+    QUOTES = ("USD", "ZUSD")
+
+    async def symbols(self, assets: List[str]) -> Dict[str, str]:
+        # Balance codes (XXBT, ...) are the ``base`` of AssetPairs, the stream wants the ``wsname`` (XBT/USD)
+        from common.exchange.kraken.async_kraken import AsyncKraken
+        if AsyncKraken.asset_pairs is None:
+            AsyncKraken.asset_pairs = await AsyncKraken("kraken")._query_public('AssetPairs')
+        return {details['wsname']: details['base'] for details in AsyncKraken.asset_pairs.values()
+                if details.get('quote') in self.QUOTES and details.get('base') in assets and 'wsname' in details}
+
+    def subscription(self, symbols: List[str]) -> List[Dict[str, any]]:
+        return [{"event": "subscribe", "pair": symbols, "subscription": {"name": "ticker"}}]
+
+    def parse(self, message: any) -> List[Tuple[str, float]]:
+        # [channel id, {"c": [last price, lot volume], ...}, "ticker", "XBT/USD"], events are dicts
+        if isinstance(message, list) and len(message) == 4 and message[2] == "ticker":
+            return [(message[3], float(message[1]["c"][0]))]
+        return []
+
+
+class CoinbaseFeed(MarketFeed):
+    URL = "wss://advanced-trade-ws.coinbase.com"
+    QUOTE = "USD"
+
+    async def symbols(self, assets: List[str]) -> Dict[str, str]:
+        return {f"{asset}-{self.QUOTE}": asset for asset in assets if asset != self.QUOTE}
+
+    def subscription(self, symbols: List[str]) -> List[Dict[str, any]]:
+        # Heartbeats keep the connection open when the subscribed products are quiet
+        return [{"type": "subscribe", "product_ids": symbols, "channel": "ticker"},
+                {"type": "subscribe", "product_ids": symbols, "channel": "heartbeats"}]
+
+    def parse(self, message: any) -> List[Tuple[str, float]]:
+        if message.get("channel") != "ticker":
+            return []
+        return [(ticker["product_id"], float(ticker["price"]))
+                for event in message.get("events", []) for ticker in event.get("tickers", [])]
+
+
+class LocalFeed(MarketFeed):
+    """Random walk around ``prices`` (asset -> starting price), one tick per asset every ``interval`` seconds."""
+
+    def __init__(self, name: str, prices: Dict[str, float] = None, interval: float = 0.1,
+                 volatility: float = 0.001, seed: int = None):
+        super().__init__(name)
+        self.prices = dict(prices or {})
+        self.interval = interval
+        self.volatility = volatility
+        self.random = random.Random(seed)
+
+    async def symbols(self, assets: List[str]) -> Dict[str, str]:
+        return {asset: asset for asset in assets}
+
+    async def ticks(self, assets: List[str]) -> AsyncIterator[Tuple[str, float]]:
+        while True:
+            for asset in assets:
+                price = self.prices.get(asset) or 1.0
+                price *= 1 + self.random.gauss(0, self.volatility)
+                self.prices[asset] = price
+                yield asset, price
+            await asyncio.sleep(self.interval)
+
+
+def feed_factory(exchange_used: str, local: bool = False, prices: Dict[str, float] = None) -> MarketFeed:
+    if local or exchange_used == "replay":
+        return LocalFeed(exchange_used, prices)
+    if exchange_used == "binance":
+        return BinanceFeed("binance")
+    elif exchange_used == "kraken":
+        return KrakenFeed("kraken")
+    elif exchange_used == "coinbase":
+        return CoinbaseFeed("coinbase")
+    else:
+        raise Exception("Exchange Unknown")
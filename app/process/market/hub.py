@@ -0,0 +1,146 @@
+"""
+Server side market data hub.
+
+The hub keeps one feed per exchange for the assets of the portfolio, a
+last-price table and the portfolio lines re-valued on every tick. Frames (the
+whole portfolio with the latest prices) are built at most ``fps`` times per
+second, encoded once and handed to every connected client, so the upstream
+load only depends on the number of exchanges and a slow client simply skips
+to the latest frame.
+"""
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Dict, List, Tuple
+
+from process.market.feeds import feed_factory
+from process.portfolio.portfolio import get_portfolio_async
+
+
+class MarketHub:
+    def __init__(self, exchanges: List[str], fps: float = 2.0, local: bool = False,
+                 refresh_interval: float = 60.0, retry_delay: float = 5.0):
+        self.exchanges = exchanges
+        self.fps = fps
+        self.local = local
+        self.refresh_interval = refresh_interval
+        self.retry_delay = retry_delay
+        self.lines: Dict[Tuple[str, str], Dict[str, any]] = {}
+        self.prices: Dict[Tuple[str, str], float] = {}
+        self.version = 0
+        self.frame: str = None
+        self._dirty = False
+        self._condition: asyncio.Condition = None
+        self._start_lock: asyncio.Lock = None
+        self._feeds: Dict[str, asyncio.Task] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """Load the portfolio and start the feeds, once, on the running event loop."""
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+            self._condition = asyncio.Condition()
+        async with self._start_lock:
+            if self.running:
+                return
+            await self.refresh_portfolio()
+            self._tasks = [asyncio.ensure_future(self._broadcast()),
+                           asyncio.ensure_future(self._refresh())]
+
+    async def stop(self) -> None:
+        tasks = self._tasks + list(self._feeds.values())
+        self._tasks, self._feeds = [], {}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def assets(self, exchange: str) -> List[str]:
+        return sorted(asset for line_exchange, asset in self.lines if line_exchange == exchange)
+
+    async def refresh_portfolio(self) -> None:
+        """Reload the balances, (re)starting the feed of an exchange whose assets changed."""
+        portfolio = await get_portfolio_async(self.exchanges)
+        previous = {exchange: self.assets(exchange) for exchange in self.exchanges}
+        lines = {}
+        for line in portfolio:
+            key = (line["exchange"], line["asset"])
+            # Streamed prices win over the ones of the REST snapshot
+            if key in self.prices:
+                self._value(line, self.prices[key])
+            elif line.get("amount_usd") and line["quantity"]:
+                self.prices[key] = line["amount_usd"] / line["quantity"]
+            lines[key] = line
+        self.lines = lines
+        self._dirty = True
+        for exchange in self.exchanges:
+            if exchange not in self._feeds or self.assets(exchange) != previous[exchange]:
+                if exchange in self._feeds:
+                    self._feeds[exchange].cancel()
+                self._feeds[exchange] = asyncio.ensure_future(self._run_feed(exchange, self.assets(exchange)))
+
+    def on_tick(self, exchange: str, asset: str, price: float) -> None:
+        key = (exchange, asset)
+        self.prices[key] = price
+        line = self.lines.get(key)
+        if line is not None:
+            self._value(line, price)
+        self._dirty = True
+
+    @staticmethod
+    def _value(line: Dict[str, any], price: float) -> None:
+        # Same rule as get_portfolio: dust is not valued
+        line["amount_usd"] = price * line["quantity"] if line["quantity"] > 0.1 else None
+
+    def snapshot(self) -> Dict[str, any]:
+        return {
+            "portfolio": list(self.lines.values()),
+            "prices": {f"{exchange}:{asset}": price for (exchange, asset), price in self.prices.items()},
+            "timestamp": time.time(),
+        }
+
+    async def frames(self) -> AsyncIterator[str]:
+        """Encoded frames for one client: the current one first, then each new one it has time to take."""
+        seen = 0
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: self.version > seen)
+                seen, frame = self.version, self.frame
+            yield frame
+
+    async def _run_feed(self, exchange: str, assets: List[str]) -> None:
+        if not assets:
+            return
+        while True:
+            try:
+                prices = {asset: self.prices.get((exchange, asset)) for asset in assets}
+                feed = feed_factory(exchange, local=self.local, prices=prices)
+                async for asset, price in feed.ticks(assets):
+                    self.on_tick(exchange, asset, price)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Market feed of {exchange} stopped: {e}")
+            await asyncio.sleep(self.retry_delay)
+
+    async def _broadcast(self) -> None:
+        while True:
+            await asyncio.sleep(1 / self.fps)
+            if not self._dirty:
+                continue
+            self._dirty = False
+            self.frame = json.dumps(self.snapshot())
+            async with self._condition:
+                self.version += 1
+                self._condition.notify_all()
+
+    async def _refresh(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh_portfolio()
+            except Exception as e:
+                print(f"Cannot refresh the portfolio: {e}")
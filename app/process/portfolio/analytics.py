@@ -0,0 +1,189 @@
+"""
+Incrementally maintained portfolio analytics.
+
+Each snapshot written by the scheduler updates, per exchange and for all
+exchanges together (``"all"``):
+
+* a state document: last NAV, running peak, and per asset the quantity, price,
+  value and cumulative market PnL (``previous quantity * price change``, so
+  deposits and trades do not show up as PnL),
+* hourly and daily rollup documents: NAV open/high/low/close, allocation
+  weights, PnL and drawdown as of the bucket close, worst drawdown inside the
+  bucket.
+
+The snapshots of one scheduler run share a timestamp: ``"all"`` is updated
+once per timestamp, after every exchange of the run, so it never mixes the new
+state of one exchange with the previous state of another.
+
+History queries read the rollups through the (exchange, period, bucket) index,
+so they cost the same however many snapshots were taken.
+"""
+from datetime import datetime, timezone
+from itertools import groupby
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from pymongo import ASCENDING
+
+from database.database import Database
+
+PERIODS = {"hour": 3600, "day": 86400}
+ALL = "all"
+
+
+def _epoch(timestamp) -> float:
+    if isinstance(timestamp, datetime):
+        # MongoDB gives back naive datetimes, they are UTC
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return timestamp.timestamp()
+    return float(timestamp)
+
+
+def _snapshot(snapshot: Union[Tuple[str, Any, Any], Dict[str, Any]]) -> Tuple[str, Any, float]:
+    # An (exchange, portfolio, timestamp) tuple or a document of PortfolioDB
+    if isinstance(snapshot, dict):
+        return snapshot["exchange"], snapshot["portfolio"], _epoch(snapshot["timestamp"])
+    exchange, portfolio, timestamp = snapshot
+    return exchange, portfolio, _epoch(timestamp)
+
+
+class PortfolioAnalytics(Database):
+    def __init__(self, collection_name: str = "portfolio-rollups", state_collection: str = "portfolio-analytics-state"):
+        super().__init__(collection_name=collection_name)
+        self.state_collection = self.client[self.database_name][state_collection]
+        self.collection.create_index([("exchange", ASCENDING), ("period", ASCENDING), ("bucket", ASCENDING)],
+                                     unique=True)
+
+    def state(self, exchange: str) -> Optional[Dict[str, Any]]:
+        return self.state_collection.find_one({"_id": exchange})
+
+    # ---------------------------------------------------------------- writes
+    def update_many(self, snapshots: Iterable[Union[Tuple[str, Any, Any], Dict[str, Any]]]) -> int:
+        """Apply snapshots in time order, returning how many were applied.
+
+        ``snapshots`` are ``(exchange, portfolio, timestamp)`` tuples or the documents
+        of ``PortfolioDB``. Those sharing a timestamp are applied together, then ``"all"``.
+        """
+        applied = 0
+        for timestamp, group in groupby(sorted(map(_snapshot, snapshots), key=lambda s: s[2]), key=lambda s: s[2]):
+            updated = sum(self._update_exchange(exchange, portfolio, timestamp) for exchange, portfolio, _ in group)
+            if updated:
+                self._update_total(timestamp)
+            applied += updated
+        return applied
+
+    def update(self, exchange: str, portfolio: List[Dict[str, Any]], timestamp) -> bool:
+        """Apply one snapshot; the snapshots of a run (one timestamp) go through ``update_many`` together."""
+        return self.update_many([(exchange, portfolio, timestamp)]) == 1
+
+    def _update_exchange(self, exchange: str, portfolio: List[Dict[str, Any]], timestamp: float) -> bool:
+        previous = self.state(exchange)
+        if previous is not None and timestamp <= previous["timestamp"]:
+            print(f"Snapshot of {exchange} at {timestamp} is older than the analytics state, use rebuild()")
+            return False
+        state = self._next_state(exchange, previous, self._positions(portfolio), timestamp)
+        self._save(state, previous)
+        return True
+
+    def _update_total(self, timestamp: float) -> None:
+        # The "all" state combines the latest state of every exchange
+        total_previous = self.state(ALL)
+        if total_previous is not None and timestamp <= total_previous["timestamp"]:
+            print(f"Snapshots at {timestamp} arrived after \"all\" was updated for that time, use rebuild()")
+            return
+        exchanges = [s for s in self.state_collection.find({"_id": {"$ne": ALL}})]
+        positions = {f"{s['_id']}:{asset}": position for s in exchanges for asset, position in s["assets"].items()}
+        total = self._combine(total_previous, positions, sum(s["pnl"] for s in exchanges), timestamp)
+        self._save(total, total_previous)
+
+    @staticmethod
+    def _positions(portfolio: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+        positions = {}
+        for line in portfolio:
+            quantity = float(line.get("quantity") or 0)
+            value = line.get("amount_usd")
+            positions[line["asset"]] = {
+                "quantity": quantity,
+                "value": float(value) if value is not None else 0.0,
+                "price": float(value) / quantity if value is not None and quantity else None,
+            }
+        return positions
+
+    @staticmethod
+    def _next_state(exchange: str, previous: Optional[Dict[str, Any]], positions: Dict[str, Dict[str, float]],
+                    timestamp: float) -> Dict[str, Any]:
+        before = previous["assets"] if previous else {}
+        assets = {}
+        for asset in set(before) | set(positions):
+            old = before.get(asset, {"quantity": 0.0, "price": None, "pnl": 0.0})
+            new = positions.get(asset, {"quantity": 0.0, "value": 0.0, "price": old["price"]})
+            pnl = old["pnl"]
+            if old["price"] is not None and new["price"] is not None:
+                pnl += old["quantity"] * (new["price"] - old["price"])
+            assets[asset] = {**new, "pnl": pnl}
+        nav = sum(a["value"] for a in assets.values())
+        return PortfolioAnalytics._finish(exchange, previous, assets, nav,
+                                          sum(a["pnl"] for a in assets.values()), timestamp)
+
+    @staticmethod
+    def _combine(previous: Optional[Dict[str, Any]], assets: Dict[str, Dict[str, float]], pnl: float,
+                 timestamp: float) -> Dict[str, Any]:
+        return PortfolioAnalytics._finish(ALL, previous, assets, sum(a["value"] for a in assets.values()), pnl,
+                                          timestamp)
+
+    @staticmethod
+    def _finish(exchange: str, previous: Optional[Dict[str, Any]], assets: Dict[str, Dict[str, float]], nav: float,
+                pnl: float, timestamp: float) -> Dict[str, Any]:
+        for position in assets.values():
+            position["weight"] = position["value"] / nav if nav else 0.0
+        peak = max(previous["peak"], nav) if previous else nav
+        return {
+            "_id": exchange,
+            "timestamp": timestamp,
+            "nav": nav,
+            "pnl": pnl,
+            "peak": peak,
+            "drawdown": nav / peak - 1 if peak else 0.0,
+            "assets": assets,
+        }
+
+    def _save(self, state: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> None:
+        self.state_collection.replace_one({"_id": state["_id"]}, state, upsert=True)
+        assets = [{"asset": asset, **position} for asset, position in sorted(state["assets"].items())]
+        for period, seconds in PERIODS.items():
+            bucket = int(state["timestamp"] // seconds * seconds)
+            self.collection.update_one({"exchange": state["_id"], "period": period, "bucket": bucket}, {
+                "$set": {"timestamp": state["timestamp"], "nav": state["nav"], "pnl": state["pnl"],
+                         "drawdown": state["drawdown"], "assets": assets},
+                # PnL made during the bucket is pnl - pnl_open
+                "$setOnInsert": {"nav_open": state["nav"], "pnl_open": previous["pnl"] if previous else 0.0},
+                "$max": {"nav_high": state["nav"]},
+                "$min": {"nav_low": state["nav"], "max_drawdown": state["drawdown"]},
+                "$inc": {"snapshots": 1},
+            }, upsert=True)
+
+    def rebuild(self, snapshots: Iterable[Union[Tuple[str, Any, Any], Dict[str, Any]]]) -> int:
+        """Drop everything and replay ``snapshots`` (e.g. the chained ``PortfolioDB.iter_portfolio_data``
+        of every exchange)."""
+        self.collection.delete_many({})
+        self.state_collection.delete_many({})
+        return self.update_many(snapshots)
+
+    # ----------------------------------------------------------------- reads
+    def history(self, exchange: str = ALL, period: str = "hour", start=None, end=None,
+                fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Rollups of ``start <= bucket <= end`` (epoch seconds or datetimes) in time order."""
+        if period not in PERIODS:
+            raise ValueError(f"Unknown period {period}, expected one of {list(PERIODS)}")
+        query = {"exchange": exchange, "period": period}
+        bucket = {}
+        if start is not None:
+            bucket["$gte"] = _epoch(start)
+        if end is not None:
+            bucket["$lte"] = _epoch(end)
+        if bucket:
+            query["bucket"] = bucket
+        projection = {"_id": 0}
+        if fields:
+            projection.update({field: 1 for field in ["bucket", *fields]})
+        return list(self.collection.find(query, projection).sort("bucket", ASCENDING))
@@ -1,36 +1,67 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any
 
+from common.cache.cached_exchange import async_cached_exchange, cached_exchange
 from common.exchange.exchange_factory import exchange_factory
+from common.exchange.utils.rate_limiter import HIGH, request_priority
 
 
-def get_portfolio(exchanges: List[str] = ["coinbase"]) -> List[Dict[str, Any]]:
+def _value_portfolio(exchange: str, balance_account: Dict[str, Any], spots: Dict[str, float]) -> List[Dict[str, Any]]:
     my_portfolio = []
-    for exchange in exchanges:
-        exchange_object = exchange_factory(exchange)
-        balance_account = exchange_object.get_account_details(all_details=False, flag_portfolio = True)
-        spots = {}
-        for asset in balance_account["assets"]:
-            try:
-                symbol = f"{asset}USDT"
-                spot = exchange_object.get_spot_pair(first_pair=asset)
-                spots[symbol] = float(spot) if spot else -1
-            except:
-                pass
-        for line in balance_account["portfolio"]:
-            try:
-                symbol = f"{line['asset']}USDT"
-                float_free = float(line[line['asset']])
-                line["quantity"] = float_free
-                line["exchange"] = exchange
-                if float_free > 0.1 and symbol in spots:
-                    line["amount_usd"] = spots[symbol] * float_free if spots[symbol] > 0 else 0
-                else:
-                    line["amount_usd"] = None
-                my_portfolio.append(line)
-            except:
-                pass
-        del spots
+    for line in balance_account["portfolio"]:
+        try:
+            # Lines come from the shared cache, they are copied before being completed
+            line = dict(line)
+            asset = line['asset']
+            float_free = float(line[asset])
+            line["quantity"] = float_free
+            line["exchange"] = exchange
+            if float_free > 0.1 and asset in spots:
+                line["amount_usd"] = spots[asset] * float_free if spots[asset] > 0 else 0
+            else:
+                line["amount_usd"] = None
+            my_portfolio.append(line)
+        except:
+            pass
     return my_portfolio
 
 
-get_portfolio()
\ No newline at end of file
+def get_exchange_portfolio(exchange: str, cached: bool = True) -> List[Dict[str, Any]]:
+    # Snapshots read the exchange itself (``cached=False``): the cache may serve balances minutes old
+    exchange_object = cached_exchange(exchange) if cached else exchange_factory(exchange)
+    # Pricing the portfolio goes ahead of history downloads on the exchange rate limiter
+    with request_priority(HIGH):
+        balance_account = exchange_object.get_account_details(all_details=False, flag_portfolio = True)
+        # One multi-symbol ticker call per exchange instead of one call per asset
+        try:
+            spots = exchange_object.get_spot_pairs(balance_account["assets"])
+        except Exception as e:
+            print(f"Cannot get spot prices on {exchange}: {e}")
+            spots = {}
+    return _value_portfolio(exchange, balance_account, spots)
+
+
+def get_portfolio(exchanges: List[str] = ["coinbase"]) -> List[Dict[str, Any]]:
+    # Every exchange is queried at the same time, lines keep the order of ``exchanges``
+    with ThreadPoolExecutor(max_workers=max(len(exchanges), 1)) as executor:
+        portfolios = list(executor.map(get_exchange_portfolio, exchanges))
+    return [line for portfolio in portfolios for line in portfolio]
+
+
+async def get_exchange_portfolio_async(exchange: str) -> List[Dict[str, Any]]:
+    exchange_object = async_cached_exchange(exchange)
+    with request_priority(HIGH):
+        balance_account = await exchange_object.get_account_details(all_details=False, flag_portfolio = True)
+        try:
+            spots = await exchange_object.get_spot_pairs(balance_account["assets"])
+        except Exception as e:
+            print(f"Cannot get spot prices on {exchange}: {e}")
+            spots = {}
+    return _value_portfolio(exchange, balance_account, spots)
+
+
+async def get_portfolio_async(exchanges: List[str] = ["coinbase"]) -> List[Dict[str, Any]]:
+    """``get_portfolio`` on the event loop, the exchanges are queried concurrently without threads."""
+    portfolios = await asyncio.gather(*(get_exchange_portfolio_async(exchange) for exchange in exchanges))
+    return [line for portfolio in portfolios for line in portfolio]
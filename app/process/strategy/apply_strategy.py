@@ -1,15 +1,127 @@
+import time
+from typing import Any, Dict, Optional
+
+from common.exchange.exchange import Exchange
+from common.exchange.exchange_factory import exchange_factory
+from common.exchange.simulated.simulated import SimulatedExchange
+from process.execution.executor import OrderExecutor, OrderRejected, order_executor, prepare_order
 from process.strategy.base_strategy import BaseStrategy
 
+_CANDLE_COLUMNS = ("timestamp", "open_price", "high_price", "low_price", "close_price", "volume")
+# Rounded orders remembered by (quantity, order type, price): strategies repeat the same few sizes
+_MAX_PREPARED = 10_000
+
 
 class ApplyStrategy:
+    """
+    Drives a strategy against an exchange: ``apply`` runs it live on the
+    candles closed since the last call, its orders validated and sent by the
+    exchange's ``OrderExecutor``; ``replay`` pushes stored candles through the
+    same ``on_bar``/``on_fill`` path against a ``SimulatedExchange``.
+    """
 
-    def __init__(self, strategy: BaseStrategy):
-        pass
+    def __init__(self, strategy: BaseStrategy, exchange: Optional[Exchange] = None):
+        self.strategy = strategy
+        self._exchange = exchange
+        self._executor: Optional[OrderExecutor] = None
+        self._prepared: Dict[tuple, Dict[str, Any]] = {}
+        self.last_timestamp: Optional[int] = None
 
+    @property
+    def exchange(self) -> Exchange:
+        if self._exchange is None:
+            self._exchange = exchange_factory(self.strategy.exchange)
+        return self._exchange
+
+    @property
+    def executor(self) -> OrderExecutor:
+        if self._executor is None:
+            self._executor = order_executor(self.strategy.exchange) if self._exchange is None \
+                else OrderExecutor(self._exchange)
+            # The product rules load while the candles are fetched, not when the first signal comes
+            self._executor.warm()
+        return self._executor
 
     def apply(self):
-        pass
+        """Feed the candles closed since the previous call to the strategy and execute its orders."""
+        strategy = self.strategy
+        executor = self.executor
+        now = int(time.time())
+        last_closed = now - now % strategy.granularity
+        start = last_closed - strategy.granularity if self.last_timestamp is None \
+            else self.last_timestamp + strategy.granularity
+        candles = self.exchange.get_ticker_history(strategy.pair, strategy.granularity, start, last_closed,
+                                                   as_array=True)
+        fills = []
+        for bar in zip(*(candles[name].tolist() for name in _CANDLE_COLUMNS)):
+            quantity = strategy.on_bar(*bar)
+            if quantity:
+                signal_time = time.perf_counter()
+                future = executor.submit(abs(quantity), strategy.pair, quantity > 0, signal_time=signal_time)
+                # The next bar sees the position this order left
+                fills.append(self._report(future.result()))
+            self.last_timestamp = bar[0]
+        return fills
+
+    def execute_order(self, quantity: float, order_type: str = "market", price: float = None) -> Dict[str, Any]:
+        """Send a signed quantity for the strategy's pair to the exchange directly and report fills back.
+
+        The order is rounded and checked against the product rules like a live one (``prepare_order``).
+        """
+        exchange = self._exchange or self.exchange
+        key = (quantity, order_type, price)
+        order = self._prepared.get(key)
+        if order is None:
+            if len(self._prepared) >= _MAX_PREPARED:
+                self._prepared.clear()
+            try:
+                order = prepare_order(exchange, abs(quantity), self.strategy.pair, quantity > 0, order_type,
+                                      price)
+            except OrderRejected as e:
+                order = {"error": str(e)}
+            self._prepared[key] = order
+        if "error" in order:
+            return order
+        return self._report(exchange.execute_order(order["quantity"], order["pair"], order["buy"], order_type,
+                                                   price=order["price"]))
+
+    def _report(self, order: Dict[str, Any]) -> Dict[str, Any]:
+        # Resting limit orders are not fills yet
+        if order and "error" not in order and (order.get("status", "filled") == "filled"
+                                               or order.get("order_type") == "market"):
+            self.strategy.on_fill(order)
+        return order
+
+    def replay(self, candles, balances: Optional[Dict[str, float]] = None, fee: float = 0.001,
+               slippage: float = 0.0005) -> Dict[str, Any]:
+        """Run the strategy bar by bar over ``candles`` (DataFrame, dict of arrays or CANDLE_DTYPE array)."""
+        strategy = self.strategy
+        if not isinstance(self._exchange, SimulatedExchange):
+            self._exchange = SimulatedExchange(balances=balances, fee=fee, slippage=slippage)
+        exchange = self._exchange
+        exchange.load(strategy.pair, candles)
+        # Rounded against the rules of this run
+        self._prepared.clear()
+        columns = [exchange.candles[strategy.pair][name].tolist() for name in _CANDLE_COLUMNS]
 
+        started = time.perf_counter()
+        strategy.on_start()
+        on_bar = strategy.on_bar
+        execute_order = self.execute_order
+        bars = 0
+        for bars, bar in enumerate(zip(*columns), start=1):
+            exchange.cursor = bars - 1
+            quantity = on_bar(*bar)
+            if quantity:
+                execute_order(quantity)
+        strategy.on_stop()
+        elapsed = time.perf_counter() - started
 
-    def execute_order(self):
-        pass
+        return {
+            "bars": bars,
+            "seconds": elapsed,
+            "bars_per_second": bars / elapsed if elapsed > 0 else float("inf"),
+            "fills": exchange.fills,
+            "balances": dict(exchange.balances),
+            "equity": exchange.equity(strategy.pair.split("-")[1]),
+        }
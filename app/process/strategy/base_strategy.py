@@ -1,7 +1,34 @@
-from typing import Any
+from typing import Any, Dict
 
 
 class BaseStrategy:
-    def __init__(self, exchange: str, amount: float, strategy_type: Any):
+    """
+    Interface shared by live trading and historical replay.
+
+    ``on_bar`` receives every closed candle as plain floats and returns the
+    signed base quantity to trade on it (positive buys, negative sells, 0 does
+    nothing). Keeping the hot path to one call with scalar arguments is what
+    lets the replay run at millions of bars per second.
+    """
+
+    def __init__(self, exchange: str, amount: float, strategy_type: Any = None, pair: str = "BTC-USD",
+                 granularity: int = 60):
+        self.exchange = exchange
+        self.amount = amount
+        self.strategy_type = strategy_type
+        self.pair = pair
+        self.granularity = granularity
+        self.position = 0.0
+
+    def on_start(self):
         pass
 
+    def on_bar(self, timestamp: int, open_price: float, high_price: float, low_price: float, close_price: float,
+               volume: float) -> float:
+        raise NotImplementedError("Not implemented here")
+
+    def on_fill(self, fill: Dict[str, Any]):
+        self.position += fill["quantity"] if fill["side"] == "BUY" else -fill["quantity"]
+
+    def on_stop(self):
+        pass
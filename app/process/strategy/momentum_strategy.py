@@ -0,0 +1,26 @@
+from collections import deque
+from typing import Any
+
+from process.strategy.base_strategy import BaseStrategy
+
+
+class MomentumStrategy(BaseStrategy):
+    """
+    Bar-by-bar twin of ``MomentumBacktest``: hold ``amount`` of the base asset
+    while the return over ``lookback`` bars is above ``threshold``.
+    """
+
+    def __init__(self, exchange: str, amount: float, strategy_type: Any = "momentum", pair: str = "BTC-USD",
+                 granularity: int = 60, lookback: int = 20, threshold: float = 0.0):
+        super().__init__(exchange, amount, strategy_type, pair=pair, granularity=granularity)
+        self.lookback = lookback
+        self.threshold = threshold
+        self.closes = deque(maxlen=lookback + 1)
+
+    def on_bar(self, timestamp, open_price, high_price, low_price, close_price, volume):
+        closes = self.closes
+        closes.append(close_price)
+        if len(closes) <= self.lookback:
+            return 0
+        target = self.amount if close_price / closes[0] - 1 > self.threshold else 0.0
+        return target - self.position
@@ -1,7 +1,8 @@
 from api.server import app
-from settings import API_HOST, API_PORT
+from settings import get_settings
 
 
 def run():
     import uvicorn
-    uvicorn.run(app, host=API_HOST, port=API_PORT)
\ No newline at end of file
+    settings = get_settings()
+    uvicorn.run(app, host=settings["API_HOST"], port=settings["API_PORT"])
\ No newline at end of file
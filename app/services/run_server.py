@@ -0,0 +1,22 @@
+from multiprocessing import Process
+
+from services.save_data import run_scheduler
+from settings import get_settings
+
+
+def run():
+    # The snapshots run in their own process, the API never waits on them
+    scheduler = Process(target=run_scheduler, name="portfolio-snapshots", daemon=True)
+    scheduler.start()
+    try:
+        import uvicorn
+        from api.server import app
+        settings = get_settings()
+        uvicorn.run(app, host=settings["API_HOST"], port=settings["API_PORT"])
+    finally:
+        scheduler.terminate()
+        scheduler.join()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,231 @@
+"""
+Background portfolio snapshots.
+
+``SnapshotScheduler`` snapshots every configured exchange at a fixed interval
+(plus a random jitter so several instances do not hit the exchanges at the
+same instant). When a run overruns the interval the missed slots are skipped
+instead of queued up.
+
+Snapshots go through ``WriteBehindQueue``: a bounded in-memory queue flushed
+to ``PortfolioDB`` in batches by its own thread. The snapshots of one run are
+queued (and batched) together, so the analytics see every exchange of a run at
+once. When the queue is full the
+producer waits a little (backpressure) and then spills to a local JSONL file;
+snapshots the database refuses are spilled too (only those: the rest of the
+batch is written). The spill file is replayed into
+the database before the next batch once it is reachable again, so snapshots
+reach it (and the analytics rollups) in time order.
+
+Meant to run in its own process (``services.run_server``) so snapshotting never
+competes with the API.
+"""
+import json
+import os
+import queue
+import random
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from itertools import groupby
+from typing import Any, Iterable, List, Optional, Tuple
+
+from database.portfolio_db import PortfolioDB
+from process.portfolio.analytics import PortfolioAnalytics
+from process.portfolio.portfolio import get_exchange_portfolio
+from settings import get_settings
+
+Snapshot = Tuple[str, Any, datetime]
+
+
+class WriteBehindQueue:
+    def __init__(self, db: PortfolioDB, maxsize: int = None, batch_size: int = None, flush_interval: float = 5.0,
+                 put_timeout: float = 1.0, spill_path: str = None, analytics: Optional[PortfolioAnalytics] = None):
+        # The SNAPSHOT_* settings by default
+        settings = get_settings()
+        maxsize = settings["SNAPSHOT_QUEUE_SIZE"] if maxsize is None else maxsize
+        self.db = db
+        self.analytics = analytics
+        self.batch_size = settings["SNAPSHOT_BATCH_SIZE"] if batch_size is None else batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.spill_path = settings["SNAPSHOT_SPILL_PATH"] if spill_path is None else spill_path
+        # Items are the snapshots of one run
+        self._queue: "queue.Queue[List[Snapshot]]" = queue.Queue(maxsize=maxsize)
+        self._spill_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="snapshot-writer", daemon=True)
+
+    def start(self) -> "WriteBehindQueue":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Flush what is queued and stop the writer."""
+        self._stop.set()
+        self._thread.join()
+
+    def put(self, snapshot: Snapshot) -> None:
+        self.put_run([snapshot])
+
+    def put_run(self, snapshots: List[Snapshot]) -> None:
+        """Queue the snapshots of one run, they always end up in the same batch."""
+        if not snapshots:
+            return
+        try:
+            self._queue.put(snapshots, timeout=self.put_timeout)
+        except queue.Full:
+            print("Snapshot queue full, spilling to disk")
+            self._spill(snapshots)
+
+    def _take_batch(self) -> List[Snapshot]:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.extend(self._queue.get(timeout=max(deadline - time.monotonic(), 0.01)))
+            except queue.Empty:
+                if batch or self._stop.is_set() or time.monotonic() >= deadline:
+                    break
+        return batch
+
+    def _run(self) -> None:
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._take_batch()
+            if not batch:
+                continue
+            # Older spilled snapshots go first, the batch waits on disk behind them if they still fail
+            if self._replay_spill():
+                self._write(batch)
+            else:
+                self._spill(batch)
+
+    def _write(self, batch: List[Snapshot]) -> bool:
+        written, failed, error = self.db.write_portfolio_data(batch)
+        if failed:
+            print(f"Cannot write {len(failed)} snapshots, spilling to disk: {error}")
+            self._spill(failed)
+        # Snapshots already stored (a replay after a partial write) were applied then
+        if written and self.analytics is not None:
+            try:
+                self.analytics.update_many(written)
+            except Exception as e:
+                print(f"Cannot update the portfolio analytics: {e}")
+        return not failed
+
+    def _spill(self, snapshots: List[Snapshot]) -> None:
+        folder = os.path.dirname(self.spill_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with self._spill_lock, open(self.spill_path, "a") as stream:
+            for exchange_name, portfolio, timestamp in snapshots:
+                stream.write(json.dumps({"exchange": exchange_name, "portfolio": portfolio,
+                                         "timestamp": timestamp.isoformat()}) + "\n")
+            stream.flush()
+            os.fsync(stream.fileno())
+
+    def _replay_spill(self) -> bool:
+        """Write the spilled snapshots back, True when nothing is left on disk.
+
+        A replay file left behind by a crash is replayed first, ahead of what
+        was spilled since.
+        """
+        replaying = self.spill_path + ".replay"
+        with self._spill_lock:
+            if os.path.exists(self.spill_path):
+                if os.path.exists(replaying):
+                    with open(self.spill_path, "r") as spilled, open(replaying, "a") as stream:
+                        shutil.copyfileobj(spilled, stream)
+                        stream.flush()
+                        os.fsync(stream.fileno())
+                    os.remove(self.spill_path)
+                else:
+                    os.replace(self.spill_path, replaying)
+            elif not os.path.exists(replaying):
+                return True
+        with open(replaying, "r") as stream:
+            snapshots = [(entry["exchange"], entry["portfolio"], datetime.fromisoformat(entry["timestamp"]))
+                         for entry in map(json.loads, stream)]
+        replayed = True
+        batches = list(self._batches(snapshots))
+        for i, batch in enumerate(batches):
+            if not self._write(batch):
+                # _write spilled what failed, the rest of the batches goes back to the spill file too
+                self._spill([snapshot for rest in batches[i + 1:] for snapshot in rest])
+                replayed = False
+                break
+        os.remove(replaying)
+        if replayed:
+            print(f"Replayed {len(snapshots)} spilled snapshots")
+        return replayed
+
+    def _batches(self, snapshots: Iterable[Snapshot]) -> Iterable[List[Snapshot]]:
+        # Batches of about batch_size snapshots, cut between runs (timestamps) only
+        batch = []
+        for _, run in groupby(snapshots, key=lambda snapshot: snapshot[2]):
+            batch.extend(run)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+class SnapshotScheduler:
+    def __init__(self, writer: WriteBehindQueue, exchanges: List[str] = None, interval: float = None,
+                 jitter: float = None):
+        # EXCHANGES and the SNAPSHOT_* settings by default
+        settings = get_settings()
+        self.writer = writer
+        self.exchanges = settings["EXCHANGES"] if exchanges is None else exchanges
+        self.interval = settings["SNAPSHOT_INTERVAL"] if interval is None else interval
+        self.jitter = settings["SNAPSHOT_JITTER"] if jitter is None else jitter
+        self._stop = threading.Event()
+
+    def snapshot(self) -> int:
+        """Snapshot every exchange once (read from the exchange, not the cache), returning how many were queued."""
+        timestamp = datetime.now(timezone.utc)
+        snapshots = []
+        for exchange in self.exchanges:
+            try:
+                snapshots.append((exchange, get_exchange_portfolio(exchange, cached=False), timestamp))
+            except Exception as e:
+                print(f"Cannot snapshot {exchange}: {e}")
+        self.writer.put_run(snapshots)
+        return len(snapshots)
+
+    def run(self, runs: Optional[int] = None) -> None:
+        """Snapshot on schedule until ``stop`` (or ``runs`` runs)."""
+        started = time.monotonic()
+        slot = 0
+        done = 0
+        while not self._stop.is_set() and (runs is None or done < runs):
+            due = started + slot * self.interval + random.uniform(0, self.jitter)
+            if self._stop.wait(max(due - time.monotonic(), 0)):
+                break
+            self.snapshot()
+            done += 1
+            # Skip the slots that went by while this run was still going
+            next_slot = int((time.monotonic() - started) // self.interval) + 1
+            if next_slot > slot + 1:
+                print(f"Snapshot overran, skipping {next_slot - slot - 1} run(s)")
+            slot = next_slot
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def run_scheduler() -> None:
+    db = PortfolioDB(get_settings()["SNAPSHOT_COLLECTION"])
+    writer = WriteBehindQueue(db, analytics=PortfolioAnalytics()).start()
+    scheduler = SnapshotScheduler(writer)
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.stop()
+
+
+if __name__ == "__main__":
+    run_scheduler()
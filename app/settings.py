@@ -1,23 +1,97 @@
+"""
+Settings read from ``config.yaml`` (next to this file, or the path in the
+``BOT_CONFIG`` environment variable).
+
+The file is only read the first time a setting is used, then cached:
+``from settings import API_HOST`` and ``get_settings()["API_HOST"]`` are
+equivalent.
+"""
+import os
+from functools import lru_cache
+from typing import Any, Dict
+
 import yaml
 
-with open("config.yaml", "r") as stream:
+CONFIG_PATH = os.environ.get("BOT_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yaml"))
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Dict[str, Any]:
+    with open(CONFIG_PATH, "r") as stream:
+        try:
+            config = yaml.safe_load(stream) or {}
+        except yaml.YAMLError as exc:
+            print(exc)
+            raise
+
+    settings = {
+        "API_KEY_BINANCE": config["API_KEY_BINANCE"],
+        "API_SECRET_KEY_BINANCE": config["API_SECRET_KEY_BINANCE"],
+        "API_KEY_KRAKEN": config["API_KEY_KRAKEN"],
+        "API_SECRET_KEY_KRAKEN": config["API_SECRET_KEY_KRAKEN"],
+        "API_KEY_COINBASE": config["API_KEY_COINBASE"],
+        "API_SECRET_KEY_COINBASE": config["API_SECRET_KEY_COINBASE"],
+        "API_PASSPHRASE_COINBASE": config["API_PASSPHRASE_COINBASE"],
+
+        # "mongomock://" keeps the database in memory
+        "MONGODB_URI": config.get("MONGODB_URI") or "mongodb://localhost:27017",
+        "MONGODB_DATABASE": config.get("MONGODB_DATABASE", "bot_trading"),
+
+        "EXCHANGES": config.get("EXCHANGES", config.get("EXCHANGE", ["coinbase"])),
+        "API_HOST": config["API_HOST"],
+        "API_PORT": config["API_PORT"],
+
+        # Seconds cached exchange answers are fresh, then how long they may still be served while refreshed
+        "CACHE_TTL": {"account": 30, "spot": 5, **config.get("CACHE_TTL", {})},
+        "CACHE_STALE_TTL": {"account": 300, "spot": 60, **config.get("CACHE_STALE_TTL", {})},
+        "CACHE_MAXSIZE": config.get("CACHE_MAXSIZE", 1024),
+
+        # Async exchange HTTP pools: seconds before a call (or a connection attempt) is abandoned, pool sizes
+        "HTTP_TIMEOUT": config.get("HTTP_TIMEOUT", 10),
+        "HTTP_CONNECT_TIMEOUT": config.get("HTTP_CONNECT_TIMEOUT", 5),
+        "HTTP_MAX_CONNECTIONS": config.get("HTTP_MAX_CONNECTIONS", 100),
+        "HTTP_MAX_KEEPALIVE": config.get("HTTP_MAX_KEEPALIVE", 20),
+
+        # Market data hub: "live" streams from the exchanges, "local" a random walk for testing; frames per second
+        "MARKET_FEED": config.get("MARKET_FEED", "live"),
+        "WS_FPS": config.get("WS_FPS", 2),
+
+        # Background portfolio snapshots (services/save_data.py): seconds between runs, random extra delay,
+        # write-behind queue size, snapshots per database write and where they go when the database is down
+        "SNAPSHOT_INTERVAL": config.get("SNAPSHOT_INTERVAL", 300),
+        "SNAPSHOT_JITTER": config.get("SNAPSHOT_JITTER", 10),
+        "SNAPSHOT_QUEUE_SIZE": config.get("SNAPSHOT_QUEUE_SIZE", 1000),
+        "SNAPSHOT_BATCH_SIZE": config.get("SNAPSHOT_BATCH_SIZE", 100),
+        "SNAPSHOT_COLLECTION": config.get("SNAPSHOT_COLLECTION", "histo-portfolio"),
+        "SNAPSHOT_SPILL_PATH": config.get("SNAPSHOT_SPILL_PATH", "./services/snapshot_spill.jsonl"),
+
+        # Request profiling (common/metrics.py), off without a threshold: share of the requests profiled,
+        # seconds above which their profile is kept and where
+        "PROFILE_THRESHOLD": config.get("PROFILE_THRESHOLD"),
+        "PROFILE_RATE": config.get("PROFILE_RATE", 0.05),
+        "PROFILE_DIR": config.get("PROFILE_DIR", "./api/profiles"),
+
+        # Replay exchange (common/exchange/replay): seed of the synthetic market, JSONL file of recorded answers
+        # (and the exchange to record them from), seconds of latency plus random jitter per call, share of calls
+        # failing, starting balances
+        "REPLAY_SEED": config.get("REPLAY_SEED", 0),
+        "REPLAY_RECORDING": config.get("REPLAY_RECORDING"),
+        "REPLAY_RECORD_FROM": config.get("REPLAY_RECORD_FROM"),
+        "REPLAY_LATENCY": config.get("REPLAY_LATENCY", 0.05),
+        "REPLAY_LATENCY_JITTER": config.get("REPLAY_LATENCY_JITTER", 0.05),
+        "REPLAY_ERROR_RATE": config.get("REPLAY_ERROR_RATE", 0.0),
+        "REPLAY_BALANCES": config.get("REPLAY_BALANCES", {"USD": 100_000.0, "BTC": 1.5, "ETH": 20.0, "SOL": 300.0,
+                                                          "ADA": 10_000.0, "DOT": 1_000.0, "LINK": 500.0}),
+    }
+    return settings
+
+
+def __getattr__(name: str) -> Any:
+    # Module attributes are resolved from the cached settings on first use, the import machinery's
+    # lookups (``__path__``...) don't read the file
+    if name.startswith("__"):
+        raise AttributeError(f"module 'settings' has no attribute '{name}'")
     try:
-        config = yaml.safe_load(stream)
-    except yaml.YAMLError as exc:
-        print(exc)
-
-API_KEY_BINANCE = config["API_KEY_BINANCE"]
-API_SECRET_KEY_BINANCE = config["API_SECRET_KEY_BINANCE"]
-API_KEY_KRAKEN = config["API_KEY_KRAKEN"]
-API_SECRET_KEY_KRAKEN = config["API_SECRET_KEY_KRAKEN"]
-API_KEY_COINBASE = config["API_KEY_COINBASE"]
-API_SECRET_KEY_COINBASE = config["API_SECRET_KEY_COINBASE"]
-API_PASSPHRASE_COINBASE = config["API_PASSPHRASE_COINBASE"]
-
-# MONGODB_HOST = config["MONGODB_HOST"]
-# MONGODB_PORT = config["MONGODB_PORT"]
-# MONGODB_URI = config["MONGODB_URI"].format(MONGODB_HOST, MONGODB_PORT)
-
-# EXCHANGES = config["EXCHANGES"]
-API_HOST = config["API_HOST"]
-API_PORT = config["API_PORT"]
\ No newline at end of file
+        return get_settings()[name]
+    except KeyError:
+        raise AttributeError(f"module 'settings' has no attribute '{name}'") from None
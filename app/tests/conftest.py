@@ -0,0 +1,7 @@
+import os
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The application imports are relative to app/, and the settings come from the offline test config
+sys.path.insert(0, APP_DIR)
+os.environ.setdefault("BOT_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yaml"))
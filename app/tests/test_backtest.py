@@ -0,0 +1,36 @@
+"""Backtest: fills on the next open, empty data and parameter validation."""
+import numpy as np
+import pytest
+
+from process.backtest.backtest_factory import backtest_factory
+
+
+def candles(closes):
+    closes = np.asarray(closes, dtype=np.float64)
+    return {"timestamp": np.arange(len(closes)) * 60, "open_price": closes, "close_price": closes}
+
+
+def test_signal_fills_on_the_next_bar():
+    backtest = backtest_factory("momentum", candles([100, 100, 110, 121]), fee=0.0, slippage=0.0)
+    stats = backtest.run(np.array([1.0, 1.0, 1.0, 1.0]))
+    assert backtest.positions.tolist() == [0.0, 1.0, 1.0, 1.0]
+    assert stats["final_equity"] == pytest.approx(100_000 * 1.21)
+    assert stats["trades"] == 1
+
+
+@pytest.mark.parametrize("allow_short", [False, True])
+def test_empty_data_is_flat(allow_short):
+    stats = backtest_factory("momentum", candles([]), allow_short=allow_short).run()
+    assert stats == {"final_equity": 100_000.0, "total_return": 0.0, "sharpe": 0.0, "max_drawdown": 0.0,
+                     "trades": 0, "win_rate": 0.0, "exposure": 0.0}
+
+
+def test_single_bar():
+    stats = backtest_factory("momentum", candles([100]), lookback=1).run()
+    assert stats["final_equity"] == 100_000.0 and stats["trades"] == 0
+
+
+@pytest.mark.parametrize("lookback", [0, -3])
+def test_lookback_below_one_bar(lookback):
+    with pytest.raises(ValueError):
+        backtest_factory("momentum", candles([100, 101, 102]), lookback=lookback)
@@ -0,0 +1,51 @@
+"""Downsampling: requested sizes, kept endpoints, tiny and negative point counts."""
+import numpy as np
+import pytest
+
+from process.comparative.downsample import downsample, minmax_candles
+
+
+@pytest.fixture
+def series():
+    x = np.arange(1000, dtype=np.int64) * 60_000
+    y = np.sin(np.arange(1000) / 25.0) * 100 + np.arange(1000)
+    return x, y
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_size_and_endpoints(series, method):
+    x, y = downsample(*series, 100, method)
+    assert len(x) <= 100
+    assert np.all(np.diff(x) > 0)
+    if method == "lttb":
+        assert len(x) == 100 and x[0] == series[0][0] and x[-1] == series[0][-1]
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_more_points_than_the_series_returns_it(series, method):
+    x, y = downsample(*series, 5000, method)
+    assert np.array_equal(x, series[0]) and np.array_equal(y, series[1])
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+@pytest.mark.parametrize("points", [-5, 0, 1])
+def test_tiny_point_counts_keep_first_and_last(series, method, points):
+    x, y = downsample(*series, points, method)
+    assert list(x) == [series[0][0], series[0][-1]]
+    assert list(y) == [series[1][0], series[1][-1]]
+
+
+def test_unknown_method(series):
+    with pytest.raises(ValueError):
+        downsample(*series, 100, "mean")
+
+
+@pytest.mark.parametrize("points", [-1, 0, 1])
+def test_candles_merge_into_at_least_one(points):
+    candles = {"timestamp": np.arange(10), "open_price": np.arange(10.0), "high_price": np.arange(10.0) + 1,
+               "low_price": np.arange(10.0) - 1, "close_price": np.arange(10.0) + 0.5, "volume": np.ones(10)}
+    merged = minmax_candles(candles, points)
+    assert merged["timestamp"].tolist() == [0]
+    assert merged["open_price"].tolist() == [0.0] and merged["close_price"].tolist() == [9.5]
+    assert merged["high_price"].tolist() == [10.0] and merged["low_price"].tolist() == [-1.0]
+    assert merged["volume"].tolist() == [10.0]
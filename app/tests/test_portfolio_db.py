@@ -0,0 +1,130 @@
+"""PortfolioDB on mongomock: batched writes, the (exchange, timestamp) index, projections and keyset paging."""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from database.portfolio_db import PortfolioDB
+
+START = datetime(2026, 1, 1)
+
+
+def portfolio(value):
+    return [{"asset": "BTC", "quantity": value / 50_000, "amount_usd": value}]
+
+
+@pytest.fixture
+def db():
+    db = PortfolioDB(f"test-portfolio-{uuid.uuid4().hex}")
+    yield db
+    db.collection.drop()
+
+
+def snapshots(exchange, count, start=START):
+    return [(exchange, portfolio(1000 + i), start + timedelta(minutes=i)) for i in range(count)]
+
+
+def test_insert_many_in_batches(db, monkeypatch):
+    monkeypatch.setattr(PortfolioDB, "BATCH_SIZE", 7)
+    calls = []
+    collection = type(db.collection)
+    bulk_write = collection.bulk_write
+
+    def counting_bulk_write(self, requests, **kwargs):
+        calls.append(len(requests))
+        return bulk_write(self, requests, **kwargs)
+
+    monkeypatch.setattr(collection, "bulk_write", counting_bulk_write)
+    assert db.insert_many_portfolio_data(snapshots("coinbase", 20)) == 20
+    assert calls == [7, 7, 6]
+    assert db.collection.count_documents({"exchange": "coinbase"}) == 20
+
+
+def test_insert_without_timestamp(db):
+    db.insert_portfolio_data("kraken", portfolio(10))
+    document = db.collection.find_one({"exchange": "kraken"})
+    assert isinstance(document["timestamp"], datetime)
+    assert document["portfolio"] == portfolio(10)
+
+
+def test_exchange_timestamp_index(db):
+    indexes = {tuple(index["key"]): index for index in db.collection.index_information().values()}
+    assert indexes[(("exchange", 1), ("timestamp", 1))].get("unique")
+
+
+def test_rewrite_skips_stored_snapshots(db):
+    first = snapshots("coinbase", 5)
+    db.insert_many_portfolio_data(first[:3])
+    written, failed, error = db.write_portfolio_data(first)
+    assert written == first[3:]
+    assert failed == [] and error is None
+    assert db.collection.count_documents({"exchange": "coinbase"}) == 5
+
+
+def test_failed_batches_are_returned(db, monkeypatch):
+    monkeypatch.setattr(PortfolioDB, "BATCH_SIZE", 4)
+    collection = type(db.collection)
+    bulk_write = collection.bulk_write
+    calls = []
+
+    def failing_from_second_batch(self, requests, **kwargs):
+        calls.append(len(requests))
+        if len(calls) >= 2:
+            raise ConnectionError("down")
+        return bulk_write(self, requests, **kwargs)
+
+    monkeypatch.setattr(collection, "bulk_write", failing_from_second_batch)
+    batch = snapshots("coinbase", 10)
+    written, failed, error = db.write_portfolio_data(batch)
+    assert written == batch[:4]
+    assert failed == batch[4:]
+    assert isinstance(error, ConnectionError)
+    with pytest.raises(ConnectionError):
+        db.insert_many_portfolio_data(batch[4:], raise_errors=True)
+
+
+def test_iter_in_time_order_and_range(db):
+    db.insert_many_portfolio_data(list(reversed(snapshots("coinbase", 10))) + snapshots("kraken", 5))
+    documents = list(db.iter_portfolio_data("coinbase", START + timedelta(minutes=2), START + timedelta(minutes=5)))
+    assert [d["timestamp"] for d in documents] == [START + timedelta(minutes=i) for i in range(2, 6)]
+    assert {d["exchange"] for d in documents} == {"coinbase"}
+
+
+def test_projection(db):
+    db.insert_many_portfolio_data(snapshots("coinbase", 3))
+    full = next(db.iter_portfolio_data("coinbase"))
+    assert set(full) == {"exchange", "timestamp", "portfolio"}
+    only_timestamps = list(db.iter_portfolio_data("coinbase", fields=["exchange"]))
+    assert all(set(d) == {"exchange", "timestamp"} for d in only_timestamps)
+
+
+def test_keyset_paging(db):
+    db.insert_many_portfolio_data(snapshots("coinbase", 25) + snapshots("kraken", 25))
+    pages, after = [], None
+    while True:
+        page, after = db.page_portfolio_data("coinbase", after=after, limit=10)
+        pages.append(page)
+        if after is None:
+            break
+    assert [len(page) for page in pages] == [10, 10, 5]
+    timestamps = [d["timestamp"] for page in pages for d in page]
+    assert timestamps == [START + timedelta(minutes=i) for i in range(25)]
+
+
+def test_keyset_paging_within_range(db):
+    db.insert_many_portfolio_data(snapshots("coinbase", 25))
+    end = START + timedelta(minutes=19)
+    page, after = db.page_portfolio_data("coinbase", START + timedelta(minutes=5), end, limit=10)
+    assert page[0]["timestamp"] == START + timedelta(minutes=5)
+    assert after == START + timedelta(minutes=14)
+    page, after = db.page_portfolio_data("coinbase", START + timedelta(minutes=5), end, after=after, limit=10)
+    assert [d["timestamp"] for d in page] == [START + timedelta(minutes=i) for i in range(15, 20)]
+    assert after is None
+
+
+def test_query_reports_errors_as_none(db, monkeypatch):
+    def failing(*args, **kwargs):
+        raise RuntimeError("down")
+
+    monkeypatch.setattr(db, "iter_portfolio_data", failing)
+    assert db.query_portfolio_data("coinbase") is None
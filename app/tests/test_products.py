@@ -0,0 +1,157 @@
+"""Product rounding and validation, ProductIndex lookups, prepare_order."""
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from common.exchange.simulated.simulated import SimulatedExchange
+from common.exchange.utils.products import Product, ProductIndex, format_decimal, round_step, to_decimal
+from process.execution.executor import OrderExecutor, OrderRejected, prepare_order
+
+BTC = Product("BTC-USD", "BTC", "USD", base_increment="0.00000001", quote_increment="0.01", min_size="0.0001",
+              max_size="100", min_notional="10", aliases=("XBTUSD",))
+
+
+class Listed:
+    """Exchange listing ``products``, the part of it prepare_order uses."""
+
+    def __init__(self, *products):
+        self.name = "test"
+        self.loads = 0
+        self.listed = list(products)
+        self._index = ProductIndex(self._load, refresh_interval=0)
+
+    def _load(self):
+        self.loads += 1
+        return list(self.listed)
+
+    def products(self):
+        return self._index
+
+
+def test_to_decimal_uses_the_shortest_float_repr():
+    assert to_decimal(0.1 + 0.2) == Decimal("0.30000000000000004")
+    assert to_decimal(0.3) == Decimal("0.3")
+    assert to_decimal("1e-7") == Decimal("1E-7")
+
+
+@pytest.mark.parametrize("value, text", [(Decimal("1E-7"), "0.0000001"), (Decimal("12.3400"), "12.34"),
+                                         (Decimal("-0"), "0"), (100, "100")])
+def test_format_decimal(value, text):
+    assert format_decimal(value) == text
+
+
+def test_round_step():
+    assert round_step(Decimal("1.239"), Decimal("0.01")) == Decimal("1.23")
+    assert round_step(Decimal("1.231"), Decimal("0.01"), "ROUND_UP") == Decimal("1.24")
+    assert round_step(Decimal("1.231"), Decimal(0)) == Decimal("1.231")
+
+
+def test_round_quantity_never_exceeds_the_order():
+    assert BTC.round_quantity(0.123456789) == Decimal("0.12345678")
+    assert BTC.round_quantity("0.1") == Decimal("0.1")
+
+
+def test_round_price_away_from_the_market():
+    assert BTC.round_price("30000.019", buy=True) == Decimal("30000.01")
+    assert BTC.round_price("30000.011", buy=False) == Decimal("30000.02")
+
+
+@pytest.mark.parametrize("quantity, price, error", [
+    ("0", None, "rounds to 0"),
+    ("0.00001", None, "below the minimum size"),
+    ("101", None, "above the maximum size"),
+    ("0.001", "0", "must be positive"),
+    ("0.001", "5000", "below the minimum"),
+    ("0.001", None, None),
+    ("0.001", "30000", None),
+])
+def test_validate(quantity, price, error):
+    result = BTC.validate(Decimal(quantity), Decimal(price) if price is not None else None)
+    if error is None:
+        assert result is None
+    else:
+        assert error in result
+
+
+def test_unbounded_max_size():
+    assert Product("ETH-USD", "ETH", "USD", "0.0001", "0.01", max_size="0").max_size is None
+
+
+def test_index_loads_once_and_resolves_aliases():
+    exchange = Listed(BTC)
+    index = exchange.products()
+    assert index.get("BTC-USD") is BTC
+    assert index.get("XBTUSD") is BTC
+    assert index.symbols() == ["BTC-USD"]
+    assert exchange.loads == 1
+
+
+def test_index_reloads_for_a_new_listing():
+    exchange = Listed(BTC)
+    index = exchange.products()
+    index.get("BTC-USD")
+    exchange.listed.append(Product("SOL-USD", "SOL", "USD", "0.01", "0.001"))
+    assert index.get("SOL-USD").symbol == "SOL-USD"
+    assert exchange.loads == 2
+    assert index.get("DOGE-USD") is None
+
+
+def test_prepare_order_rounds():
+    order = prepare_order(Listed(BTC), 0.123456789, "XBTUSD", True, "limit", 30000.019)
+    assert order == {"quantity": Decimal("0.12345678"), "pair": "BTC-USD", "buy": True, "order_type": "limit",
+                     "price": Decimal("30000.01")}
+    assert prepare_order(Listed(BTC), "0.5", "BTC-USD", False)["price"] is None
+
+
+@pytest.mark.parametrize("args, error", [
+    ((1, "BTC-USD", True, "stop"), "Unsupported order type"),
+    ((1, "BTC-USD", True, "limit"), "require a price"),
+    ((1, "ETH-USD", True), "not traded"),
+    ((0.000000001, "BTC-USD", True), "rounds to 0"),
+    ((0.0002, "BTC-USD", True, "limit", 30000), "below the minimum"),
+])
+def test_prepare_order_rejects(args, error):
+    with pytest.raises(OrderRejected, match=error):
+        prepare_order(Listed(BTC), *args)
+
+
+def test_executor_rejects_without_sending():
+    exchange = Listed(BTC)
+    exchange.execute_order = lambda *args, **kwargs: pytest.fail("a rejected order reached the exchange")
+    executor = OrderExecutor(exchange)
+    try:
+        ack = executor.execute(0.000000001, "BTC-USD", True, client_order_id="order-1")
+    finally:
+        executor.close()
+    assert ack["client_order_id"] == "order-1"
+    assert "rounds to 0" in ack["error"]
+
+
+def test_executor_sends_the_rounded_order_once():
+    sent = []
+    exchange = Listed(BTC)
+    exchange.execute_order = lambda quantity, pair, buy, order_type, price=None, client_order_id=None: \
+        sent.append((quantity, pair, price)) or {"order_id": "1", "client_order_id": client_order_id}
+    executor = OrderExecutor(exchange)
+    try:
+        first = executor.submit(0.123456789, "BTC-USD", True, client_order_id="order-1")
+        again = executor.submit(0.123456789, "BTC-USD", True, client_order_id="order-1")
+        assert again is first
+        assert first.result()["order_id"] == "1"
+    finally:
+        executor.close()
+    assert sent == [(Decimal("0.12345678"), "BTC-USD", None)]
+
+
+def test_simulated_exchange_rules():
+    candles = {name: np.array([2.5, 2.6]) for name in ("open_price", "high_price", "low_price", "close_price",
+                                                       "volume")}
+    candles["timestamp"] = np.array([0, 60])
+    exchange = SimulatedExchange()
+    exchange.load("ADA-USD", candles)
+    exchange.load("BTC-USD", candles, product=BTC)
+    assert exchange.products().get("ADA-USD").quote_increment == Decimal("0.0001")
+    assert exchange.products().get("BTC-USD") is BTC
+    with pytest.raises(OrderRejected, match="rounds to 0"):
+        prepare_order(exchange, 0.000000001, "ADA-USD", True)
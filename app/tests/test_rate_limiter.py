@@ -0,0 +1,165 @@
+"""RateLimiter: priority lane, rate limit pauses, retries of idempotent calls only."""
+import asyncio
+import time
+
+import pytest
+
+from common.exchange.utils.rate_limiter import (BULK, HIGH, NORMAL, LimitedClient, RateLimiter, RetryableError,
+                                                classify, request_priority)
+
+
+class Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = Response(status_code, headers)
+
+
+def limiter(**kwargs):
+    return RateLimiter("test", **{"rate": 1000, "capacity": 10, "base_delay": 0.001, "max_delay": 0.01, **kwargs})
+
+
+def failing(errors, result="ok"):
+    """Function raising ``errors`` one call after the other, then returning ``result``."""
+    calls = []
+
+    def fn():
+        calls.append(time.monotonic())
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    return fn, calls
+
+
+def test_lower_priorities_wait_for_higher_ones():
+    rate_limiter = limiter()
+    with rate_limiter._queued(HIGH):
+        assert rate_limiter._try_acquire(None, NORMAL) == RateLimiter.PRIORITY_POLL
+        assert rate_limiter._try_acquire(None, BULK) == RateLimiter.PRIORITY_POLL
+        assert rate_limiter._try_acquire(None, HIGH) == 0
+    assert rate_limiter._try_acquire(None, NORMAL) == 0
+
+
+def test_bulk_calls_leave_part_of_the_bucket():
+    rate_limiter = limiter(rate=0.001, capacity=10, bulk_reserve=0.2)
+    for _ in range(8):
+        assert rate_limiter._try_acquire(None, NORMAL) == 0
+    assert rate_limiter._try_acquire(None, BULK) > 0
+    assert rate_limiter._try_acquire(None, NORMAL) == 0
+
+
+def test_request_priority_applies_to_the_block():
+    rate_limiter = limiter()
+    seen = []
+    rate_limiter._try_acquire = lambda endpoint, priority: seen.append(priority) or 0.0
+    with request_priority(BULK):
+        rate_limiter.acquire()
+    rate_limiter.acquire()
+    assert seen == [BULK, NORMAL]
+
+
+def test_endpoint_weights_and_buckets():
+    rate_limiter = limiter(rate=0.001, capacity=10, weights={"account": 10}, endpoints={"order": (0.001, 1)})
+    assert rate_limiter._try_acquire("order", NORMAL) == 0
+    assert rate_limiter._try_acquire("order", NORMAL) > 0
+    assert rate_limiter._try_acquire("account", NORMAL) > 0
+
+
+def test_rate_limit_pauses_for_retry_after():
+    rate_limiter = limiter()
+    fn, calls = failing([HTTPError(429, {"Retry-After": "0.1"})])
+    assert rate_limiter.call(fn) == "ok"
+    assert calls[1] - calls[0] >= 0.09
+    # The pause holds the other calls to the exchange too
+    rate_limiter.pause(0.1)
+    started = time.monotonic()
+    rate_limiter.acquire()
+    assert time.monotonic() - started >= 0.09
+
+
+def test_transient_errors_are_retried():
+    fn, calls = failing([ConnectionError("reset"), HTTPError(503)])
+    assert limiter().call(fn) == "ok"
+    assert len(calls) == 3
+
+
+def test_retries_give_up():
+    fn, calls = failing([TimeoutError("slow")] * 10)
+    with pytest.raises(TimeoutError):
+        limiter(max_retries=2).call(fn)
+    assert len(calls) == 3
+
+
+def test_fatal_errors_are_not_retried():
+    fn, calls = failing([ValueError("bad symbol")])
+    with pytest.raises(ValueError):
+        limiter().call(fn)
+    assert len(calls) == 1
+
+
+def test_non_idempotent_calls_are_not_retried_after_a_timeout():
+    fn, calls = failing([TimeoutError("slow")])
+    with pytest.raises(TimeoutError):
+        limiter().call(fn, idempotent=False)
+    assert len(calls) == 1
+
+
+def test_non_idempotent_calls_are_retried_on_rate_limits():
+    fn, calls = failing([RetryableError("too many requests", rate_limited=True, retry_after=0.01)])
+    assert limiter().call(fn, idempotent=False) == "ok"
+    assert len(calls) == 2
+
+
+def test_limited_client_marks_unsafe_endpoints():
+    class Client:
+        def __init__(self):
+            self.calls = 0
+
+        def query(self, method):
+            self.calls += 1
+            raise TimeoutError("slow")
+
+    client = Client()
+    limited = LimitedClient(client, limiter(), endpoint=lambda name, args: args[0], unsafe={"AddOrder"})
+    with pytest.raises(TimeoutError):
+        limited.query("AddOrder")
+    assert client.calls == 1
+    with pytest.raises(TimeoutError):
+        limited.query("Balance")
+    assert client.calls == 1 + 1 + 5
+
+
+@pytest.mark.parametrize("error, kind", [
+    (HTTPError(429), "rate_limit"),
+    (HTTPError(418), "rate_limit"),
+    (Exception("Too Many Requests"), "rate_limit"),
+    (HTTPError(502), "retry"),
+    (ConnectionError(), "retry"),
+    (HTTPError(400), None),
+    (KeyError("x"), None),
+])
+def test_classify(error, kind):
+    assert classify(error)[0] == kind
+
+
+def test_classify_reads_retry_after():
+    assert classify(HTTPError(429, {"Retry-After": "3"})) == ("rate_limit", 3.0)
+
+
+def test_async_call_retries():
+    attempts = []
+
+    async def fn():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("reset")
+        return "ok"
+
+    assert asyncio.run(limiter().acall(fn)) == "ok"
+    assert len(attempts) == 3
@@ -0,0 +1,86 @@
+"""Replay order book: funds held by open orders, idempotent client order ids."""
+import threading
+
+import pytest
+
+from common.exchange.replay.replay import Replay
+
+
+class Market:
+    """Market with a price set by the test."""
+
+    def __init__(self, price):
+        self.spot = price
+
+    def price(self, pair, timestamp):
+        return self.spot
+
+
+@pytest.fixture
+def replay():
+    Replay.reset("test-replay")
+    exchange = Replay("test-replay", latency=0.0, latency_jitter=0.0, error_rate=0.0, fee=0.0, slippage=0.0,
+                      balances={"USD": 1000.0, "BTC": 1.0}, clock=lambda: 1_700_000_000)
+    exchange.market = Market(100.0)
+    yield exchange
+    Replay.reset("test-replay")
+
+
+def balances(exchange):
+    return exchange.get_account_details(all_details=True)["all"]
+
+
+def test_open_order_holds_its_funds(replay):
+    order = replay.execute_order(8, "BTC-USD", True, "limit", price=90.0)
+    assert order["status"] == "open"
+    assert replay.book.held == {"USD": 720.0}
+    # Only the 280 USD not held can be spent
+    assert "error" in replay.execute_order(3, "BTC-USD", True, "limit", price=95.0)
+    assert "error" in replay.execute_order(3, "BTC-USD", True)
+
+
+def test_matched_order_fills_from_its_hold(replay):
+    order = replay.execute_order(8, "BTC-USD", True, "limit", price=90.0, client_order_id="a")
+    replay.execute_order(2, "BTC-USD", True)
+    replay.market.spot = 85.0
+    assert balances(replay) == {"USD": 80.0, "BTC": 11.0}
+    assert replay.book.held == {}
+    assert [fill["order_id"] for fill in replay.book.fills][-1] == order["order_id"]
+    assert replay.execute_order(8, "BTC-USD", True, "limit", price=90.0, client_order_id="a")["status"] == "filled"
+
+
+def test_unfillable_match_is_recorded_as_rejected(replay):
+    order = replay.execute_order(8, "BTC-USD", True, "limit", price=90.0, client_order_id="a")
+    # Funds gone behind the hold's back: the match can't fill
+    replay.book.balances["USD"] = 100.0
+    replay.market.spot = 85.0
+    balances(replay)
+    assert replay.book.open_orders == {}
+    assert [rejected["order_id"] for rejected in replay.book.rejected] == [order["order_id"]]
+    known = replay.execute_order(8, "BTC-USD", True, "limit", price=90.0, client_order_id="a")
+    assert known["status"] == "rejected" and "Insufficient USD" in known["error"]
+
+
+def test_cancel_releases_the_hold(replay):
+    order = replay.execute_order(0.5, "BTC-USD", False, "limit", price=120.0)
+    assert replay.book.held == {"BTC": 0.5}
+    assert replay.cancel_order(order["order_id"])["status"] == "cancelled"
+    assert replay.book.held == {}
+    assert replay.execute_order(1, "BTC-USD", False)["status"] == "filled"
+
+
+def test_concurrent_duplicates_place_one_order(replay):
+    start = threading.Barrier(8)
+    results = []
+
+    def submit():
+        start.wait()
+        results.append(replay.execute_order(1, "BTC-USD", True, "limit", price=90.0, client_order_id="same"))
+
+    threads = [threading.Thread(target=submit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(replay.book.open_orders) == 1
+    assert {result["order_id"] for result in results} == set(replay.book.open_orders)
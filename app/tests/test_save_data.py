@@ -0,0 +1,71 @@
+"""WriteBehindQueue spill and replay, on mongomock."""
+import json
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from database.portfolio_db import PortfolioDB
+from services.save_data import WriteBehindQueue
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def snapshots(count, start=START):
+    return [(exchange, [{"asset": "USD", "quantity": 1.0, "amount_usd": 1.0}], start + timedelta(minutes=i))
+            for i in range(count) for exchange in ("coinbase", "kraken")]
+
+
+@pytest.fixture
+def db():
+    db = PortfolioDB(f"test-snapshots-{uuid.uuid4().hex}")
+    yield db
+    db.collection.drop()
+
+
+@pytest.fixture
+def writer(db, tmp_path):
+    return WriteBehindQueue(db, batch_size=4, spill_path=str(tmp_path / "spill.jsonl"))
+
+
+def write_lines(path, items):
+    with open(path, "a") as stream:
+        for exchange, portfolio, timestamp in items:
+            stream.write(json.dumps({"exchange": exchange, "portfolio": portfolio,
+                                     "timestamp": timestamp.isoformat()}) + "\n")
+
+
+def test_replay_spill(db, writer):
+    writer._spill(snapshots(3))
+    assert writer._replay_spill()
+    assert not os.path.exists(writer.spill_path)
+    assert db.collection.count_documents({}) == 6
+
+
+def test_replay_left_by_a_crash_is_not_lost(db, writer):
+    # The process died while replaying: the .replay file is still there, and more was spilled since
+    older, newer = snapshots(2), snapshots(2, START + timedelta(hours=1))
+    write_lines(writer.spill_path + ".replay", older)
+    writer._spill(newer)
+    assert writer._replay_spill()
+    assert not os.path.exists(writer.spill_path)
+    assert not os.path.exists(writer.spill_path + ".replay")
+    stored = sorted((d["exchange"], d["timestamp"]) for d in db.collection.find())
+    expected = sorted((exchange, timestamp.replace(tzinfo=None)) for exchange, _, timestamp in older + newer)
+    assert [(e, t.replace(tzinfo=None)) for e, t in stored] == expected
+
+
+def test_replay_left_by_a_crash_without_new_spill(db, writer):
+    write_lines(writer.spill_path + ".replay", snapshots(2))
+    assert writer._replay_spill()
+    assert db.collection.count_documents({}) == 4
+
+
+def test_failed_snapshots_stay_spilled(db, writer, monkeypatch):
+    monkeypatch.setattr(db, "write_portfolio_data", lambda batch: ([], list(batch), ConnectionError("down")))
+    writer._spill(snapshots(3))
+    assert not writer._replay_spill()
+    with open(writer.spill_path) as stream:
+        assert len(stream.readlines()) == 6
+    assert not os.path.exists(writer.spill_path + ".replay")
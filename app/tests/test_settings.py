@@ -0,0 +1,26 @@
+"""Settings: read on first use, never by importing the application."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import APP_DIR
+
+
+@pytest.mark.parametrize("module", ["api.server", "services.save_data", "database.database",
+                                    "common.exchange.replay.replay"])
+def test_import_reads_no_settings(module, tmp_path):
+    # A missing config file only fails when a setting is used
+    env = {**os.environ, "BOT_CONFIG": str(tmp_path / "missing.yaml")}
+    result = subprocess.run([sys.executable, "-c", f"import {module}"], cwd=APP_DIR, env=env,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def test_settings_as_attributes():
+    import settings
+
+    assert settings.MONGODB_URI == settings.get_settings()["MONGODB_URI"]
+    with pytest.raises(AttributeError):
+        settings.NOT_A_SETTING
@@ -0,0 +1,166 @@
+"""CandleStore: appends, merges, reads and rollups."""
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from process.backtest.store import CANDLE_COLUMNS, CandleStore, aggregate_candles, is_partition_name, to_epoch
+
+PARTITION = ("fixture", "BTC-USD", "one_minute")
+
+
+def candles(start, count, seconds=60, close=None):
+    timestamps = start + seconds * np.arange(count, dtype=np.int64)
+    closes = np.arange(count, dtype=np.float64) + 100 if close is None else np.full(count, float(close))
+    return {"timestamp": timestamps, "open_price": closes - 0.5, "high_price": closes + 1,
+            "low_price": closes - 1, "close_price": closes, "volume": np.ones(count)}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CandleStore(str(tmp_path))
+
+
+def test_append_and_read(store):
+    assert store.append(*PARTITION, candles(0, 10)) == 10
+    assert store.append(*PARTITION, candles(600, 5)) == 5
+    data = store.read(*PARTITION)
+    assert data["timestamp"].tolist() == list(range(0, 900, 60))
+    assert store.count(*PARTITION) == 15
+    assert (store.first_timestamp(*PARTITION), store.last_timestamp(*PARTITION)) == (0, 840)
+
+
+def test_read_range_and_columns(store):
+    store.append(*PARTITION, candles(0, 10))
+    data = store.read(*PARTITION, start=120, end=300, columns=["close_price"])
+    assert set(data) == {"timestamp", "close_price"}
+    assert data["timestamp"].tolist() == [120, 180, 240]
+    assert data["close_price"].tolist() == [102, 103, 104]
+
+
+def test_read_empty_partition(store):
+    data = store.read(*PARTITION)
+    assert len(data["timestamp"]) == 0
+    assert set(data) == {"timestamp", *CANDLE_COLUMNS}
+
+
+def test_last_candle_is_refreshed(store):
+    store.append(*PARTITION, candles(0, 3))
+    version = store.version(*PARTITION)
+    assert store.append(*PARTITION, candles(120, 2, close=500)) == 1
+    data = store.read(*PARTITION)
+    assert data["timestamp"].tolist() == [0, 60, 120, 180]
+    assert data["close_price"].tolist() == [100, 101, 500, 500]
+    assert store.version(*PARTITION) > version
+
+
+def test_older_rows_are_merged(store):
+    store.append(*PARTITION, candles(600, 5))
+    # A filled head and a duplicate candle: the new value wins, the partition stays sorted
+    assert store.append(*PARTITION, candles(0, 11, close=7)) == 10
+    data = store.read(*PARTITION)
+    assert data["timestamp"].tolist() == list(range(0, 900, 60))
+    assert data["close_price"][10] == 7
+    assert data["close_price"][11] == 101
+
+
+def test_rows_already_stored_are_skipped(store):
+    store.append(*PARTITION, candles(0, 10))
+    version = store.version(*PARTITION)
+    assert store.append(*PARTITION, candles(60, 3, close=1)) == 0
+    assert store.version(*PARTITION) == version
+    assert store.read(*PARTITION)["close_price"][1] == 101
+
+
+def test_unsorted_and_duplicated_input(store):
+    data = candles(0, 5)
+    order = [3, 1, 4, 1, 0, 2]
+    assert store.append(*PARTITION, {c: v[order] for c, v in data.items()}) == 5
+    assert store.read(*PARTITION)["timestamp"].tolist() == [0, 60, 120, 180, 240]
+
+
+def test_append_accepts_exchange_rows_and_frames(store):
+    rows = [{"timestamp": "2024-01-01 00:00:00", "open_price": 1.0, "high_price": 2.0, "low_price": 0.5,
+             "close_price": 1.5, "volume": 10.0},
+            {"timestamp": "2024-01-01 00:01:00", "open_price": 1.5, "high_price": 2.0, "low_price": 1.0,
+             "close_price": 1.8, "volume": 5.0}]
+    assert store.append(*PARTITION, rows) == 2
+    frame = pd.DataFrame(candles(1704067320, 2)).set_index("timestamp")
+    assert store.append(*PARTITION, frame) == 2
+    assert store.read(*PARTITION)["timestamp"].tolist() == [1704067200 + 60 * i for i in range(4)]
+
+
+def test_column_mismatch_is_refused(store):
+    store.append(*PARTITION, candles(0, 3))
+    with pytest.raises(ValueError):
+        store.append(*PARTITION, {"timestamp": np.array([600]), "close_price": np.array([1.0])})
+
+
+def test_interrupted_append_is_repaired(store):
+    store.append(*PARTITION, candles(0, 3))
+    # A crash after writing a price column but before the timestamps: the tail is not committed
+    with open(store._column_path(*PARTITION, "close_price"), "ab") as stream:
+        stream.write(np.float64(1).tobytes())
+    assert store.count(*PARTITION) == 3
+    store.append(*PARTITION, candles(180, 1, close=9))
+    assert store.read(*PARTITION)["close_price"].tolist() == [100, 101, 102, 9]
+
+
+def test_aggregate_candles():
+    hours = aggregate_candles(candles(0, 120), 3600)
+    assert hours["timestamp"].tolist() == [0, 3600]
+    assert hours["open_price"].tolist() == [99.5, 159.5]
+    assert hours["high_price"].tolist() == [160, 220]
+    assert hours["low_price"].tolist() == [99, 159]
+    assert hours["close_price"].tolist() == [159, 219]
+    assert hours["volume"].tolist() == [60, 60]
+
+
+def test_rollup_is_incremental(store):
+    store.append(*PARTITION, candles(0, 90))
+    report = store.rollup(*PARTITION)
+    assert report["one_hour"] == 2
+    assert store.rollup_source("fixture", "BTC-USD", "five_minute") == "one_minute"
+    assert store.rollup_source("fixture", "BTC-USD", "one_hour") == "fifteen_minute"
+    assert store.rollup_source("fixture", "BTC-USD", "one_day") == "six_hour"
+    # The partial second hour is completed, a third one added
+    store.append(*PARTITION, candles(5400, 60))
+    store.rollup(*PARTITION)
+    hours = store.read("fixture", "BTC-USD", "one_hour")
+    assert hours["timestamp"].tolist() == [0, 3600, 7200]
+    assert hours["volume"].tolist() == [60, 60, 30]
+    assert store.read("fixture", "BTC-USD", "one_day")["volume"].tolist() == [150]
+
+
+def test_rollup_since_rewrites_older_buckets(store):
+    store.append(*PARTITION, candles(3600, 60))
+    store.rollup(*PARTITION)
+    store.append(*PARTITION, candles(0, 60))
+    store.rollup(*PARTITION, since=0)
+    hours = store.read("fixture", "BTC-USD", "one_hour")
+    assert hours["timestamp"].tolist() == [0, 3600]
+    assert hours["volume"].tolist() == [60, 60]
+
+
+def test_best_granularity(store):
+    store.append(*PARTITION, candles(0, 6000))
+    store.rollup(*PARTITION)
+    assert store.best_granularity("fixture", "BTC-USD", max_points=10_000) == "one_minute"
+    assert store.best_granularity("fixture", "BTC-USD", max_points=200) == "one_hour"
+    assert store.best_granularity("fixture", "BTC-USD", max_points=1) == "one_day"
+    assert store.best_granularity("fixture", "ETH-USD") is None
+
+
+def test_to_epoch():
+    assert to_epoch(None) is None
+    assert to_epoch(1700000000.5) == 1700000000
+    assert to_epoch("01-02-2024") == 1704153600
+    assert to_epoch(datetime(2024, 1, 2)) == 1704153600
+    assert to_epoch(datetime(2024, 1, 2, tzinfo=timezone.utc)) == 1704153600
+
+
+@pytest.mark.parametrize("name, valid", [("BTC-USD", True), ("..", False), ("a/b", False), ("a\\b", False),
+                                         ("", False), ("../etc", False)])
+def test_is_partition_name(name, valid):
+    assert is_partition_name(name) == valid
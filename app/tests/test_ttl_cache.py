@@ -0,0 +1,167 @@
+"""TTLCache: expiry, stale-while-revalidate, collapsed misses."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from common.cache.cached_exchange import CachedExchange
+from common.cache.ttl_cache import TTLCache
+
+
+class Loader:
+    """Loader counting its calls, optionally blocked until ``release`` is set."""
+
+    def __init__(self, values=None, delay=0.0):
+        self.calls = 0
+        self.values = values
+        self.delay = delay
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self):
+        self.calls += 1
+        self.release.wait(5)
+        time.sleep(self.delay)
+        return self.values[self.calls - 1] if self.values is not None else self.calls
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_fresh_entries_are_hits():
+    cache, load = TTLCache(), Loader()
+    assert [cache.get("k", load, ttl=10) for _ in range(3)] == [1, 1, 1]
+    assert load.calls == 1
+    assert (cache.misses, cache.hits) == (1, 2)
+
+
+def test_expired_entries_are_reloaded():
+    cache, load = TTLCache(), Loader()
+    cache.get("k", load, ttl=0.05)
+    time.sleep(0.06)
+    assert cache.get("k", load, ttl=0.05) == 2
+    assert cache.misses == 2
+
+
+def test_stale_entries_are_served_while_refreshed():
+    cache, load = TTLCache(), Loader()
+    cache.get("k", load, ttl=0.05, stale_ttl=10)
+    time.sleep(0.06)
+    load.release.clear()
+    # Served at once, one refresh in the background however many callers
+    assert [cache.get("k", load, ttl=0.05, stale_ttl=10) for _ in range(5)] == [1] * 5
+    assert cache.stale_hits == 5
+    load.release.set()
+    wait_until(lambda: cache.get("k", load, ttl=10) == 2)
+    assert load.calls == 2
+
+
+def test_concurrent_misses_load_once():
+    cache, load = TTLCache(), Loader(delay=0.05)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("k", load, ttl=10))) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [1] * 10
+    assert load.calls == 1
+
+
+def test_failed_loads_are_not_cached():
+    cache, calls = TTLCache(), []
+
+    def failing():
+        calls.append(1)
+        raise ConnectionError("down")
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            cache.get("k", failing, ttl=10)
+    assert len(calls) == 2
+    assert len(cache) == 0
+
+
+def test_empty_answers_are_cached_briefly():
+    cache, load = TTLCache(empty_ttl=0.05), Loader(values=[{}, {}, {"BTC": 1.0}])
+    assert cache.get("k", load, ttl=10, stale_ttl=10) == {}
+    assert cache.get("k", load, ttl=10, stale_ttl=10) == {}
+    assert load.calls == 1
+    time.sleep(0.06)
+    # No stale window for an empty answer: the next call waits for a fresh one
+    assert cache.get("k", load, ttl=10, stale_ttl=10) == {}
+    assert load.calls == 2
+
+
+def test_lru_eviction_and_invalidate():
+    cache = TTLCache(maxsize=2)
+    for key in "abc":
+        cache.get(key, lambda: key, ttl=10)
+    assert len(cache) == 2
+    load = Loader()
+    cache.get("a", load, ttl=10)
+    assert load.calls == 1
+    cache.invalidate("a")
+    cache.get("a", load, ttl=10)
+    assert load.calls == 2
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_async_misses_load_once():
+    cache, calls = TTLCache(), []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "value"
+
+    async def run():
+        return await asyncio.gather(*(cache.aget("k", load, ttl=10) for _ in range(20)))
+
+    assert asyncio.run(run()) == ["value"] * 20
+    assert len(calls) == 1
+
+
+def test_async_stale_entries_are_served_while_refreshed():
+    cache, calls = TTLCache(), []
+
+    async def load():
+        calls.append(1)
+        return len(calls)
+
+    async def run():
+        await cache.aget("k", load, ttl=0.01, stale_ttl=10)
+        await asyncio.sleep(0.02)
+        stale = [await cache.aget("k", load, ttl=10, stale_ttl=10) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        return stale, await cache.aget("k", load, ttl=10)
+
+    assert asyncio.run(run()) == ([1, 1, 1], 2)
+    assert len(calls) == 2
+
+
+def test_cached_exchange_shares_answers():
+    class Exchange:
+        name = "test"
+
+        def __init__(self):
+            self.calls = []
+
+        def get_account_details(self, all_details=False, flag_portfolio=False):
+            self.calls.append((all_details, flag_portfolio))
+            return {"assets": ["BTC"]}
+
+    exchange = Exchange()
+    cached = CachedExchange(exchange, TTLCache())
+    cached.ttl, cached.stale_ttl = {"account": 10}, {"account": 0}
+    for _ in range(3):
+        assert cached.get_account_details() == {"assets": ["BTC"]}
+    cached.get_account_details(flag_portfolio=True)
+    assert exchange.calls == [(False, False), (False, True)]
+    assert cached.name == "test"
@@ -35,11 +35,14 @@ export const StockChart = ({ portfolio, chartOptions }) => {
     const fetchData = async () => {
       try {
         const response = await axios.get(
-          "http://localhost:8081/test_comparative"
+          "http://localhost:8081/comparative",
+          // No more points than pixels, LTTB keeps the shape of the lines
+          { params: { symbols: "AAPL,TSLA", points: window.innerWidth, method: "lttb" } }
         );
-        console.log(response)
-        setDataOne(response["data"]["data"]["stock-1"])
-        setDataTwo(response["data"]["data"]["stock-2"])
+        // Columnar payload: { symbol: { timestamp: [epoch ms], value: [...] } }
+        const toPoints = ({ timestamp, value }) => timestamp.map((t, i) => [t, value[i]]);
+        setDataOne(toPoints(response["data"]["data"]["AAPL"]))
+        setDataTwo(toPoints(response["data"]["data"]["TSLA"]))
         
         
       
@@ -1,4 +1,4 @@
-import React, { useState, useMemo } from "react";
+import React, { useState, useMemo, useEffect } from "react";
 import AgGridComp from "../components/shared/AgGridComp";
 import { saleValueFormatter } from "../components/shared/utils";
 import { Card, CardContent, Typography, Grid } from "@mui/material";
@@ -9,6 +9,17 @@ export const CryptoPortfolio = () => {
   // Sample data for cryptocurrencies
   const [portfolio, setPortfolio] = useState([]);
 
+  // Live valuations pushed by the server, frames already carry the whole portfolio
+  useEffect(() => {
+    const socket = new WebSocket("ws://localhost:8081/ws");
+    socket.onmessage = (event) => {
+      const frame = JSON.parse(event.data);
+      setPortfolio(frame.portfolio);
+    };
+    socket.onerror = (error) => console.error("Market stream error:", error);
+    return () => socket.close();
+  }, []);
+
   const columnsDefs = [
     {
       headerName: "Exchange",